@@ -0,0 +1,179 @@
+"""
+Agent 健康采样 — 后台按固定节奏采集 Gateway / 进程 / 会话状态，接口只返回最近快照。
+
+原 /api/agents-status 每次请求都要：最多 4 次 HTTP 探测（各 3s 超时）、
+每个部门一次 pgrep 子进程（11 个）、重新解析每个 sessions.json。这里：
+  - ProcessTable 一次扫描 /proc 取得全部进程命令行，按正则匹配（语义同 pgrep -f）；
+    没有 /proc 的平台退回一次 ps 调用；
+  - 解析过的 JSON 文件按 (mtime, size) 缓存（cached_json）；
+  - HealthSampler 在后台线程里每 interval 秒调用一次采样函数，
+    请求线程直接拿最近快照（附 ageSec），首次请求时同步采样一次。
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import pathlib
+import re
+import subprocess
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+log = logging.getLogger('agent_health')
+
+
+class ProcessTable:
+    """某一时刻全部进程的命令行快照。"""
+
+    def __init__(self, cmdlines: List[str]):
+        self.cmdlines = cmdlines
+
+    @classmethod
+    def scan(cls) -> 'ProcessTable':
+        proc = pathlib.Path('/proc')
+        if proc.is_dir():
+            cmdlines = []
+            own = str(os.getpid())
+            for entry in os.scandir(proc):
+                if not entry.name.isdigit() or entry.name == own:
+                    continue
+                try:
+                    with open(os.path.join(entry.path, 'cmdline'), 'rb') as f:
+                        raw = f.read()
+                except OSError:
+                    continue      # 进程已退出或无权限
+                if raw:
+                    cmdlines.append(raw.rstrip(b'\0').replace(b'\0', b' ').decode('utf-8', 'replace'))
+            return cls(cmdlines)
+        if os.name == 'nt':
+            return cls([])
+        try:
+            out = subprocess.run(['ps', '-eo', 'args'], capture_output=True, text=True, timeout=5).stdout
+            return cls(out.splitlines()[1:])
+        except Exception:
+            return cls([])
+
+    def matches(self, pattern: str) -> bool:
+        """是否存在命令行匹配 pattern 的进程（等价于 pgrep -f pattern）。"""
+        rx = re.compile(pattern)
+        return any(rx.search(c) for c in self.cmdlines)
+
+
+_JSON_CACHE: Dict[str, Any] = {}
+_JSON_CACHE_LOCK = threading.Lock()
+
+
+def cached_json(path: pathlib.Path) -> Any:
+    """读取 JSON 文件，按 (mtime_ns, size) 缓存解析结果；不存在或解析失败返回 None。"""
+    key = str(path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        with _JSON_CACHE_LOCK:
+            _JSON_CACHE.pop(key, None)
+        return None
+    sig = (st.st_mtime_ns, st.st_size)
+    with _JSON_CACHE_LOCK:
+        hit = _JSON_CACHE.get(key)
+    if hit and hit[0] == sig:
+        return hit[1]
+    try:
+        data = json.loads(pathlib.Path(path).read_text())
+    except Exception:
+        data = None
+    with _JSON_CACHE_LOCK:
+        _JSON_CACHE[key] = (sig, data)
+    return data
+
+
+class HealthSampler:
+    """后台周期调用 sample_fn，缓存最近一次结果。"""
+
+    def __init__(self, sample_fn: Callable[[], Dict[str, Any]], interval: float = 10.0):
+        self.sample_fn = sample_fn
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._sampled_at = 0.0
+        self._duration_ms = 0
+        self._sampling = False
+        self._thread = None
+        self._stop = threading.Event()
+        self._kick = threading.Event()
+        self.samples = 0
+        self.errors = 0
+
+    def _sample(self):
+        started = time.time()
+        try:
+            data = self.sample_fn()
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            log.warning(f'健康采样失败: {e}')
+            return
+        with self._cond:
+            self._snapshot = data
+            self._sampled_at = time.time()
+            self._duration_ms = int((self._sampled_at - started) * 1000)
+            self.samples += 1
+            self._cond.notify_all()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._kick.wait(self.interval)
+            self._kick.clear()
+            if self._stop.is_set():
+                break
+            self._sample()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='agent-health', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._kick.set()
+
+    def refresh_soon(self):
+        """请求后台线程尽快重新采样（例如刚唤醒了 Agent）。"""
+        self._kick.set()
+
+    def snapshot(self, timeout: float = 30.0) -> Optional[Dict[str, Any]]:
+        """返回最近快照（浅拷贝，附 ageSec 等元信息）；还没有快照时同步采样一次。"""
+        first = False
+        with self._cond:
+            if self._snapshot is None:
+                if self._sampling:
+                    self._cond.wait_for(lambda: self._snapshot is not None, timeout)
+                else:
+                    self._sampling = first = True
+        if first:
+            try:
+                self._sample()
+            finally:
+                with self._cond:
+                    self._sampling = False
+                    self._cond.notify_all()
+            self.start()
+        with self._lock:
+            if self._snapshot is None:
+                return None
+            out = dict(self._snapshot)
+            out['sampledAt'] = self._sampled_at
+            out['ageSec'] = round(time.time() - self._sampled_at, 3)
+            out['sampleMs'] = self._duration_ms
+            return out
+
+    def peek(self, max_age: float) -> Optional[Dict[str, Any]]:
+        """不超过 max_age 秒的快照（不触发采样），否则返回 None。"""
+        with self._lock:
+            if self._snapshot is None or time.time() - self._sampled_at > max_age:
+                return None
+            return self._snapshot
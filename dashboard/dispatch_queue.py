@@ -0,0 +1,183 @@
+"""
+派发执行器 — 有界并发 + 落盘队列 + 重复派发合并。
+
+原 dispatch_for_state() / wake_agent() 每次都新起一个线程阻塞在
+subprocess.run(openclaw …, timeout=310) 上，巡检一次标记 50 个重试任务
+就会同时拉起 50 个 openclaw agent 进程。这里：
+  - 全局并发上限 max_workers、单 Agent 并发上限 per_agent，超出的任务按 FIFO 排队
+    （队首任务所在 Agent 已满时跳过它，先跑其他 Agent 的任务）；
+  - 同一 key（派发为 任务id:状态，唤醒为 wake:agent）排队或执行中时，重复提交直接合并；
+  - durable 任务（派发）写入 data/dispatch_queue.json，进程被 kill 后启动时 replay()
+    重新入队；唤醒消息不落盘；
+  - 每个任务仍由 threading.Thread(target=…, daemon=True) 执行，只是同时存活的线程数有界；
+  - 统计排队深度、等待时长、执行时长（最近 WINDOW 个任务的 p50/p95/max）。
+"""
+from __future__ import annotations
+
+import collections
+import functools
+import logging
+import pathlib
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from file_lock import atomic_json_read, atomic_json_write
+
+log = logging.getLogger('dispatch_queue')
+
+WINDOW = 200
+
+
+def _summary(samples) -> Dict[str, Any]:
+    if not samples:
+        return {'count': 0, 'last': None, 'p50': None, 'p95': None, 'max': None}
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'last': samples[-1],
+        'p50': ordered[len(ordered) // 2],
+        'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        'max': ordered[-1],
+    }
+
+
+class DispatchExecutor:
+    """按 job['kind'] 调用 handlers 中的处理函数；job 为可 JSON 序列化的 dict。"""
+
+    def __init__(self, path_fn: Callable[[], pathlib.Path],
+                 handlers: Dict[str, Callable[[Dict[str, Any]], Any]],
+                 max_workers: int = 8, per_agent: int = 2):
+        self.path_fn = path_fn
+        self.handlers = handlers
+        self.max_workers = max(1, max_workers)
+        self.per_agent = max(1, per_agent)
+        self._lock = threading.Lock()
+        self._persist_lock = threading.Lock()
+        self._queue: List[Dict[str, Any]] = []
+        self._running: Dict[str, Dict[str, Any]] = {}
+        self._by_agent: Dict[str, int] = collections.Counter()
+        self._wait_ms = collections.deque(maxlen=WINDOW)
+        self._run_ms = collections.deque(maxlen=WINDOW)
+        self.counters = {'submitted': 0, 'coalesced': 0, 'completed': 0, 'errors': 0, 'replayed': 0}
+
+    def configure(self, max_workers: Optional[int] = None, per_agent: Optional[int] = None):
+        with self._lock:
+            if max_workers:
+                self.max_workers = max(1, max_workers)
+            if per_agent:
+                self.per_agent = max(1, per_agent)
+        self._pump()
+
+    # ── 提交 ──
+
+    def pending(self, key: str) -> bool:
+        """key 对应的任务是否正在排队或执行。"""
+        with self._lock:
+            return key in self._running or any(j['key'] == key for j in self._queue)
+
+    def submit(self, job: Dict[str, Any], durable: bool = True) -> bool:
+        """入队；同 key 已在排队/执行时合并并返回 False。"""
+        job = dict(job, durable=durable, enqueuedAt=job.get('enqueuedAt') or time.time())
+        with self._lock:
+            if job['key'] in self._running or any(j['key'] == job['key'] for j in self._queue):
+                self.counters['coalesced'] += 1
+                return False
+            self._queue.append(job)
+            self.counters['submitted'] += 1
+        if durable:
+            self._persist()
+        self._pump()
+        return True
+
+    def replay(self) -> List[Dict[str, Any]]:
+        """重新入队上次进程留在落盘队列中的任务（排队中与执行中的都算），返回入队的任务。"""
+        saved = atomic_json_read(self.path_fn(), [])
+        replayed = []
+        for job in saved if isinstance(saved, list) else []:
+            if not isinstance(job, dict) or not job.get('key') or job.get('kind') not in self.handlers:
+                continue
+            job = dict(job, recovered=True)
+            job.pop('startedAt', None)
+            if self.submit(job):
+                replayed.append(job)
+        with self._lock:
+            self.counters['replayed'] += len(replayed)
+        return replayed
+
+    # ── 执行 ──
+
+    def _next_runnable(self) -> Optional[Dict[str, Any]]:
+        if len(self._running) >= self.max_workers:
+            return None
+        for i, job in enumerate(self._queue):
+            if self._by_agent[job.get('agentId', '')] < self.per_agent:
+                return self._queue.pop(i)
+        return None
+
+    def _pump(self):
+        while True:
+            with self._lock:
+                job = self._next_runnable()
+                if job is None:
+                    return
+                job['startedAt'] = time.time()
+                self._running[job['key']] = job
+                self._by_agent[job.get('agentId', '')] += 1
+                self._wait_ms.append(int((job['startedAt'] - job['enqueuedAt']) * 1000))
+            if job['durable']:
+                self._persist()
+            threading.Thread(target=functools.partial(self._run, job), daemon=True).start()
+
+    def _run(self, job: Dict[str, Any]):
+        try:
+            self.handlers[job['kind']](job)
+            ok = True
+        except Exception as e:
+            ok = False
+            log.warning(f'派发任务 {job["key"]} 异常: {e}')
+        with self._lock:
+            self._running.pop(job['key'], None)
+            self._by_agent[job.get('agentId', '')] -= 1
+            self._run_ms.append(int((time.time() - job['startedAt']) * 1000))
+        # 先落盘再计数：看到 completed / errors 增加时，队列文件已不含该任务
+        if job['durable']:
+            self._persist()
+        with self._lock:
+            self.counters['completed' if ok else 'errors'] += 1
+        self._pump()
+
+    def _persist(self):
+        """把执行中 + 排队中的 durable 任务写回磁盘（快照在锁内取，写入串行）。"""
+        with self._persist_lock:
+            with self._lock:
+                jobs = [dict(j) for j in list(self._running.values()) + self._queue if j['durable']]
+            try:
+                atomic_json_write(self.path_fn(), jobs)
+            except Exception as e:
+                log.warning(f'派发队列落盘失败: {e}')
+
+    # ── 观测 ──
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            oldest = min((j['enqueuedAt'] for j in self._queue), default=None)
+            return {
+                'maxWorkers': self.max_workers,
+                'perAgent': self.per_agent,
+                'queueDepth': len(self._queue),
+                'running': len(self._running),
+                'runningByAgent': {a: n for a, n in self._by_agent.items() if n > 0},
+                'oldestWaitSec': round(now - oldest, 3) if oldest else 0,
+                'waitMs': _summary(list(self._wait_ms)),
+                'runMs': _summary(list(self._run_ms)),
+                **self.counters,
+            }
+
+    def jobs(self) -> Dict[str, List[Dict[str, Any]]]:
+        with self._lock:
+            return {
+                'running': [{k: v for k, v in j.items() if k != 'message'} for j in self._running.values()],
+                'queued': [{k: v for k, v in j.items() if k != 'message'} for j in self._queue],
+            }
@@ -0,0 +1,345 @@
+"""
+看板实时推送 — Server-Sent Events（GET /api/events）
+
+数据来源（由一个后台线程统一检测，N 个浏览器只计算一次）:
+  - 任务仓库变更日志（tasks_source.changes）：任务写入后立即推送该任务的字段差异
+  - live_status.json 重新生成（refresh_live_data 完成）：推送富化字段
+    （heartbeat / org / outputMeta）的差异与 metrics
+
+事件格式（每个事件只编码一次，字节串共享给所有连接）:
+  event: hello         data: {"eventId": 12}                 连接建立；客户端先拉一次 /api/live-status
+  event: task          data: {"id": "JJC-1", "set": {...}, "unset": [...]}
+  event: task.removed  data: {"id": "JJC-1"}
+  event: metrics       data: {"metrics": {...}, "generatedAt": "...", "refresh": {...}}
+  event: resync        data: {}                              断档，客户端需重新拉取快照
+
+断线重连时浏览器自动带 Last-Event-ID，环形缓冲内的事件会补发，否则发 resync。
+
+连接建立后 socket 交给 EventHub（非阻塞写 + selectors），不占用 HTTP 线程池的 worker；
+写缓冲积压超过 MAX_PENDING_BYTES 的慢客户端会被断开。
+"""
+from __future__ import annotations
+
+import collections
+import json
+import logging
+import pathlib
+import selectors
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import task_changes
+from task_store import file_signature
+
+log = logging.getLogger('event_stream')
+
+POLL_INTERVAL = 0.25       # 检测数据源变化的间隔（写入方也可 wake() 立即唤醒）
+KEEPALIVE_SEC = 15         # 空闲时发送注释行，防止代理断开、及时发现死连接
+REPLAY_EVENTS = 512        # Last-Event-ID 补发的环形缓冲大小
+MAX_PENDING_BYTES = 1 << 20
+MAX_SUBSCRIBERS = 256
+
+
+_MISSING = object()
+
+
+def diff_task(old: Optional[dict], new: dict) -> Optional[dict]:
+    """计算顶层字段差异；无变化返回 None。"""
+    old = old or {}
+    changed = {k: v for k, v in new.items() if old.get(k, _MISSING) != v}
+    removed = [k for k in old if k not in new]
+    if not changed and not removed:
+        return None
+    out = {'id': new.get('id'), 'set': changed}
+    if removed:
+        out['unset'] = removed
+    return out
+
+
+def encode_event(event_id: int, event: str, data) -> bytes:
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return f'id: {event_id}\nevent: {event}\ndata: {payload}\n\n'.encode()
+
+
+class _Subscriber:
+    __slots__ = ('sock', 'pending', 'last_write')
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.pending = bytearray()
+        self.last_write = time.monotonic()
+
+
+class EventHub:
+    """检测任务/实时状态变化并把差异事件推送给所有 SSE 连接。"""
+
+    def __init__(self, store_fn: Callable[[], Any]):
+        self._store_fn = store_fn   # 返回当前任务仓库（与 HTTP 读路径共用同一份缓存）
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._subs: Dict[socket.socket, _Subscriber] = {}
+        self._recent = collections.deque(maxlen=REPLAY_EVENTS)   # (event_id, bytes)
+        self._event_id = 0
+        self._thread = None
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        self._stop = threading.Event()
+        # 数据源状态（仅后台线程访问）
+        self._tasks_path = None
+        self._store = None
+        self._version = None
+        self._live_sig = None
+        self._snapshot: Dict[str, dict] = {}
+        self._metrics = None
+        self.stats = {'events': 0, 'subscribers': 0, 'dropped': 0, 'bytesSent': 0}
+
+    # ── 连接管理 ──
+
+    def owns(self, sock) -> bool:
+        with self._lock:
+            return sock in self._subs
+
+    def attach(self, sock: socket.socket, last_event_id: Optional[str] = None) -> bool:
+        """接管一个已发送响应头的连接；超过上限返回 False（调用方关闭连接）。"""
+        self._ensure_started()
+        with self._lock:
+            if len(self._subs) >= MAX_SUBSCRIBERS:
+                return False
+            sub = _Subscriber(sock)
+            sub.pending += self._backlog(last_event_id)
+            sock.setblocking(False)
+            self._subs[sock] = sub
+            self.stats['subscribers'] = len(self._subs)
+        self.wake()
+        return True
+
+    def _backlog(self, last_event_id):
+        """新连接的首批数据：补发缺失事件，或 hello/resync。调用方持有 _lock。"""
+        try:
+            last = int(last_event_id) if last_event_id else None
+        except ValueError:
+            last = None
+        if last is not None and last <= self._event_id:
+            if last == self._event_id:
+                return b''
+            if self._recent and self._recent[0][0] <= last + 1:
+                return b''.join(data for eid, data in self._recent if eid > last)
+            return encode_event(self._event_id, 'resync', {})
+        return encode_event(self._event_id, 'hello', {'eventId': self._event_id})
+
+    def wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    def close(self):
+        self._stop.set()
+        self.wake()
+        if self._thread:
+            self._thread.join(timeout=5)
+        with self._lock:
+            subs = list(self._subs)
+            self._subs.clear()
+        for sock in subs:
+            self._close_sock(sock)
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            # 先同步绑定数据源，确保首个连接之后的写入都会产生事件
+            try:
+                self.poll_sources()
+            except Exception as e:
+                log.warning(f'SSE 数据源初始化失败: {e}')
+            self._thread = threading.Thread(target=self._run, name='dashboard-sse', daemon=True)
+            self._thread.start()
+
+    # ── 事件发布 ──
+
+    def publish(self, event: str, data) -> int:
+        with self._lock:
+            self._event_id += 1
+            payload = encode_event(self._event_id, event, data)
+            self._recent.append((self._event_id, payload))
+            for sub in self._subs.values():
+                sub.pending += payload
+            self.stats['events'] += 1
+            return self._event_id
+
+    # ── 数据源检测 ──
+
+    def _bind_source(self):
+        store = self._store_fn()
+        if store is self._store:
+            return
+        self._store = store
+        self._tasks_path = pathlib.Path(store.path)
+        self._version = task_changes.current_version(self._tasks_path)
+        self._live_sig = None
+        self._snapshot = {}
+        self._metrics = None
+        self._poll_live(emit=False)
+
+    def _emit_task(self, new: dict):
+        tid = new.get('id')
+        d = diff_task(self._snapshot.get(tid), new)
+        self._snapshot[tid] = new
+        if d:
+            self.publish('task', d)
+
+    def _poll_changes(self):
+        version, changed = task_changes.read_since(self._tasks_path, self._version)
+        if version == self._version:
+            return
+        self._version = version
+        if changed is None:
+            # 整体写入：与任务仓库全量对比（只在后台线程做一次）
+            current = {t.get('id'): t for t in self._store.tasks() if isinstance(t, dict)}
+            changed = set(current) | set(self._snapshot)
+        for tid in changed:
+            raw = self._store.get(tid)
+            if raw is None:
+                if self._snapshot.pop(tid, None) is not None:
+                    self.publish('task.removed', {'id': tid})
+                continue
+            # 任务仓库里没有富化字段（heartbeat 等），保留快照中的值，等 live_status 更新
+            self._emit_task({**self._snapshot.get(tid, {}), **raw})
+
+    def _poll_live(self, emit=True):
+        live_path = self._tasks_path.parent / 'live_status.json'
+        sig = file_signature(live_path)
+        if sig == self._live_sig:
+            return
+        self._live_sig = sig
+        try:
+            live = json.loads(live_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return
+        tasks = {t.get('id'): t for t in live.get('tasks') or [] if isinstance(t, dict)}
+        if not emit:
+            self._snapshot = tasks
+            self._metrics = live.get('metrics')
+            return
+        for tid in [tid for tid in self._snapshot if tid not in tasks]:
+            del self._snapshot[tid]
+            self.publish('task.removed', {'id': tid})
+        for t in tasks.values():
+            self._emit_task(t)
+        if live.get('metrics') != self._metrics:
+            self._metrics = live.get('metrics')
+            self.publish('metrics', {
+                'metrics': self._metrics,
+                'generatedAt': live.get('generatedAt'),
+                'refresh': live.get('refresh'),
+            })
+
+    def poll_sources(self):
+        """检测一次数据源变化并发布事件（后台线程调用；测试可直接调用）。"""
+        self._bind_source()
+        self._poll_changes()
+        self._poll_live()
+
+    # ── 后台线程 ──
+
+    def _run(self):
+        last_poll = 0.0
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if now - last_poll >= POLL_INTERVAL:
+                last_poll = now
+                try:
+                    self.poll_sources()
+                except Exception as e:
+                    log.warning(f'SSE 数据源检测失败: {e}')
+            self._flush()
+            for key, _ in self._selector.select(timeout=POLL_INTERVAL):
+                if key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                    last_poll = 0.0
+                else:
+                    self._check_closed(key.fileobj)
+
+    def _flush(self):
+        now = time.monotonic()
+        with self._lock:
+            subs = list(self._subs.values())
+        dead = []
+        for sub in subs:
+            with self._lock:
+                if not sub.pending and now - sub.last_write >= KEEPALIVE_SEC:
+                    sub.pending += b': keepalive\n\n'
+                data = bytes(sub.pending)
+            if not data:
+                continue
+            try:
+                sent = sub.sock.send(data)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            except OSError:
+                dead.append(sub.sock)
+                continue
+            with self._lock:
+                del sub.pending[:sent]
+                backlog = len(sub.pending)
+                self.stats['bytesSent'] += sent
+            if sent:
+                sub.last_write = now
+            if backlog > MAX_PENDING_BYTES:
+                dead.append(sub.sock)
+        for sock in dead:
+            self._drop(sock)
+        # 有积压的连接等待可写，其余只监听读端（对端关闭时可读）
+        with self._lock:
+            subs = list(self._subs.items())
+        for sock, sub in subs:
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if sub.pending else 0)
+            try:
+                self._selector.modify(sock, events)
+            except KeyError:
+                try:
+                    self._selector.register(sock, events)
+                except (ValueError, OSError):
+                    self._drop(sock)
+            except (ValueError, OSError):
+                self._drop(sock)
+
+    def _check_closed(self, sock):
+        try:
+            data = sock.recv(1024)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._drop(sock)
+
+    def _drop(self, sock):
+        with self._lock:
+            if self._subs.pop(sock, None) is None:
+                return
+            self.stats['subscribers'] = len(self._subs)
+            self.stats['dropped'] += 1
+        try:
+            self._selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+        self._close_sock(sock)
+
+    @staticmethod
+    def _close_sock(sock):
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
@@ -10,10 +10,15 @@ Endpoints:
   POST /api/set-model          → {agentId, model}
   GET  /api/model-change-log   → data/model_change_log.json
   GET  /api/last-result        → data/last_model_change_result.json
+  GET  /api/server-stats       → 线程池/队列深度等服务指标
+  GET  /api/dispatch-queue     → Agent 派发执行器：排队/执行中任务、等待与执行时长
+  GET  /api/audit-log          → 审计日志查询（?task=&agent=&action=&since=&until=&limit=）
 """
-import json, pathlib, subprocess, sys, threading, argparse, datetime, logging, re, os, socket, shutil
+import json, pathlib, subprocess, sys, threading, argparse, datetime, logging, re, os, socket, shutil, time
+import gzip, hashlib
+from concurrent.futures import ThreadPoolExecutor
 from http.server import BaseHTTPRequestHandler, HTTPServer
-from urllib.parse import urlparse
+from urllib.parse import parse_qs, urlparse
 from urllib.request import Request, urlopen
 
 # JWT 认证模块
@@ -24,7 +29,17 @@ from auth import init as auth_init, requires_auth, extract_token, verify_token,
 # 引入文件锁工具，确保与其他脚本并发安全
 scripts_dir = str(pathlib.Path(__file__).parent.parent / 'scripts')
 sys.path.insert(0, scripts_dir)
-from file_lock import atomic_json_read, atomic_json_write, atomic_json_update
+from file_lock import atomic_json_read, atomic_json_write, atomic_json_update, compact_json_journal
+from task_store import file_signature, open_task_store
+import task_history
+import refresh_watcher
+from audit_log import AuditLog
+from event_stream import EventHub
+from session_log import open_session_log
+from session_index import TASK_ID_RE, session_index
+from agent_health import HealthSampler, ProcessTable, cached_json
+from dispatch_queue import DispatchExecutor
+from stall_scheduler import StallScheduler
 from utils import validate_url, read_json, now_iso, python_bin
 from court_discuss import (
     create_session as cd_create, advance_discussion as cd_advance,
@@ -89,6 +104,78 @@ def cors_headers(h):
     h.send_header('Access-Control-Allow-Headers', 'Content-Type')
 
 
+# ── 响应体缓存（ETag / gzip）──
+# 文件型 JSON 端点（live-status / officials-stats / agent-config …）按源文件签名缓存
+# 序列化后的响应体、ETag 与 gzip 结果；文件不变时轮询只需一次 stat，
+# 客户端带 If-None-Match 则直接 304。
+_GZIP_MIN_BYTES = 1024
+_JSON_FILE_CACHE_MAX = 64
+_JSON_FILE_CACHE = {}   # str(path) -> (signature, _EncodedBody)
+_JSON_FILE_CACHE_LOCK = threading.Lock()
+
+
+class _EncodedBody:
+    """一份已编码的响应体：原文、ETag（内容哈希）与按需生成的 gzip 版本。
+
+    只有会被缓存复用的响应体（encoded_json_file）才值得算哈希；
+    with_etag=False 时 etag 为 None，响应不带 ETag。
+    """
+    __slots__ = ('body', 'etag', '_gzip')
+
+    def __init__(self, body: bytes, with_etag: bool = True):
+        self.body = body
+        self.etag = '"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest() if with_etag else None
+        self._gzip = None
+
+    def gzipped(self) -> bytes:
+        if self._gzip is None:
+            self._gzip = gzip.compress(self.body, compresslevel=6)
+        return self._gzip
+
+
+def encoded_json_file(path, default=None):
+    """读取 JSON 文件并返回缓存的 _EncodedBody；文件签名不变时不重新解析/序列化。"""
+    path = pathlib.Path(path)
+    key = str(path)
+    sig = file_signature(path)
+    with _JSON_FILE_CACHE_LOCK:
+        hit = _JSON_FILE_CACHE.get(key)
+    if hit and sig is not None and hit[0] == sig:
+        return hit[1]
+    entry = _EncodedBody(json.dumps(read_json(path, default), ensure_ascii=False).encode())
+    with _JSON_FILE_CACHE_LOCK:
+        _JSON_FILE_CACHE.pop(key, None)
+        while len(_JSON_FILE_CACHE) >= _JSON_FILE_CACHE_MAX:
+            _JSON_FILE_CACHE.pop(next(iter(_JSON_FILE_CACHE)))
+        _JSON_FILE_CACHE[key] = (sig, entry)
+    return entry
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag == '*' or tag.removeprefix('W/') == etag:
+            return True
+    return False
+
+
+def _accepts_gzip(header):
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if coding.strip().lower() not in ('gzip', '*'):
+            continue
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
 def _iter_task_data_dirs():
     """返回可用的任务数据目录候选（优先 workspace，其次本地 data）。"""
     dirs = [DATA]
@@ -134,20 +221,53 @@ def get_task_data_dir():
     return _ACTIVE_TASK_DATA_DIR
 
 
+_TASK_STORES = {}
+_TASK_STORES_LOCK = threading.Lock()
+
+
+def get_task_store():
+    """当前任务数据目录对应的任务存储（后端由 EDICT_TASK_BACKEND 决定，按路径复用）。"""
+    path = get_task_data_dir() / 'tasks_source.json'
+    with _TASK_STORES_LOCK:
+        store = _TASK_STORES.get(path)
+        if store is None:
+            store = _TASK_STORES[path] = open_task_store(path)
+        return store
+
+
+# SSE 推送（GET /api/events）：后台线程检测任务变更与 live_status 更新，差异广播给所有连接
+EVENT_HUB = EventHub(get_task_store)
+
+
+def get_task(task_id):
+    """按 id 读取任务（缓存快照，只读）；需要修改请用 modify_task。"""
+    return get_task_store().get(task_id)
+
+
+def list_tasks():
+    """读取全部任务（缓存快照，只读）；需要修改请用 modify_tasks。"""
+    return get_task_store().tasks()
+
+
 def load_tasks():
-    task_data_dir = get_task_data_dir()
-    return atomic_json_read(task_data_dir / 'tasks_source.json', [])
+    """读取一份可自由修改的任务列表副本（每次重新解析）。"""
+    return get_task_store().load()
 
 
 def save_tasks(tasks):
-    task_data_dir = get_task_data_dir()
-    atomic_json_write(task_data_dir / 'tasks_source.json', tasks)
+    get_task_store().save(tasks)
     _trigger_refresh()
 
 
 def _trigger_refresh():
-    """Trigger live data refresh in background."""
+    """Trigger live data refresh in background.
+
+    优先通知常驻 refresh_watcher（进程内增量刷新）；不可达时才起子进程。
+    """
+    EVENT_HUB.wake()
     task_data_dir = get_task_data_dir()
+    if refresh_watcher.notify(task_data_dir):
+        return
     script = task_data_dir.parent / 'scripts' / 'refresh_live_data.py'
     if not script.exists():
         script = SCRIPTS / 'refresh_live_data.py'
@@ -160,7 +280,13 @@ def _trigger_refresh():
     threading.Thread(target=_refresh, daemon=True).start()
 
 
-def modify_tasks(modifier):
+def get_audit_log():
+    """当前数据目录下的审计日志（data/audit_log/，旧版 audit_log.json 兼容读取）。"""
+    data_dir = get_task_data_dir()
+    return AuditLog(data_dir / 'audit_log', legacy_file=data_dir / 'audit_log.json')
+
+
+def modify_tasks(modifier, scope=None):
     """Atomically read-modify-write the tasks file.
 
     ``modifier(tasks)`` receives the current task list, mutates it in place
@@ -169,10 +295,16 @@ def modify_tasks(modifier):
     ``load_tasks()`` / ``save_tasks()`` calls when background threads
     (dispatch callbacks, periodic scanner) and the HTTP handler mutate tasks
     concurrently.
+
+    ``scope`` optionally lists the task ids the modifier touches; it becomes
+    the change set seen by the incremental refresh (``None`` = all tasks).
     """
-    task_data_dir = get_task_data_dir()
-    path = task_data_dir / 'tasks_source.json'
-    atomic_json_update(path, modifier, default=[])
+    store = get_task_store()
+    if store.backend == 'json':
+        atomic_json_update(store.path, store.wrap_modifier(modifier), default=[],
+                           on_commit=store.committer(scope))
+    else:
+        store.update(modifier, scope=scope)
     _trigger_refresh()
 
 
@@ -182,6 +314,16 @@ def modify_task(task_id, updater):
     ``updater(task)`` receives the task dict and should mutate it in place.
     Returns ``True`` if the task was found and updated, ``False`` otherwise.
     """
+    store = get_task_store()
+    if store.backend != 'json':
+        # 行级更新：只读取并重写这一条任务
+        def _stamped(task):
+            updater(task)
+            task['updatedAt'] = now_iso()
+        found = store.update_task(task_id, _stamped)
+        _trigger_refresh()
+        return found
+
     found = [False]
 
     def _modifier(tasks):
@@ -193,7 +335,7 @@ def modify_task(task_id, updater):
         found[0] = True
         return tasks
 
-    modify_tasks(_modifier)
+    modify_tasks(_modifier, scope=[task_id])
     return found[0]
 
 
@@ -809,23 +951,34 @@ _AGENT_DEPTS = [
 ]
 
 
-def _check_gateway_alive():
-    """检测 Gateway 是否在运行。
+AGENT_HEALTH_INTERVAL = 10    # 后台健康采样间隔（秒）
+_GATEWAY_FRESH_SEC = 15       # 派发/唤醒前可直接沿用的「Gateway 在线」快照时效
 
-    Windows 上不要依赖 pgrep；优先通过本地端口探测判断。
-    """
+
+def _gateway_state(procs=None):
+    """返回 (alive, probe)。HTTP probe 只做一次；失败时再看进程表（Windows 看端口）。"""
     if _check_gateway_probe():
-        return True
+        return True, True
     try:
         if os.name == 'nt':
             with socket.create_connection(('127.0.0.1', 18789), timeout=2):
-                return True
-            return False
-        result = subprocess.run(['pgrep', '-f', 'openclaw-gateway'],
-                                capture_output=True, text=True, timeout=5)
-        return result.returncode == 0
+                return True, False
+        procs = procs or ProcessTable.scan()
+        return procs.matches('openclaw-gateway'), False
     except Exception:
-        return False
+        return False, False
+
+
+def _check_gateway_alive():
+    """检测 Gateway 是否在运行。
+
+    健康采样器最近快照显示在线时直接返回，否则实时探测
+    （Windows 上不依赖进程表，通过本地端口探测判断）。
+    """
+    snap = AGENT_HEALTH.peek(_GATEWAY_FRESH_SEC)
+    if snap is not None and snap['gateway']['alive']:
+        return True
+    return _gateway_state()[0]
 
 
 def _check_gateway_probe():
@@ -846,10 +999,9 @@ def _get_agent_session_status(agent_id):
     返回: (last_active_ts_ms, session_count, is_busy)
     """
     sessions_file = OCLAW_HOME / 'agents' / agent_id / 'sessions' / 'sessions.json'
-    if not sessions_file.exists():
-        return 0, 0, False
     try:
-        data = json.loads(sessions_file.read_text())
+        # 按 (mtime, size) 缓存解析结果，未变化的 sessions.json 不再重复解析
+        data = cached_json(sessions_file)
         if not isinstance(data, dict):
             return 0, 0, False
         session_count = len(data)
@@ -866,14 +1018,11 @@ def _get_agent_session_status(agent_id):
         return 0, 0, False
 
 
-def _check_agent_process(agent_id):
-    """检测是否有该 Agent 的 openclaw-agent 进程正在运行。"""
+def _check_agent_process(agent_id, procs=None):
+    """检测是否有该 Agent 的 openclaw-agent 进程正在运行（procs: 复用同一次进程表扫描）。"""
     try:
-        result = subprocess.run(
-            ['pgrep', '-f', f'openclaw.*--agent.*{agent_id}'],
-            capture_output=True, text=True, timeout=5
-        )
-        return result.returncode == 0
+        procs = procs or ProcessTable.scan()
+        return procs.matches(f'openclaw.*--agent.*{re.escape(agent_id)}')
     except Exception:
         return False
 
@@ -885,7 +1034,15 @@ def _check_agent_workspace(agent_id):
 
 
 def get_agents_status():
-    """获取所有 Agent 的在线状态。
+    """返回健康采样器的最近快照（附 sampledAt / ageSec），不在请求线程里做探测。"""
+    snap = AGENT_HEALTH.snapshot()
+    if snap is None:
+        return {'ok': False, 'error': 'Agent 状态采样失败', 'agents': [], 'checkedAt': now_iso()}
+    return snap
+
+
+def _sample_agents_status():
+    """采样所有 Agent 的在线状态（由 AGENT_HEALTH 后台线程周期调用）。
     返回各 Agent 的:
     - status: 'running' | 'idle' | 'offline' | 'unconfigured'
     - lastActive: 最后活跃时间
@@ -893,8 +1050,8 @@ def get_agents_status():
     - hasWorkspace: 工作空间是否存在
     - processAlive: 是否有进程在运行
     """
-    gateway_alive = _check_gateway_alive()
-    gateway_probe = _check_gateway_probe() if gateway_alive else False
+    procs = ProcessTable.scan()   # 一次扫描 /proc，代替每个部门一次 pgrep
+    gateway_alive, gateway_probe = _gateway_state(procs)
 
     agents = []
     seen_ids = set()
@@ -906,7 +1063,7 @@ def get_agents_status():
 
         has_workspace = _check_agent_workspace(aid)
         last_ts, sess_count, is_busy = _get_agent_session_status(aid)
-        process_alive = _check_agent_process(aid)
+        process_alive = _check_agent_process(aid, procs)
 
         # 状态判定
         if not has_workspace:
@@ -970,6 +1127,44 @@ def get_agents_status():
     }
 
 
+AGENT_HEALTH = HealthSampler(_sample_agents_status, interval=AGENT_HEALTH_INTERVAL)
+
+
+def _run_wake_job(job):
+    """派发执行器中的一个唤醒任务（带重试，最多2次）。"""
+    agent_id, msg = job['agentId'], job['message']
+    try:
+        cmd = ['openclaw', 'agent', '--agent', agent_id, '-m', msg, '--timeout', '120']
+        log.info(f'🔔 唤醒 {agent_id}...')
+        # 带重试（最多2次）
+        for attempt in range(1, 3):
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=130)
+            if result.returncode == 0:
+                log.info(f'✅ {agent_id} 已唤醒')
+                AGENT_HEALTH.refresh_soon()
+                return
+            err_msg = result.stderr[:200] if result.stderr else result.stdout[:200]
+            log.warning(f'⚠️ {agent_id} 唤醒失败(第{attempt}次): {err_msg}')
+            if attempt < 2:
+                import time
+                time.sleep(5)
+        log.error(f'❌ {agent_id} 唤醒最终失败')
+    except subprocess.TimeoutExpired:
+        log.error(f'❌ {agent_id} 唤醒超时(130s)')
+    except Exception as e:
+        log.warning(f'⚠️ {agent_id} 唤醒异常: {e}')
+
+
+# 派发 / 唤醒共用的有界执行器；派发任务落盘到 data/dispatch_queue.json
+DISPATCH_WORKERS = 8          # 同时执行的 openclaw agent 调用上限
+DISPATCH_PER_AGENT = 2        # 单个 Agent 同时执行的调用上限
+DISPATCHER = DispatchExecutor(
+    lambda: get_task_data_dir() / 'dispatch_queue.json',
+    {'dispatch': lambda job: _run_dispatch_job(job), 'wake': lambda job: _run_wake_job(job)},
+    max_workers=DISPATCH_WORKERS, per_agent=DISPATCH_PER_AGENT,
+)
+
+
 def wake_agent(agent_id, message=''):
     """唤醒指定 Agent，发送一条心跳/唤醒消息。"""
     if not _SAFE_NAME_RE.match(agent_id):
@@ -983,27 +1178,9 @@ def wake_agent(agent_id, message=''):
     runtime_id = agent_id
     msg = message or f'🔔 系统心跳检测 — 请回复 OK 确认在线。当前时间: {now_iso()}'
 
-    def do_wake():
-        try:
-            cmd = ['openclaw', 'agent', '--agent', runtime_id, '-m', msg, '--timeout', '120']
-            log.info(f'🔔 唤醒 {agent_id}...')
-            # 带重试（最多2次）
-            for attempt in range(1, 3):
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=130)
-                if result.returncode == 0:
-                    log.info(f'✅ {agent_id} 已唤醒')
-                    return
-                err_msg = result.stderr[:200] if result.stderr else result.stdout[:200]
-                log.warning(f'⚠️ {agent_id} 唤醒失败(第{attempt}次): {err_msg}')
-                if attempt < 2:
-                    import time
-                    time.sleep(5)
-            log.error(f'❌ {agent_id} 唤醒最终失败')
-        except subprocess.TimeoutExpired:
-            log.error(f'❌ {agent_id} 唤醒超时(130s)')
-        except Exception as e:
-            log.warning(f'⚠️ {agent_id} 唤醒异常: {e}')
-    threading.Thread(target=do_wake, daemon=True).start()
+    if not DISPATCHER.submit({'kind': 'wake', 'key': f'wake:{agent_id}', 'agentId': runtime_id, 'message': msg},
+                             durable=False):
+        return {'ok': True, 'message': f'{agent_id} 已有唤醒指令在执行，本次合并'}
 
     return {'ok': True, 'message': f'{agent_id} 唤醒指令已发出，约10-30秒后生效'}
 
@@ -1039,13 +1216,16 @@ def _parse_iso(ts):
         return None
 
 
+STALL_THRESHOLD_SEC = 600     # 任务未设置 stallThresholdSec 时的停滞阈值
+
+
 def _ensure_scheduler(task):
     sched = task.setdefault('_scheduler', {})
     if not isinstance(sched, dict):
         sched = {}
         task['_scheduler'] = sched
     sched.setdefault('enabled', True)
-    sched.setdefault('stallThresholdSec', 600)
+    sched.setdefault('stallThresholdSec', STALL_THRESHOLD_SEC)
     sched.setdefault('maxRetry', 2)
     sched.setdefault('retryCount', 0)
     sched.setdefault('escalationLevel', 0)
@@ -1067,6 +1247,14 @@ def _ensure_scheduler(task):
     return sched
 
 
+def _scheduler_view(task):
+    """只读路径使用：返回补齐默认值的调度信息副本，不修改 task 本身（task 可能是缓存快照）。"""
+    sched = task.get('_scheduler')
+    view = dict(task)
+    view['_scheduler'] = dict(sched) if isinstance(sched, dict) else {}
+    return _ensure_scheduler(view)
+
+
 def _scheduler_add_flow(task, remark, to=''):
     task.setdefault('flow_log', []).append({
         'at': now_iso(),
@@ -1126,11 +1314,10 @@ def _update_task_scheduler(task_id, updater):
 
 
 def get_scheduler_state(task_id):
-    tasks = load_tasks()
-    task = next((t for t in tasks if t.get('id') == task_id), None)
+    task = get_task(task_id)
     if not task:
         return {'ok': False, 'error': f'任务 {task_id} 不存在'}
-    sched = _ensure_scheduler(task)
+    sched = _scheduler_view(task)
     last_progress = _parse_iso(sched.get('lastProgressAt') or task.get('updatedAt'))
     now_dt = datetime.datetime.now(datetime.timezone.utc)
     stalled_sec = 0
@@ -1149,8 +1336,7 @@ def get_scheduler_state(task_id):
 
 def handle_scheduler_retry(task_id, reason=''):
     # Pre-check before acquiring lock (avoids holding lock for error paths)
-    tasks = load_tasks()
-    task = next((t for t in tasks if t.get('id') == task_id), None)
+    task = get_task(task_id)
     if not task:
         return {'ok': False, 'error': f'任务 {task_id} 不存在'}
     state = task.get('state', '')
@@ -1213,11 +1399,10 @@ def handle_scheduler_escalate(task_id, reason=''):
 
 def handle_scheduler_rollback(task_id, reason=''):
     # Pre-check before acquiring lock
-    tasks = load_tasks()
-    task = next((t for t in tasks if t.get('id') == task_id), None)
+    task = get_task(task_id)
     if not task:
         return {'ok': False, 'error': f'任务 {task_id} 不存在'}
-    sched = _ensure_scheduler(task)
+    sched = _scheduler_view(task)
     snapshot = sched.get('snapshot') or {}
     snap_state = snapshot.get('state')
     if not snap_state:
@@ -1251,9 +1436,58 @@ def handle_scheduler_rollback(task_id, reason=''):
     return {'ok': True, 'message': f'{task_id} 已回滚到 {result["snap_state"]}'}
 
 
-def handle_scheduler_scan(threshold_sec=600):
+def _stall_threshold(sched, threshold_sec):
+    """任务的停滞阈值（秒）：未设置时为 STALL_THRESHOLD_SEC（与 _ensure_scheduler 一致），
+    显式为空时用巡检阈值。_stall_deadline 与 handle_scheduler_scan 共用。"""
+    try:
+        return int(sched.get('stallThresholdSec', STALL_THRESHOLD_SEC) or threshold_sec)
+    except (TypeError, ValueError):
+        return threshold_sec
+
+
+def _scan_threshold(threshold_sec=None):
+    """巡检阈值：缺省 STALL_SCAN_THRESHOLD_SEC，最小 60 秒。
+
+    定时巡检、HTTP 手动巡检与 STALL_SCHEDULER.sync 都经由这里取值，
+    阈值相同才能复用停滞堆（阈值变化会触发全量重建）。
+    """
+    return max(60, int(threshold_sec or STALL_SCAN_THRESHOLD_SEC))
+
+
+def _stall_deadline(task, threshold_sec):
+    """任务的停滞截止时间（epoch 秒）；不参与停滞巡检的任务返回 None。
+
+    与 handle_scheduler_scan 的判定一致（阈值见 _stall_threshold）；
+    进展时间取 lastProgressAt，没有则取 updatedAt。
+    """
+    state = task.get('state', '')
+    if not task.get('id') or state in _TERMINAL_STATES or state == 'Blocked' or task.get('archived'):
+        return None
+    sched = task.get('_scheduler')
+    if not isinstance(sched, dict):
+        sched = {}
+    threshold = _stall_threshold(sched, threshold_sec)
+    last_progress = _parse_iso(sched.get('lastProgressAt') or task.get('updatedAt'))
+    if not last_progress:
+        return None
+    if last_progress.tzinfo is None:
+        last_progress = last_progress.replace(tzinfo=datetime.timezone.utc)
+    return last_progress.timestamp() + threshold
+
+
+STALL_RECHECK_SEC = 120       # 停滞任务两次处理（重试→升级→回滚）之间的间隔
+STALL_SYNC_SEC = 30           # 巡检线程最长睡眠时间：到点重新 sync，发现新任务/阈值变化
+STALL_SCAN_THRESHOLD_SEC = 180  # 巡检阈值缺省值（任务的 stallThresholdSec 显式为空时使用）
+STALL_SCHEDULER = StallScheduler(lambda task, threshold: _stall_deadline(task, threshold),
+                                 recheck_sec=STALL_RECHECK_SEC)
+
+
+def handle_scheduler_scan(threshold_sec=None):
     """Periodic stall scanner — runs in a background thread.
 
+    Only tasks whose stall deadline has passed (``STALL_SCHEDULER``) are
+    examined; when none are due the tasks file is neither locked nor written.
+
     Uses ``modify_tasks`` to hold the file lock during the mutation phase,
     preventing concurrent dispatch callbacks and HTTP handlers from
     clobbering each other's writes (fixes TOCTOU race between the old
@@ -1262,7 +1496,11 @@ def handle_scheduler_scan(threshold_sec=600):
     Side-effects (dispatch, escalation wake) are executed *after* the lock
     is released so they don't block other writers.
     """
-    threshold_sec = max(60, int(threshold_sec or 600))
+    threshold_sec = _scan_threshold(threshold_sec)
+    # 只有截止时间已到的任务才进入加锁写入阶段；没有到期任务时不加锁、不写文件
+    STALL_SCHEDULER.sync(get_task_store(), threshold_sec)
+    due = set(STALL_SCHEDULER.pop_due())
+    stalled = set()   # 确认停滞的到期任务；其余（进展已更新、已结束等）撤销 recheck 推迟
     now_dt = datetime.datetime.now(datetime.timezone.utc)
     # Collect dispatch/escalation work to execute after the lock is released
     pending_retries = []
@@ -1275,19 +1513,22 @@ def handle_scheduler_scan(threshold_sec=600):
         for task in tasks:
             task_id = task.get('id', '')
             state = task.get('state', '')
+            if task_id not in due:
+                continue
             if not task_id or state in _TERMINAL_STATES or task.get('archived'):
                 continue
             if state == 'Blocked':
                 continue
 
             sched = _ensure_scheduler(task)
-            task_threshold = int(sched.get('stallThresholdSec') or threshold_sec)
+            task_threshold = _stall_threshold(sched, threshold_sec)
             last_progress = _parse_iso(sched.get('lastProgressAt') or task.get('updatedAt'))
             if not last_progress:
                 continue
             stalled_sec = max(0, int((now_dt - last_progress).total_seconds()))
             if stalled_sec < task_threshold:
                 continue
+            stalled.add(task_id)
 
             if not sched.get('stallSince'):
                 sched['stallSince'] = now_iso()
@@ -1351,17 +1592,17 @@ def handle_scheduler_scan(threshold_sec=600):
 
         return tasks  # always return — atomic_json_update requires it
 
-    modify_tasks(_scan)
+    if due:
+        modify_tasks(_scan, scope=sorted(due))
+        STALL_SCHEDULER.requeue(get_task_store(), due - stalled, threshold_sec)
 
     # --- Side-effects: dispatch & escalation (outside the file lock) ---
 
-    # Re-read tasks for dispatch context (the task objects from _scan are
-    # no longer held under the lock, but dispatch only needs id + state +
-    # title which are immutable at this point).
-    tasks = load_tasks()
-
+    # Look up dispatch context from the task store (the task objects from
+    # _scan are no longer held under the lock, but dispatch only needs
+    # id + state + title which are immutable at this point).
     for task_id, state in pending_retries:
-        retry_task = next((t for t in tasks if t.get('id') == task_id), None)
+        retry_task = get_task(task_id)
         if retry_task:
             dispatch_for_state(task_id, retry_task, state, trigger='taizi-scan-retry')
 
@@ -1377,7 +1618,7 @@ def handle_scheduler_scan(threshold_sec=600):
         wake_agent(target, msg)
 
     for task_id, state in pending_rollbacks:
-        rollback_task = next((t for t in tasks if t.get('id') == task_id), None)
+        rollback_task = get_task(task_id)
         if rollback_task and state not in _TERMINAL_STATES:
             dispatch_for_state(task_id, rollback_task, state, trigger='taizi-auto-rollback')
 
@@ -1391,19 +1632,22 @@ def handle_scheduler_scan(threshold_sec=600):
 
 
 def _startup_recover_queued_dispatches():
-    """服务启动后扫描 lastDispatchStatus=queued 的任务，重新派发。
-    解决：kill -9 重启导致派发线程中断、任务永久卡住的问题。"""
-    tasks = load_tasks()
-    recovered = 0
-    for task in tasks:
+    """服务启动后重新派发上次未完成的派发。
+    解决：kill -9 重启导致派发线程中断、任务永久卡住的问题。
+    先重放落盘队列 data/dispatch_queue.json，再兜底扫描 lastDispatchStatus=queued
+    但不在队列中的任务（队列文件缺失或升级前入队的任务）。"""
+    replayed = DISPATCHER.replay()
+    for job in replayed:
+        log.info(f'🔄 启动恢复: {job["taskId"]} 状态={job["state"]} 从派发队列重放')
+    recovered = len(replayed)
+    for task in list_tasks():
         task_id = task.get('id', '')
         state = task.get('state', '')
         if not task_id or state in _TERMINAL_STATES or task.get('archived'):
             continue
         sched = task.get('_scheduler') or {}
-        if sched.get('lastDispatchStatus') == 'queued':
+        if sched.get('lastDispatchStatus') == 'queued' and not DISPATCHER.pending(f'{task_id}:{state}'):
             log.info(f'🔄 启动恢复: {task_id} 状态={state} 上次派发未完成，重新派发')
-            sched['lastDispatchTrigger'] = 'startup-recovery'
             dispatch_for_state(task_id, task, state, trigger='startup-recovery')
             recovered += 1
     if recovered:
@@ -1423,8 +1667,8 @@ def handle_repair_flow_order():
         if not task_id.startswith('JJC-'):
             continue
         flow_log = task.get('flow_log') or []
-        if not flow_log:
-            continue
+        if not flow_log or task_history.has_cold(task, 'flow_log'):
+            continue  # 首条已迁入冷历史（追加式，不做原地修复）
 
         first = flow_log[0]
         if first.get('from') != '皇上' or first.get('to') != '中书省':
@@ -1548,47 +1792,66 @@ def _parse_activity_entry(item):
     return None
 
 
-def get_agent_activity(agent_id, limit=30, task_id=None):
-    """从 Agent 的 session jsonl 读取最近活动。
-    如果 task_id 不为空，只返回提及该 task_id 的相关条目。
-    """
-    sessions_dir = OCLAW_HOME / 'agents' / agent_id / 'sessions'
+def _sessions_dir(agent_id):
+    return OCLAW_HOME / 'agents' / agent_id / 'sessions'
+
+
+def _session_files(agent_id):
+    """Agent 的 session jsonl 文件（按修改时间倒序，最新在前）。"""
+    sessions_dir = _sessions_dir(agent_id)
     if not sessions_dir.exists():
         return []
+    return sorted(sessions_dir.glob('*.jsonl'), key=lambda f: f.stat().st_mtime, reverse=True)
 
-    # 扫描所有 jsonl（按修改时间倒序），优先最新
-    jsonl_files = sorted(sessions_dir.glob('*.jsonl'), key=lambda f: f.stat().st_mtime, reverse=True)
-    if not jsonl_files:
-        return []
 
+def _parse_activity_items(items):
     entries = []
-    # 如果需要按 task_id 过滤，可能需要扫描多个文件
-    files_to_scan = jsonl_files[:3] if task_id else jsonl_files[:1]
+    for item in items:
+        entry = _parse_activity_entry(item)
+        if entry:
+            entries.append(entry)
+    return entries
 
-    for session_file in files_to_scan:
-        try:
-            lines = session_file.read_text(errors='ignore').splitlines()
-        except Exception:
-            continue
 
-        # 正向扫描以保持时间顺序；如果有 task_id，收集提及 task_id 的条目
-        for ln in lines:
-            try:
-                item = json.loads(ln)
-            except Exception:
-                continue
-            msg = item.get('message') or {}
-            all_text = _collect_message_text(msg)
+def get_agent_activity(agent_id, limit=30, task_id=None):
+    """从 Agent 的 session jsonl 读取最近活动（从文件末尾向前读，只读所需的尾部）。
+    如果 task_id 不为空，只返回提及该 task_id 的相关条目。
+    """
+    if task_id and TASK_ID_RE.fullmatch(task_id):
+        return _agent_activity_for_task(agent_id, task_id, limit)
+    jsonl_files = _session_files(agent_id)
+    if not jsonl_files:
+        return []
 
+    # 如果需要按 task_id 过滤，可能需要扫描多个文件
+    files_to_scan = jsonl_files[:3] if task_id else jsonl_files[:1]
+    prefilter = None
+    if task_id:
+        # 原始行不含 task_id（含 JSON 转义形式）的直接跳过，不做 json.loads
+        needles = {task_id.encode(), json.dumps(task_id)[1:-1].encode()}
+        prefilter = lambda raw: any(n in raw for n in needles)
+
+    def _scan(slog):
+        found = []
+        for _, item in slog.iter_reverse(prefilter=prefilter):
             # task_id 过滤：只保留提及 task_id 的条目
-            if task_id and task_id not in all_text:
+            if task_id and task_id not in _collect_message_text(item.get('message') or {}):
                 continue
             entry = _parse_activity_entry(item)
             if entry:
-                entries.append(entry)
+                found.append(entry)
+                if len(found) >= limit:
+                    break
+        found.reverse()
+        return found
 
-            if len(entries) >= limit:
-                break
+    entries = []
+    for session_file in files_to_scan:
+        slog = open_session_log(session_file)
+        if slog is None:
+            continue
+        part = slog.memo(('activity', limit, task_id), lambda: _scan(slog))
+        entries = [dict(e) for e in part] + entries   # 较新的文件排在后面
         if len(entries) >= limit:
             break
 
@@ -1596,6 +1859,26 @@ def get_agent_activity(agent_id, limit=30, task_id=None):
     return entries[-limit:]
 
 
+def _agent_activity_for_task(agent_id, task_id, limit):
+    """经倒排索引直接定位提及 task_id 的条目（覆盖该 Agent 的全部 session 文件）。"""
+    sessions_dir = _sessions_dir(agent_id)
+    if not sessions_dir.exists():
+        return []
+    entries = []
+    for slog, offset in reversed(session_index(sessions_dir).task_postings(task_id)):
+        item = slog.read_line(offset)
+        # 索引按原始字节提取，仍需确认 task_id 出现在消息文本中
+        if not item or task_id not in _collect_message_text(item.get('message') or {}):
+            continue
+        entry = _parse_activity_entry(item)
+        if entry:
+            entries.append(entry)
+            if len(entries) >= limit:
+                break
+    entries.reverse()
+    return entries
+
+
 def _extract_keywords(title):
     """从任务标题中提取有意义的关键词（用于 session 内容匹配）。"""
     stop = {'的', '了', '在', '是', '有', '和', '与', '或', '一个', '一篇', '关于', '进行',
@@ -1619,136 +1902,41 @@ def _extract_keywords(title):
 
 def get_agent_activity_by_keywords(agent_id, keywords, limit=20):
     """从 agent session 中按关键词匹配获取活动条目。
-    找到包含关键词的 session 文件，只读该文件的活动。
+    经倒排索引找到 user 消息包含关键词的最新 session 文件，只返回匹配度最高的那一段对话的活动。
     """
-    sessions_dir = OCLAW_HOME / 'agents' / agent_id / 'sessions'
-    if not sessions_dir.exists():
-        return []
-
-    jsonl_files = sorted(sessions_dir.glob('*.jsonl'), key=lambda f: f.stat().st_mtime, reverse=True)
-    if not jsonl_files:
-        return []
-
-    # 找到包含关键词的 session 文件
-    target_file = None
-    for sf in jsonl_files[:5]:
-        try:
-            content = sf.read_text(errors='ignore')
-        except Exception:
-            continue
-        hits = sum(1 for kw in keywords if kw.lower() in content.lower())
-        if hits >= min(2, len(keywords)):
-            target_file = sf
-            break
-
-    if not target_file:
-        return []
-
-    # 解析 session 文件，按 user 消息分割为对话段
-    # 找到包含关键词的对话段，只返回该段的活动
-    try:
-        lines = target_file.read_text(errors='ignore').splitlines()
-    except Exception:
+    sessions_dir = _sessions_dir(agent_id)
+    if not sessions_dir.exists() or not keywords:
         return []
 
-    # 第一遍：找到关键词匹配的 user 消息位置
-    user_msg_indices = []  # (line_index, user_text)
-    for i, ln in enumerate(lines):
-        try:
-            item = json.loads(ln)
-        except Exception:
-            continue
-        msg = item.get('message') or {}
-        if msg.get('role') == 'user':
-            text = ''
-            for c in msg.get('content', []):
-                if c.get('type') == 'text' and c.get('text'):
-                    text += c['text']
-            user_msg_indices.append((i, text))
-
-    # 找到与关键词匹配度最高的 user 消息
-    best_idx = -1
-    best_hits = 0
-    for line_idx, utext in user_msg_indices:
-        hits = sum(1 for kw in keywords if kw.lower() in utext.lower())
-        if hits > best_hits:
-            best_hits = hits
-            best_idx = line_idx
-
-    # 确定对话段的行范围：从匹配的 user 消息到下一个 user 消息之前
-    if best_idx >= 0 and best_hits >= min(2, len(keywords)):
-        # 找下一个 user 消息的位置
-        next_user_idx = len(lines)
-        for line_idx, _ in user_msg_indices:
-            if line_idx > best_idx:
-                next_user_idx = line_idx
-                break
-        start_line = best_idx
-        end_line = next_user_idx
-    else:
-        # 没找到匹配的对话段，返回空
+    hit = session_index(sessions_dir).best_keyword_segment(keywords, min(2, len(keywords)))
+    if not hit:
         return []
-
-    # 第二遍：只解析对话段内的行
-    entries = []
-    for ln in lines[start_line:end_line]:
-        try:
-            item = json.loads(ln)
-        except Exception:
-            continue
-        entry = _parse_activity_entry(item)
-        if entry:
-            entries.append(entry)
-
-    return entries[-limit:]
+    # 对话段：从匹配的 user 消息到下一个 user 消息之前
+    slog, start, end = hit
+    return _parse_activity_items(slog.read_range(start, end))[-limit:]
 
 
 def get_agent_latest_segment(agent_id, limit=20):
     """获取 Agent 最新一轮对话段（最后一条 user 消息起的所有内容）。
     用于活跃任务没有精确匹配时，展示 Agent 的实时工作状态。
+    只从文件末尾向前读到最后一条 user 消息为止。
     """
-    sessions_dir = OCLAW_HOME / 'agents' / agent_id / 'sessions'
-    if not sessions_dir.exists():
-        return []
-
-    jsonl_files = sorted(sessions_dir.glob('*.jsonl'),
-                         key=lambda f: f.stat().st_mtime, reverse=True)
+    jsonl_files = _session_files(agent_id)
     if not jsonl_files:
         return []
 
     # 读取最新的 session 文件
-    target_file = jsonl_files[0]
-    try:
-        lines = target_file.read_text(errors='ignore').splitlines()
-    except Exception:
+    slog = open_session_log(jsonl_files[0])
+    if slog is None:
         return []
 
-    # 找到最后一条 user 消息的行号
-    last_user_idx = -1
-    for i, ln in enumerate(lines):
-        try:
-            item = json.loads(ln)
-        except Exception:
-            continue
-        msg = item.get('message') or {}
-        if msg.get('role') == 'user':
-            last_user_idx = i
-
-    if last_user_idx < 0:
-        return []
-
-    # 从最后一条 user 消息开始，解析到文件末尾
-    entries = []
-    for ln in lines[last_user_idx:]:
-        try:
-            item = json.loads(ln)
-        except Exception:
-            continue
-        entry = _parse_activity_entry(item)
-        if entry:
-            entries.append(entry)
+    def _latest():
+        last_user = slog.last_user_offset()
+        if last_user < 0:
+            return []
+        return _parse_activity_items(slog.read_range(last_user))
 
-    return entries[-limit:]
+    return [dict(e) for e in slog.memo('latest-segment', _latest)[-limit:]]
 
 
 def _compute_phase_durations(flow_log):
@@ -1853,8 +2041,7 @@ def get_task_activity(task_id):
     - activity 条目中 progress/todos 保留 state/org 快照
     - activity 中 todos 条目含 diff 字段
     """
-    tasks = load_tasks()
-    task = next((t for t in tasks if t.get('id') == task_id), None)
+    task = get_task(task_id)
     if not task:
         return {'ok': False, 'error': f'任务 {task_id} 不存在'}
 
@@ -1883,7 +2070,9 @@ def get_task_activity(task_id):
 
     # ── 构建活动条目列表（flow_log + progress_log）──
     activity = []
-    flow_log = task.get('flow_log', [])
+    # 冷热分离时按需补全已迁出的历史条目
+    history_dir = get_task_store().history_dir
+    flow_log = task_history.load_history(task, 'flow_log', history_dir)
 
     # 1. flow_log 转为活动条目
     for fl in flow_log:
@@ -1895,7 +2084,8 @@ def get_task_activity(task_id):
             'remark': fl.get('remark', ''),
         })
 
-    progress_log = task.get('progress_log', [])
+    # 与 kanban_update.MAX_PROGRESS_LOG 一致，只展示最近 100 条进展
+    progress_log = task_history.load_history(task, 'progress_log', history_dir, limit=100)
     related_agents = set()
 
     # 资源消耗累加
@@ -2111,8 +2301,131 @@ _STATE_LABELS = {
 }
 
 
+def _run_dispatch_job(job):
+    """派发执行器中的一个派发任务：检查 Gateway → 调用 openclaw agent（带重试）→ 回写调度状态。"""
+    task_id, agent_id, trigger, msg = job['taskId'], job['agentId'], job['trigger'], job['message']
+    if job.get('recovered'):
+        # 落盘队列重放：任务可能已被推进/完结/归档，状态不一致则不再派发
+        task = get_task(task_id)
+        if not task or task.get('archived') or task.get('state') != job['state']:
+            log.info(f'ℹ️ {task_id} 重放派发跳过：任务已不在 {job["state"]}')
+            return
+    try:
+        # Gateway 可能暂时不可达（休眠恢复、进程重启），等待后重试
+        import time as _time
+        _gw_alive = False
+        for _gw_attempt in range(3):
+            if _check_gateway_alive():
+                _gw_alive = True
+                break
+            if _gw_attempt < 2:
+                _time.sleep(5 * (_gw_attempt + 1))  # 5s, 10s
+        if not _gw_alive:
+            log.warning(f'⚠️ {task_id} 自动派发跳过: Gateway 未启动（重试3次仍不可达）')
+            _update_task_scheduler(task_id, lambda t, s: s.update({
+                'lastDispatchAt': now_iso(),
+                'lastDispatchStatus': 'gateway-offline',
+                'lastDispatchAgent': agent_id,
+                'lastDispatchTrigger': trigger,
+            }))
+            return
+        # Fix #139/#182: dispatch channel 可配置；未配置时不传 --deliver 避免
+        # "unknown channel: feishu" 错误（非飞书用户）
+        _agent_cfg = read_json(DATA / 'agent_config.json', {})
+        _channel = (_agent_cfg.get('dispatchChannel') or '').strip()
+        openclaw_bin = _resolve_openclaw_bin()
+        if not openclaw_bin:
+            err = 'OpenClaw CLI 未找到：请确认已安装 openclaw 并加入 PATH；Windows 可设置 OPENCLAW_BIN 指向 openclaw.cmd'
+            log.warning(f'⚠️ {task_id} 自动派发异常: {err}')
+            _update_task_scheduler(task_id, lambda t, s: (
+                s.update({
+                    'lastDispatchAt': now_iso(),
+                    'lastDispatchStatus': 'openclaw-missing',
+                    'lastDispatchAgent': agent_id,
+                    'lastDispatchTrigger': trigger,
+                    'lastDispatchError': err,
+                }),
+                _scheduler_add_flow(t, f'派发异常：OpenClaw CLI 未找到（{trigger}）', to=t.get('org', ''))
+            ))
+            return
+        cmd = [openclaw_bin, 'agent', '--agent', agent_id, '-m', msg, '--timeout', '300']
+        if _channel:
+            cmd.extend(['--deliver', '--channel', _channel])
+        max_retries = 2
+        err = ''
+        for attempt in range(1, max_retries + 1):
+            log.info(f'🔄 自动派发 {task_id} → {agent_id} (第{attempt}次)...')
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=310)
+            if result.returncode == 0:
+                log.info(f'✅ {task_id} 自动派发成功 → {agent_id}')
+                _update_task_scheduler(task_id, lambda t, s: (
+                    s.update({
+                        'lastDispatchAt': now_iso(),
+                        'lastDispatchStatus': 'success',
+                        'lastDispatchAgent': agent_id,
+                        'lastDispatchTrigger': trigger,
+                        'lastDispatchError': '',
+                    }),
+                    _scheduler_add_flow(t, f'派发成功：{agent_id}（{trigger}）', to=t.get('org', ''))
+                ))
+                return
+            err = result.stderr[:200] if result.stderr else result.stdout[:200]
+            log.warning(f'⚠️ {task_id} 自动派发失败(第{attempt}次): {err}')
+            if attempt < max_retries:
+                import time
+                time.sleep(5)
+        log.error(f'❌ {task_id} 自动派发最终失败 → {agent_id}')
+        _update_task_scheduler(task_id, lambda t, s: (
+            s.update({
+                'lastDispatchAt': now_iso(),
+                'lastDispatchStatus': 'failed',
+                'lastDispatchAgent': agent_id,
+                'lastDispatchTrigger': trigger,
+                'lastDispatchError': err,
+            }),
+            _scheduler_add_flow(t, f'派发失败：{agent_id}（{trigger}）', to=t.get('org', ''))
+        ))
+    except subprocess.TimeoutExpired:
+        log.error(f'❌ {task_id} 自动派发超时 → {agent_id}')
+        _update_task_scheduler(task_id, lambda t, s: (
+            s.update({
+                'lastDispatchAt': now_iso(),
+                'lastDispatchStatus': 'timeout',
+                'lastDispatchAgent': agent_id,
+                'lastDispatchTrigger': trigger,
+                'lastDispatchError': 'timeout',
+            }),
+            _scheduler_add_flow(t, f'派发超时：{agent_id}（{trigger}）', to=t.get('org', ''))
+        ))
+    except FileNotFoundError as e:
+        err = f'OpenClaw CLI 未找到：{e}'
+        log.warning(f'⚠️ {task_id} 自动派发异常: {err}')
+        _update_task_scheduler(task_id, lambda t, s: (
+            s.update({
+                'lastDispatchAt': now_iso(),
+                'lastDispatchStatus': 'openclaw-missing',
+                'lastDispatchAgent': agent_id,
+                'lastDispatchTrigger': trigger,
+                'lastDispatchError': err[:200],
+            }),
+            _scheduler_add_flow(t, f'派发异常：OpenClaw CLI 未找到（{trigger}）', to=t.get('org', ''))
+        ))
+    except Exception as e:
+        log.warning(f'⚠️ {task_id} 自动派发异常: {e}')
+        _update_task_scheduler(task_id, lambda t, s: (
+            s.update({
+                'lastDispatchAt': now_iso(),
+                'lastDispatchStatus': 'error',
+                'lastDispatchAgent': agent_id,
+                'lastDispatchTrigger': trigger,
+                'lastDispatchError': str(e)[:200],
+            }),
+            _scheduler_add_flow(t, f'派发异常：{agent_id}（{trigger}）', to=t.get('org', ''))
+        ))
+
+
 def dispatch_for_state(task_id, task, new_state, trigger='state-transition'):
-    """推进/审批后自动派发对应 Agent（后台异步，不阻塞响应）。"""
+    """推进/审批后自动派发对应 Agent（交给 DISPATCHER 排队执行，不阻塞响应）。"""
     agent_id = _STATE_AGENT_MAP.get(new_state)
     if agent_id is None and new_state in ('Doing', 'Next'):
         org = task.get('org', '')
@@ -2120,6 +2433,10 @@ def dispatch_for_state(task_id, task, new_state, trigger='state-transition'):
     if not agent_id:
         log.info(f'ℹ️ {task_id} 新状态 {new_state} 无对应 Agent，跳过自动派发')
         return
+    key = f'{task_id}:{new_state}'
+    if DISPATCHER.pending(key):
+        log.info(f'ℹ️ {task_id} 已有 {new_state} 派发在排队/执行中，合并本次（{trigger}）')
+        return
 
     _update_task_scheduler(task_id, lambda t, s: (
         s.update({
@@ -2173,153 +2490,52 @@ def dispatch_for_state(task_id, task, new_state, trigger='state-transition'):
         f'⚠️ 看板已有此任务，请勿重复创建。直接用 kanban_update.py 更新状态。'
     ))
 
-    def _do_dispatch():
-        try:
-            # Gateway 可能暂时不可达（休眠恢复、进程重启），等待后重试
-            import time as _time
-            _gw_alive = False
-            for _gw_attempt in range(3):
-                if _check_gateway_alive():
-                    _gw_alive = True
-                    break
-                if _gw_attempt < 2:
-                    _time.sleep(5 * (_gw_attempt + 1))  # 5s, 10s
-            if not _gw_alive:
-                log.warning(f'⚠️ {task_id} 自动派发跳过: Gateway 未启动（重试3次仍不可达）')
-                _update_task_scheduler(task_id, lambda t, s: s.update({
-                    'lastDispatchAt': now_iso(),
-                    'lastDispatchStatus': 'gateway-offline',
-                    'lastDispatchAgent': agent_id,
-                    'lastDispatchTrigger': trigger,
-                }))
-                return
-            # Fix #139/#182: dispatch channel 可配置；未配置时不传 --deliver 避免
-            # "unknown channel: feishu" 错误（非飞书用户）
-            _agent_cfg = read_json(DATA / 'agent_config.json', {})
-            _channel = (_agent_cfg.get('dispatchChannel') or '').strip()
-            openclaw_bin = _resolve_openclaw_bin()
-            if not openclaw_bin:
-                err = 'OpenClaw CLI 未找到：请确认已安装 openclaw 并加入 PATH；Windows 可设置 OPENCLAW_BIN 指向 openclaw.cmd'
-                log.warning(f'⚠️ {task_id} 自动派发异常: {err}')
-                _update_task_scheduler(task_id, lambda t, s: (
-                    s.update({
-                        'lastDispatchAt': now_iso(),
-                        'lastDispatchStatus': 'openclaw-missing',
-                        'lastDispatchAgent': agent_id,
-                        'lastDispatchTrigger': trigger,
-                        'lastDispatchError': err,
-                    }),
-                    _scheduler_add_flow(t, f'派发异常：OpenClaw CLI 未找到（{trigger}）', to=t.get('org', ''))
-                ))
-                return
-            cmd = [openclaw_bin, 'agent', '--agent', agent_id, '-m', msg, '--timeout', '300']
-            if _channel:
-                cmd.extend(['--deliver', '--channel', _channel])
-            max_retries = 2
-            err = ''
-            for attempt in range(1, max_retries + 1):
-                log.info(f'🔄 自动派发 {task_id} → {agent_id} (第{attempt}次)...')
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=310)
-                if result.returncode == 0:
-                    log.info(f'✅ {task_id} 自动派发成功 → {agent_id}')
-                    _update_task_scheduler(task_id, lambda t, s: (
-                        s.update({
-                            'lastDispatchAt': now_iso(),
-                            'lastDispatchStatus': 'success',
-                            'lastDispatchAgent': agent_id,
-                            'lastDispatchTrigger': trigger,
-                            'lastDispatchError': '',
-                        }),
-                        _scheduler_add_flow(t, f'派发成功：{agent_id}（{trigger}）', to=t.get('org', ''))
-                    ))
-                    return
-                err = result.stderr[:200] if result.stderr else result.stdout[:200]
-                log.warning(f'⚠️ {task_id} 自动派发失败(第{attempt}次): {err}')
-                if attempt < max_retries:
-                    import time
-                    time.sleep(5)
-            log.error(f'❌ {task_id} 自动派发最终失败 → {agent_id}')
-            _update_task_scheduler(task_id, lambda t, s: (
-                s.update({
-                    'lastDispatchAt': now_iso(),
-                    'lastDispatchStatus': 'failed',
-                    'lastDispatchAgent': agent_id,
-                    'lastDispatchTrigger': trigger,
-                    'lastDispatchError': err,
-                }),
-                _scheduler_add_flow(t, f'派发失败：{agent_id}（{trigger}）', to=t.get('org', ''))
-            ))
-        except subprocess.TimeoutExpired:
-            log.error(f'❌ {task_id} 自动派发超时 → {agent_id}')
-            _update_task_scheduler(task_id, lambda t, s: (
-                s.update({
-                    'lastDispatchAt': now_iso(),
-                    'lastDispatchStatus': 'timeout',
-                    'lastDispatchAgent': agent_id,
-                    'lastDispatchTrigger': trigger,
-                    'lastDispatchError': 'timeout',
-                }),
-                _scheduler_add_flow(t, f'派发超时：{agent_id}（{trigger}）', to=t.get('org', ''))
-            ))
-        except FileNotFoundError as e:
-            err = f'OpenClaw CLI 未找到：{e}'
-            log.warning(f'⚠️ {task_id} 自动派发异常: {err}')
-            _update_task_scheduler(task_id, lambda t, s: (
-                s.update({
-                    'lastDispatchAt': now_iso(),
-                    'lastDispatchStatus': 'openclaw-missing',
-                    'lastDispatchAgent': agent_id,
-                    'lastDispatchTrigger': trigger,
-                    'lastDispatchError': err[:200],
-                }),
-                _scheduler_add_flow(t, f'派发异常：OpenClaw CLI 未找到（{trigger}）', to=t.get('org', ''))
-            ))
-        except Exception as e:
-            log.warning(f'⚠️ {task_id} 自动派发异常: {e}')
-            _update_task_scheduler(task_id, lambda t, s: (
-                s.update({
-                    'lastDispatchAt': now_iso(),
-                    'lastDispatchStatus': 'error',
-                    'lastDispatchAgent': agent_id,
-                    'lastDispatchTrigger': trigger,
-                    'lastDispatchError': str(e)[:200],
-                }),
-                _scheduler_add_flow(t, f'派发异常：{agent_id}（{trigger}）', to=t.get('org', ''))
-            ))
-
-    threading.Thread(target=_do_dispatch, daemon=True).start()
-    log.info(f'🚀 {task_id} 推进后自动派发 → {agent_id}')
+    if DISPATCHER.submit({
+        'kind': 'dispatch', 'key': key, 'taskId': task_id, 'state': new_state,
+        'agentId': agent_id, 'trigger': trigger, 'message': msg,
+    }):
+        log.info(f'🚀 {task_id} 推进后自动派发 → {agent_id}')
 
 
 def handle_advance_state(task_id, comment=''):
     """手动推进任务到下一阶段（解卡用），推进后自动派发对应 Agent。"""
-    tasks = load_tasks()
-    task = next((t for t in tasks if t.get('id') == task_id), None)
+    # Pre-check against the cached snapshot, then re-validate under the lock
+    task = get_task(task_id)
     if not task:
         return {'ok': False, 'error': f'任务 {task_id} 不存在'}
     cur = task.get('state', '')
     if cur not in _STATE_FLOW:
         return {'ok': False, 'error': f'任务 {task_id} 状态为 {cur}，无法推进'}
-    _ensure_scheduler(task)
-    _scheduler_snapshot(task, f'advance-before-{cur}')
-    next_state, from_dept, to_dept, default_remark = _STATE_FLOW[cur]
-    remark = comment or default_remark
 
-    task['state'] = next_state
-    task['now'] = f'⬇️ 手动推进：{remark}'
-    task.setdefault('flow_log', []).append({
-        'at': now_iso(),
-        'from': from_dept,
-        'to': to_dept,
-        'remark': f'⬇️ 手动推进：{remark}'
-    })
-    _scheduler_mark_progress(task, f'手动推进 {cur} -> {next_state}')
-    task['updatedAt'] = now_iso()
-    save_tasks(tasks)
+    result = {}
+
+    def _apply(task):
+        if task.get('state', '') != cur:
+            return  # state changed between pre-check and lock; skip
+        _ensure_scheduler(task)
+        _scheduler_snapshot(task, f'advance-before-{cur}')
+        next_state, from_dept, to_dept, default_remark = _STATE_FLOW[cur]
+        remark = comment or default_remark
+
+        task['state'] = next_state
+        task['now'] = f'⬇️ 手动推进：{remark}'
+        task.setdefault('flow_log', []).append({
+            'at': now_iso(),
+            'from': from_dept,
+            'to': to_dept,
+            'remark': f'⬇️ 手动推进：{remark}'
+        })
+        _scheduler_mark_progress(task, f'手动推进 {cur} -> {next_state}')
+        result['task'] = task
+
+    modify_task(task_id, _apply)
+    if 'task' not in result:
+        return {'ok': False, 'error': f'任务 {task_id} 状态已变化，请刷新后重试'}
+    next_state = result['task'].get('state', '')
 
     # 🚀 推进后自动派发对应 Agent（Done 状态无需派发）
     if next_state != 'Done':
-        dispatch_for_state(task_id, task, next_state)
+        dispatch_for_state(task_id, result['task'], next_state)
 
     from_label = _STATE_LABELS.get(cur, cur)
     to_label = _STATE_LABELS.get(next_state, next_state)
@@ -2350,11 +2566,39 @@ class Handler(BaseHTTPRequestHandler):
         self.end_headers()
 
     def send_json(self, data, code=200):
+        # 动态响应每次重新生成，不算 ETag、不做逐请求压缩，避免额外 CPU
+        self._send_encoded(_EncodedBody(json.dumps(data, ensure_ascii=False).encode(), with_etag=False),
+                           code, allow_gzip=False)
+
+    def send_json_file(self, path, default=None):
+        """返回 JSON 文件内容：按文件签名缓存编码结果，支持 304 与 gzip。"""
+        self._send_encoded(encoded_json_file(path, default))
+
+    def _send_encoded(self, entry, code=200, allow_gzip=True):
         try:
-            body = json.dumps(data, ensure_ascii=False).encode()
+            if (entry.etag and code == 200 and self.command == 'GET'
+                    and _etag_matches(self.headers.get('If-None-Match'), entry.etag)):
+                self.send_response(304)
+                self.send_header('ETag', entry.etag)
+                self.send_header('Cache-Control', 'no-cache')
+                cors_headers(self)
+                self.end_headers()
+                return
+            body = entry.body
+            gzipped = (allow_gzip and len(body) >= _GZIP_MIN_BYTES
+                       and _accepts_gzip(self.headers.get('Accept-Encoding')))
+            if gzipped:
+                body = entry.gzipped()
             self.send_response(code)
             self.send_header('Content-Type', 'application/json; charset=utf-8')
             self.send_header('Content-Length', str(len(body)))
+            if entry.etag and code == 200:
+                self.send_header('ETag', entry.etag)
+                self.send_header('Cache-Control', 'no-cache')
+            if allow_gzip:
+                self.send_header('Vary', 'Accept-Encoding')
+            if gzipped:
+                self.send_header('Content-Encoding', 'gzip')
             cors_headers(self)
             self.end_headers()
             self.wfile.write(body)
@@ -2376,6 +2620,23 @@ class Handler(BaseHTTPRequestHandler):
         except (BrokenPipeError, ConnectionResetError):
             pass
 
+    def _serve_events(self):
+        """SSE 长连接：发送响应头后把 socket 交给 EVENT_HUB，当前 worker 立即返回。"""
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('X-Accel-Buffering', 'no')
+            cors_headers(self)
+            self.end_headers()
+            self.wfile.write(b'retry: 3000\n\n')
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            return
+        self.close_connection = True
+        if not EVENT_HUB.attach(self.connection, self.headers.get('Last-Event-ID')):
+            log.warning('SSE 连接数已达上限，拒绝新连接')
+
     def _serve_static(self, rel_path):
         """从 dist/ 目录提供静态文件。"""
         safe = rel_path.replace('\\', '/').lstrip('/')
@@ -2415,23 +2676,35 @@ class Handler(BaseHTTPRequestHandler):
             checks = {'dataDir': task_data_dir.is_dir(), 'tasksReadable': (task_data_dir / 'tasks_source.json').exists()}
             checks['dataWritable'] = os.access(str(task_data_dir), os.W_OK)
             all_ok = all(checks.values())
-            self.send_json({'status': 'ok' if all_ok else 'degraded', 'ts': now_iso(), 'checks': checks})
+            health = {'status': 'ok' if all_ok else 'degraded', 'ts': now_iso(), 'checks': checks}
+            if hasattr(self.server, 'stats'):
+                health['server'] = self.server.stats()
+            self.send_json(health)
+        elif p == '/api/server-stats':
+            stats = self.server.stats() if hasattr(self.server, 'stats') else {'workers': 1, 'mode': 'single-thread'}
+            self.send_json({'ok': True, 'server': stats, 'events': dict(EVENT_HUB.stats),
+                            'dispatch': DISPATCHER.stats(), 'scheduler': STALL_SCHEDULER.snapshot(),
+                            'checkedAt': now_iso()})
+        elif p == '/api/dispatch-queue':
+            self.send_json({'ok': True, 'stats': DISPATCHER.stats(), **DISPATCHER.jobs(), 'checkedAt': now_iso()})
+        elif p == '/api/events':
+            self._serve_events()
         elif p == '/api/live-status':
             task_data_dir = get_task_data_dir()
-            self.send_json(read_json(task_data_dir / 'live_status.json'))
+            self.send_json_file(task_data_dir / 'live_status.json')
         elif p == '/api/agent-config':
-            self.send_json(read_json(DATA / 'agent_config.json'))
+            self.send_json_file(DATA / 'agent_config.json')
         elif p == '/api/model-change-log':
-            self.send_json(read_json(DATA / 'model_change_log.json', []))
+            self.send_json_file(DATA / 'model_change_log.json', [])
         elif p == '/api/last-result':
-            self.send_json(read_json(DATA / 'last_model_change_result.json', {}))
+            self.send_json_file(DATA / 'last_model_change_result.json', {})
         elif p == '/api/officials-stats':
-            self.send_json(read_json(DATA / 'officials_stats.json', {}))
+            self.send_json_file(DATA / 'officials_stats.json', {})
         elif p == '/api/morning-brief':
-            self.send_json(read_json(DATA / 'morning_brief.json', {}))
+            self.send_json_file(DATA / 'morning_brief.json', {})
         elif p == '/api/morning-config':
             migrate_notification_config()
-            self.send_json(read_json(DATA / 'morning_brief_config.json', {
+            self.send_json_file(DATA / 'morning_brief_config.json', {
                 'categories': [
                     {'name': '政治', 'enabled': True},
                     {'name': '军事', 'enabled': True},
@@ -2440,7 +2713,7 @@ class Handler(BaseHTTPRequestHandler):
                 ],
                 'keywords': [], 'custom_feeds': [],
                 'notification': {'enabled': True, 'channel': 'feishu', 'webhook': ''},
-            }))
+            })
         elif p == '/api/notification-channels':
             self.send_json({'ok': True, 'channels': get_channel_info()})
         elif p.startswith('/api/morning-brief/'):
@@ -2450,7 +2723,7 @@ class Handler(BaseHTTPRequestHandler):
             if not date_clean.isdigit() or len(date_clean) != 8:
                 self.send_json({'ok': False, 'error': f'日期格式无效: {date}，请使用 YYYYMMDD'}, 400)
                 return
-            self.send_json(read_json(DATA / f'morning_brief_{date_clean}.json', {}))
+            self.send_json_file(DATA / f'morning_brief_{date_clean}.json', {})
         elif p == '/api/remote-skills-list':
             self.send_json(get_remote_skills_list())
         elif p.startswith('/api/skill-content/'):
@@ -2474,13 +2747,23 @@ class Handler(BaseHTTPRequestHandler):
                 self.send_json(get_scheduler_state(task_id))
         elif p == '/api/agents-status':
             self.send_json(get_agents_status())
+        elif p == '/api/audit-log':
+            qs = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items() if v and v[0]}
+            try:
+                limit = min(1000, max(1, int(qs.get('limit') or 200)))
+            except ValueError:
+                self.send_json({'ok': False, 'error': 'invalid limit'}, 400)
+                return
+            audit = get_audit_log()
+            entries = audit.query(task=qs.get('task'), agent=qs.get('agent'), action=qs.get('action'),
+                                  since=qs.get('since'), until=qs.get('until'), limit=limit)
+            self.send_json({'ok': True, 'entries': entries, 'count': len(entries), 'log': audit.stats()})
         elif p.startswith('/api/task-output/'):
             task_id = p.replace('/api/task-output/', '')
             if not task_id or not _SAFE_NAME_RE.match(task_id):
                 self.send_json({'ok': False, 'error': 'invalid task_id'}, 400)
             else:
-                tasks = load_tasks()
-                task = next((t for t in tasks if t.get('id') == task_id), None)
+                task = get_task(task_id)
                 if not task:
                     self.send_json({'ok': False, 'error': 'task not found'}, 404)
                 else:
@@ -2613,7 +2896,7 @@ class Handler(BaseHTTPRequestHandler):
             return
 
         if p == '/api/scheduler-scan':
-            threshold_sec = body.get('thresholdSec', 180)
+            threshold_sec = body.get('thresholdSec')
             try:
                 result = handle_scheduler_scan(threshold_sec)
                 self.send_json(result)
@@ -2892,12 +3175,136 @@ class Handler(BaseHTTPRequestHandler):
             self.send_error(404)
 
 
+class DashboardHTTPServer(HTTPServer):
+    """看板 HTTPServer：已被 SSE 接管（EVENT_HUB）的连接由 hub 负责关闭。"""
+
+    def shutdown_request(self, request):
+        if EVENT_HUB.owns(request):
+            return
+        super().shutdown_request(request)
+
+
+class PooledHTTPServer(DashboardHTTPServer):
+    """有界线程池 HTTP 服务器。
+
+    原 ``HTTPServer`` 单线程串行处理请求：一个慢请求（读取大 session JSONL、
+    pgrep 探测、Gateway 超时）会阻塞所有看板标签页的轮询。这里把每个连接交给
+    固定大小的线程池处理：
+
+    - ``workers``：并发处理请求的线程数
+    - ``max_queue``：线程全忙时最多排队的连接数，超出直接返回 503
+    - ``request_timeout``：连接 socket 读写超时；排队超过该时长的请求也直接 503
+    """
+
+    daemon_threads = True
+
+    def __init__(self, server_address, handler_class, workers=16, max_queue=64, request_timeout=30.0):
+        super().__init__(server_address, handler_class)
+        self.workers = max(1, int(workers))
+        self.max_queue = max(0, int(max_queue))
+        self.request_timeout = float(request_timeout) if request_timeout else None
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='dashboard-http')
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+        self._stats_lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._served = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._max_queue_seen = 0
+        self._slow = 0
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self._rejected += 1
+            self._send_unavailable(request, 'server busy')
+            self.shutdown_request(request)
+            return
+        with self._stats_lock:
+            self._queued += 1
+            self._max_queue_seen = max(self._max_queue_seen, self._queued)
+        self._pool.submit(self._process_request_worker, request, client_address, time.monotonic())
+
+    def _process_request_worker(self, request, client_address, enqueued_at):
+        with self._stats_lock:
+            self._queued -= 1
+            self._active += 1
+        started = time.monotonic()
+        handled = False   # 排队超时直接 503 的不计入 served（单独计 queueTimeouts）
+        try:
+            if self.request_timeout and started - enqueued_at > self.request_timeout:
+                with self._stats_lock:
+                    self._timed_out += 1
+                self._send_unavailable(request, 'queue timeout')
+                return
+            if self.request_timeout:
+                request.settimeout(self.request_timeout)
+            handled = True
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            elapsed = time.monotonic() - started
+            slow = handled and self.request_timeout and elapsed > self.request_timeout
+            with self._stats_lock:
+                self._active -= 1
+                if handled:
+                    self._served += 1
+                if slow:
+                    self._slow += 1
+            self._slots.release()
+            if slow:
+                log.warning(f'慢请求 {client_address[0]} 耗时 {elapsed:.1f}s（超过 {self.request_timeout:.0f}s）')
+
+    @staticmethod
+    def _send_unavailable(request, reason):
+        body = json.dumps({'ok': False, 'error': reason}).encode()
+        try:
+            request.sendall(
+                b'HTTP/1.1 503 Service Unavailable\r\n'
+                b'Content-Type: application/json; charset=utf-8\r\n'
+                b'Retry-After: 1\r\n'
+                b'Connection: close\r\n'
+                + f'Content-Length: {len(body)}\r\n\r\n'.encode() + body
+            )
+        except OSError:
+            pass
+
+    def stats(self):
+        """返回线程池指标（队列深度、活跃数、累计处理/拒绝数）。"""
+        with self._stats_lock:
+            return {
+                'workers': self.workers,
+                'maxQueue': self.max_queue,
+                'requestTimeoutSec': self.request_timeout,
+                'active': self._active,
+                'queueDepth': self._queued,
+                'maxQueueDepthSeen': self._max_queue_seen,
+                'served': self._served,
+                'rejected': self._rejected,
+                'queueTimeouts': self._timed_out,
+                'slowRequests': self._slow,
+            }
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=False)
+
+
 def main():
     parser = argparse.ArgumentParser(description='三省六部看板服务器')
     parser.add_argument('--port', type=int, default=7891)
     parser.add_argument('--host', default='127.0.0.1')
     parser.add_argument('--cors', default=None, help='Allowed CORS origin (default: reflect request Origin header)')
+    parser.add_argument('--workers', type=int, default=16, help='请求处理线程数（0 = 单线程串行模式）')
+    parser.add_argument('--max-queue', type=int, default=64, help='线程全忙时最多排队的连接数，超出返回 503')
+    parser.add_argument('--request-timeout', type=float, default=30.0, help='单请求 socket 超时/排队超时（秒）')
+    parser.add_argument('--dispatch-workers', type=int, default=DISPATCH_WORKERS, help='同时执行的 Agent 派发/唤醒上限')
+    parser.add_argument('--dispatch-per-agent', type=int, default=DISPATCH_PER_AGENT, help='单个 Agent 同时执行的派发上限')
     args = parser.parse_args()
+    DISPATCHER.configure(max_workers=args.dispatch_workers, per_agent=args.dispatch_per_agent)
 
     global ALLOWED_ORIGIN, _DASHBOARD_PORT, _DEFAULT_ORIGINS
     ALLOWED_ORIGIN = args.cors
@@ -2906,8 +3313,13 @@ def main():
         f'http://127.0.0.1:{args.port}', f'http://localhost:{args.port}',
     }
 
-    server = HTTPServer((args.host, args.port), Handler)
-    log.info(f'三省六部看板启动 → http://{args.host}:{args.port}')
+    if args.workers > 0:
+        server = PooledHTTPServer((args.host, args.port), Handler, workers=args.workers,
+                                  max_queue=args.max_queue, request_timeout=args.request_timeout)
+        log.info(f'三省六部看板启动 → http://{args.host}:{args.port} （{args.workers} 线程，队列上限 {args.max_queue}）')
+    else:
+        server = DashboardHTTPServer((args.host, args.port), Handler)
+        log.info(f'三省六部看板启动 → http://{args.host}:{args.port} （单线程模式）')
     print(f'   按 Ctrl+C 停止')
 
     auth_init(DATA)
@@ -2921,20 +3333,27 @@ def main():
     # 启动恢复：重新派发上次被 kill 中断的 queued 任务
     threading.Timer(3.0, _startup_recover_queued_dispatches).start()
 
-    # 定时巡检：每 120 秒自动扫描停滞任务并触发重试/升级/回滚
+    # 定时巡检：睡到下一个停滞截止时间（最长 STALL_SYNC_SEC 秒），只处理到期任务
     def _periodic_scheduler_scan():
+        import time as _time
+        last_compact = _time.time()
         while True:
             try:
-                import time as _time
-                _time.sleep(120)
-                result = handle_scheduler_scan(threshold_sec=180)
+                STALL_SCHEDULER.sync(get_task_store(), _scan_threshold())
+                _time.sleep(STALL_SCHEDULER.seconds_until_next(STALL_SYNC_SEC))
+                # journaled 模式：WAL 超过阈值时折叠回快照
+                if _time.time() - last_compact >= 120:
+                    last_compact = _time.time()
+                    if get_task_store().backend == 'json':
+                        compact_json_journal(get_task_store().path)
+                result = handle_scheduler_scan()
                 count = result.get('count', 0) if isinstance(result, dict) else 0
                 if count > 0:
                     log.info(f'🔍 定时巡检：{count} 个动作')
             except Exception as e:
                 log.warning(f'定时巡检异常: {e}')
     threading.Thread(target=_periodic_scheduler_scan, daemon=True).start()
-    log.info('🔍 定时巡检已启动（每120秒）')
+    log.info('🔍 定时巡检已启动（按停滞截止时间唤醒）')
 
     try:
         server.serve_forever()
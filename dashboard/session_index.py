@@ -0,0 +1,230 @@
+r"""
+Agent session 倒排索引 — 任务 id / 关键词 → (session 文件, 行偏移)。
+
+每个 Agent 的 sessions 目录一个 SessionIndex，查询前 update() 一次：
+  - 新文件从头索引，已有文件只扫描上次之后追加的字节（SessionLog.forward_lines）；
+  - 文件被替换/截断（inode 变化或变短）则丢弃该文件的倒排表重建，删除的文件直接移除。
+
+索引内容（按文件分表，便于整文件失效）:
+  ids     任务 id 形态的词（如 JJC-20260223-012）→ 行偏移；直接在原始字节上正则提取，不做 json.loads：
+          先把 JSON 转义（\n、\"、\uXXXX 等）替换为空格，再要求 id 左侧不是字母数字，
+          避免 "…\nJJC-1" 被索引成 nJJC-1
+  grams   user 消息（小写）中的 n-gram → user 消息偏移：汉字连续段取二元组，
+          其他非空白连续段取三元组；关键词的 n-gram 一定出现在包含它的文本里，
+          因此交集能覆盖子串命中（"deploy" 也能找到只含 "deployment" 的消息）
+  users   user 消息偏移（只存偏移，校验时按偏移重新读取该行）
+
+倒排表只给出候选位置，读取该行后仍需校验（与原子串匹配语义一致）。
+取不出 n-gram 的短关键词（单个汉字、两个字母等）不走倒排表，
+改为顺序扫描一遍该文件的 user 消息；同一文件的所有关键词共用一次读取。
+"""
+from __future__ import annotations
+
+import bisect
+import pathlib
+import re
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from session_log import USER_ROLE_RE, SessionLog, open_session_log, user_text
+
+TASK_ID_RE = re.compile(r'[A-Za-z][A-Za-z0-9_]*-[A-Za-z0-9_-]*[0-9]')
+_TASK_ID_BYTES_RE = re.compile(rb'(?<![A-Za-z0-9_])' + TASK_ID_RE.pattern.encode())
+_JSON_ESCAPE_RE = re.compile(rb'\\(?:u[0-9a-fA-F]{4}|.)')
+_CJK_RUN_RE = re.compile(r'[\u4e00-\u9fff]{2,}')
+_OTHER_RUN_RE = re.compile(r'[^\s\u4e00-\u9fff]{3,}')
+MAX_IDS_PER_LINE = 64
+MAX_INDEXES = 64
+
+
+def _ngrams(text: str) -> Set[str]:
+    """小写文本的 n-gram：汉字段二元组，其他非空白段三元组。"""
+    grams = set()
+    for run in _CJK_RUN_RE.findall(text):
+        for i in range(len(run) - 1):
+            grams.add(run[i:i + 2])
+    for run in _OTHER_RUN_RE.findall(text):
+        for i in range(len(run) - 2):
+            grams.add(run[i:i + 3])
+    return grams
+
+
+class _FileIndex:
+    __slots__ = ('ino', 'indexed_to', 'ids', 'grams', 'users')
+
+    def __init__(self, ino):
+        self.ino = ino
+        self.indexed_to = 0
+        self.ids: Dict[str, List[int]] = {}
+        self.grams: Dict[str, Set[int]] = {}
+        self.users: List[int] = []           # user 消息偏移（升序）
+
+
+class SessionIndex:
+    """一个 sessions 目录下全部 .jsonl 的增量倒排索引。线程安全。"""
+
+    def __init__(self, sessions_dir: pathlib.Path):
+        self.sessions_dir = pathlib.Path(sessions_dir)
+        self._lock = threading.Lock()
+        self._files: Dict[pathlib.Path, _FileIndex] = {}
+        self._order: List[Tuple[pathlib.Path, SessionLog]] = []   # 按 mtime 升序
+
+    def update(self):
+        """跟进目录中文件的新增/追加/替换/删除。"""
+        with self._lock:
+            files = []
+            for path in self.sessions_dir.glob('*.jsonl'):
+                try:
+                    mtime = path.stat().st_mtime
+                except OSError:
+                    continue
+                slog = open_session_log(path)
+                if slog is not None:
+                    files.append((mtime, path, slog))
+            files.sort(key=lambda x: x[0])
+            live = {path for _, path, _ in files}
+            for path in [p for p in self._files if p not in live]:
+                del self._files[path]
+            for _, path, slog in files:
+                self._index_file(path, slog)
+            self._order = [(path, slog) for _, path, slog in files]
+
+    def _index_file(self, path, slog: SessionLog):
+        ino = slog.inode
+        fidx = self._files.get(path)
+        if fidx is None or fidx.ino != ino or fidx.indexed_to > slog.size:
+            fidx = self._files[path] = _FileIndex(ino)
+        if fidx.indexed_to >= slog.size:
+            return
+        pos = fidx.indexed_to
+        for offset, raw in slog.forward_lines(pos):
+            pos = offset + len(raw) + 1
+            seen = set()
+            plain = _JSON_ESCAPE_RE.sub(b' ', raw) if b'\\' in raw else raw
+            for m in _TASK_ID_BYTES_RE.finditer(plain):
+                tid = m.group().decode()
+                if tid not in seen:
+                    seen.add(tid)
+                    fidx.ids.setdefault(tid, []).append(offset)
+                    if len(seen) >= MAX_IDS_PER_LINE:
+                        break
+            if not USER_ROLE_RE.search(raw):
+                continue
+            item = slog.parse(offset, raw)
+            text = user_text(item) if item else None
+            if text is None:
+                continue
+            fidx.users.append(offset)
+            for g in _ngrams(text.lower()):
+                fidx.grams.setdefault(g, set()).add(offset)
+        fidx.indexed_to = pos
+
+    # ── 查询 ──
+
+    def task_postings(self, task_id: str) -> List[Tuple[SessionLog, int]]:
+        """提及 task_id 的候选行，按时间顺序（文件 mtime 升序、偏移升序）。"""
+        out = []
+        with self._lock:
+            for path, slog in self._order:
+                fidx = self._files.get(path)
+                if fidx:
+                    out.extend((slog, off) for off in fidx.ids.get(task_id, ()))
+        return out
+
+    @staticmethod
+    def _keyword_candidates(fidx: _FileIndex, kw: str) -> Optional[Set[int]]:
+        """n-gram 交集给出的候选偏移；关键词取不出 n-gram 时返回 None（需顺序扫描）。"""
+        grams = _ngrams(kw)
+        if not grams:
+            return None
+        sets = sorted((fidx.grams.get(g, set()) for g in grams), key=len)
+        return set.intersection(*sets) if sets[0] else set()
+
+    @staticmethod
+    def _user_texts(slog: SessionLog, fidx: _FileIndex, offsets: Optional[Set[int]]) -> Dict[int, str]:
+        """读取 user 消息文本（小写）。offsets 为 None 时从第一条 user 消息起顺序扫描全文件，
+        否则按偏移升序在同一文件句柄上逐条读取。"""
+        texts: Dict[int, str] = {}
+        if offsets is None:
+            users = set(fidx.users)
+            for offset, raw in slog.forward_lines(fidx.users[0]):
+                if offset >= fidx.indexed_to:
+                    break
+                if offset in users:
+                    item = slog.parse(offset, raw)
+                    texts[offset] = ((user_text(item) if item else None) or '').lower()
+            return texts
+        try:
+            f = open(slog.path, 'rb')
+        except OSError:
+            return texts
+        with f:
+            for offset in sorted(offsets):
+                f.seek(offset)
+                raw = f.readline().rstrip(b'\n')
+                item = slog.parse(offset, raw) if raw.strip() else None
+                texts[offset] = ((user_text(item) if item else None) or '').lower()
+        return texts
+
+    def best_keyword_segment(self, keywords: List[str], need: int
+                             ) -> Optional[Tuple[SessionLog, int, int]]:
+        """关键词匹配的对话段 (文件, 起始偏移, 结束偏移)。
+
+        取最新的、有 user 消息命中 ≥ need 个关键词的文件，段起点为其中命中最多
+        （同分取最早）的 user 消息，终点为下一条 user 消息（或文件末尾）。
+        """
+        keywords = [kw.lower() for kw in keywords]
+        with self._lock:
+            order = list(self._order)
+            for path, slog in reversed(order):
+                fidx = self._files.get(path)
+                if not fidx or not fidx.users:
+                    continue
+                cands = {kw: self._keyword_candidates(fidx, kw) for kw in keywords}
+                if any(c is None for c in cands.values()):
+                    texts = self._user_texts(slog, fidx, None)
+                else:
+                    wanted = set().union(*cands.values())
+                    if not wanted:
+                        continue
+                    texts = self._user_texts(slog, fidx, wanted)
+                # n-gram 交集只是候选，按原始子串语义校验
+                hits: Dict[int, int] = {}
+                for kw in keywords:
+                    for off in (texts if cands[kw] is None else cands[kw]):
+                        if kw in texts.get(off, ''):
+                            hits[off] = hits.get(off, 0) + 1
+                if not hits:
+                    continue
+                best_off, best_hits = min(hits.items(), key=lambda kv: (-kv[1], kv[0]))
+                if best_hits >= need and best_hits > 0:
+                    i = bisect.bisect_right(fidx.users, best_off)
+                    end = fidx.users[i] if i < len(fidx.users) else slog.size
+                    return slog, best_off, end
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'files': len(self._files),
+                'taskIds': sum(len(f.ids) for f in self._files.values()),
+                'userMessages': sum(len(f.users) for f in self._files.values()),
+                'indexedBytes': sum(f.indexed_to for f in self._files.values()),
+            }
+
+
+_INDEXES: Dict[str, SessionIndex] = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def session_index(sessions_dir: pathlib.Path) -> SessionIndex:
+    """返回 sessions 目录对应的索引（按路径复用），并跟进文件变化。"""
+    key = str(sessions_dir)
+    with _INDEXES_LOCK:
+        idx = _INDEXES.get(key)
+        if idx is None:
+            if len(_INDEXES) >= MAX_INDEXES:
+                _INDEXES.pop(next(iter(_INDEXES)))
+            idx = _INDEXES[key] = SessionIndex(pathlib.Path(sessions_dir))
+    idx.update()
+    return idx
@@ -0,0 +1,219 @@
+"""
+Agent session JSONL 读取器 — 供看板活动接口（agent-activity / task-activity）使用。
+
+session 文件只追加、可能长到上百 MB，原实现每次请求都 read_text().splitlines()
+并 json.loads 全部行。这里按文件维护一个 SessionLog：
+  - 从文件末尾按块向前读取（iter_reverse），「最近 N 条」「最新对话段」只读尾部；
+  - 正向读取（forward_lines）只产出完整的行，供 session_index 增量跟进追加的字节；
+    文件被替换/截断（inode 变化或变短）时缓存全部失效；
+  - 已解析的行按 (偏移, 长度) 缓存；接口结果按 (size, mtime) 记忆，文件不变时直接返回。
+"""
+from __future__ import annotations
+
+import collections
+import json
+import os
+import pathlib
+import re
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+BLOCK_SIZE = 64 * 1024
+SCAN_BLOCK_SIZE = 1024 * 1024
+PARSE_CACHE_SIZE = 2048
+MAX_OPEN_LOGS = 64
+
+USER_ROLE_RE = re.compile(rb'"role"\s*:\s*"user"')
+
+
+def user_text(item: Dict[str, Any]) -> Optional[str]:
+    """user 消息返回其全部文本（拼接），否则返回 None。"""
+    msg = item.get('message') or {}
+    if msg.get('role') != 'user':
+        return None
+    text = ''
+    for c in msg.get('content', []) or []:
+        if isinstance(c, dict) and c.get('type') == 'text' and c.get('text'):
+            text += c['text']
+    return text
+
+
+class SessionLog:
+    """单个 session .jsonl 文件的尾部读取 + user 消息索引。线程安全。"""
+
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+        self._lock = threading.RLock()
+        self._sig = None
+        self.size = 0
+        self._reset()
+
+    def _reset(self):
+        self._parsed: 'collections.OrderedDict[Tuple[int, int], Any]' = collections.OrderedDict()
+        self._memo: Dict[Any, Any] = {}
+
+    def refresh(self) -> bool:
+        """重新 stat；文件变化返回 True。文件不存在抛 OSError。"""
+        st = os.stat(self.path)
+        sig = (st.st_ino, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            if sig == self._sig:
+                return False
+            if self._sig is None or sig[0] != self._sig[0] or st.st_size < self.size:
+                self._reset()
+            else:
+                self._memo.clear()
+            self._sig = sig
+            self.size = st.st_size
+            return True
+
+    def memo(self, key, compute: Callable[[], Any]):
+        """按文件签名记忆计算结果（调用方须先 refresh）。"""
+        with self._lock:
+            if key in self._memo:
+                return self._memo[key]
+        value = compute()
+        with self._lock:
+            self._memo[key] = value
+        return value
+
+    @property
+    def inode(self) -> Optional[int]:
+        return self._sig[0] if self._sig else None
+
+    # ── 解析 ──
+
+    def parse(self, offset: int, raw: bytes):
+        """解析 offset 处的原始行（按 (偏移, 长度) 缓存）；无法解析返回 None。"""
+        key = (offset, len(raw))
+        with self._lock:
+            hit = self._parsed.get(key)
+            if hit is not None:
+                self._parsed.move_to_end(key)
+                return hit
+        try:
+            item = json.loads(raw)
+        except ValueError:
+            return None          # 半截行（写入中）不缓存，下次重新解析
+        if not isinstance(item, dict):
+            return None
+        with self._lock:
+            self._parsed[key] = item
+            while len(self._parsed) > PARSE_CACHE_SIZE:
+                self._parsed.popitem(last=False)
+        return item
+
+    # ── 读取 ──
+
+    def _reverse_lines(self, f, start: int, end: int) -> Iterator[Tuple[int, bytes]]:
+        """从 end 向前按块读取 [start, end) 内的行，产出 (行起始偏移, 原始字节)。"""
+        pos = end
+        carry = b''
+        while pos > start:
+            n = min(BLOCK_SIZE, pos - start)
+            pos -= n
+            f.seek(pos)
+            buf = f.read(n) + carry
+            hi = len(buf)
+            while True:
+                nl = buf.rfind(b'\n', 0, hi)
+                if nl < 0:
+                    break
+                if nl + 1 < hi:
+                    yield pos + nl + 1, buf[nl + 1:hi]
+                hi = nl
+            carry = buf[:hi]
+        if carry.strip():
+            yield start, carry
+
+    def iter_reverse(self, start: int = 0, prefilter: Optional[Callable[[bytes], Any]] = None
+                     ) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """从文件末尾向前产出 (偏移, 条目)；prefilter(原始行) 为假的行不解析。"""
+        with open(self.path, 'rb') as f:
+            for offset, raw in self._reverse_lines(f, start, self.size):
+                if prefilter is not None and not prefilter(raw):
+                    continue
+                item = self.parse(offset, raw)
+                if item is not None:
+                    yield offset, item
+
+    def read_range(self, start: int, end: Optional[int] = None) -> List[Dict[str, Any]]:
+        """正向读取 [start, end) 内的条目（start 必须是行首）。"""
+        end = self.size if end is None else min(end, self.size)
+        if end <= start:
+            return []
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+        out = []
+        pos = 0
+        for raw in data.split(b'\n'):
+            offset = start + pos
+            pos += len(raw) + 1
+            if raw.strip():
+                item = self.parse(offset, raw)
+                if item is not None:
+                    out.append(item)
+        return out
+
+    def forward_lines(self, start: int) -> Iterator[Tuple[int, bytes]]:
+        """从 start（行首）正向产出完整的行 (偏移, 原始字节)；末尾未写完的半行不产出。"""
+        pos = start
+        with open(self.path, 'rb') as f:
+            while pos < self.size:
+                f.seek(pos)
+                data = f.read(min(SCAN_BLOCK_SIZE, self.size - pos))
+                last_nl = data.rfind(b'\n')
+                if last_nl < 0:
+                    if pos + len(data) >= self.size:
+                        return           # 末尾半行，等写完后再读
+                    # 超长单行：扩大读取直到行尾
+                    data = data + f.readline()
+                    if not data.endswith(b'\n'):
+                        return
+                    last_nl = len(data) - 1
+                line_start = 0
+                while line_start <= last_nl:
+                    nl = data.index(b'\n', line_start)
+                    if nl > line_start:
+                        yield pos + line_start, data[line_start:nl]
+                    line_start = nl + 1
+                pos += last_nl + 1
+
+    def read_line(self, offset: int) -> Optional[Dict[str, Any]]:
+        """读取并解析 offset 处的一行。"""
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            raw = f.readline().rstrip(b'\n')
+        return self.parse(offset, raw) if raw.strip() else None
+
+    def last_user_offset(self) -> int:
+        """最后一条 user 消息的偏移，没有返回 -1；只向前读到找到为止。"""
+        for offset, item in self.iter_reverse(prefilter=USER_ROLE_RE.search):
+            if user_text(item) is not None:
+                return offset
+        return -1
+
+
+_LOGS: 'collections.OrderedDict[str, SessionLog]' = collections.OrderedDict()
+_LOGS_LOCK = threading.Lock()
+
+
+def open_session_log(path) -> Optional[SessionLog]:
+    """返回已刷新的 SessionLog（按路径复用）；文件不可读返回 None。"""
+    key = str(path)
+    with _LOGS_LOCK:
+        log = _LOGS.get(key)
+        if log is None:
+            log = _LOGS[key] = SessionLog(pathlib.Path(path))
+            while len(_LOGS) > MAX_OPEN_LOGS:
+                _LOGS.popitem(last=False)
+        else:
+            _LOGS.move_to_end(key)
+    try:
+        log.refresh()
+    except OSError:
+        with _LOGS_LOCK:
+            _LOGS.pop(key, None)
+        return None
+    return log
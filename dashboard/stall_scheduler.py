@@ -0,0 +1,125 @@
+"""
+停滞调度 — 按任务停滞截止时间维护最小堆，巡检只处理到期的任务。
+
+原 handle_scheduler_scan() 每 120 秒持排他锁遍历全部任务、逐条解析 lastProgressAt，
+即使没有任务停滞也整文件重写一次。这里：
+  - 每个任务的截止时间 = 最近进展时间 + 停滞阈值（由调用方的 deadline_fn 计算），
+    放进最小堆；旧条目惰性删除（以 _deadline 中的当前值为准）；
+  - sync() 通过任务变更日志（task_changes）只重算上次之后被写过的任务；
+    变更日志无法给出增量（整体写入、日志被裁剪）或任务文件被绕过 store 改写时才全量重建；
+  - pop_due() 弹出已到期的任务 id，并把它们推迟 recheck_sec 再复查——
+    与原来「停滞任务每轮巡检推进一级（重试→升级→回滚）」的节奏一致；
+    巡检发现并未停滞的（堆中截止时间已过时）由 requeue() 撤销推迟、按实际截止时间重排；
+  - 后台线程按 seconds_until_next() 睡到下一个截止时间（或下一次 sync）。
+"""
+from __future__ import annotations
+
+import heapq
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import task_changes
+from task_store import file_signature
+
+DeadlineFn = Callable[[Dict[str, Any], int], Optional[float]]
+
+
+class StallScheduler:
+    """任务停滞截止时间的最小堆。线程安全。"""
+
+    def __init__(self, deadline_fn: DeadlineFn, recheck_sec: float = 120.0):
+        self.deadline_fn = deadline_fn
+        self.recheck_sec = recheck_sec
+        self._lock = threading.Lock()
+        self._heap: List[Tuple[float, str]] = []
+        self._deadline: Dict[str, float] = {}
+        self._not_before: Dict[str, float] = {}
+        self._path = None
+        self._threshold = None
+        self._version: Optional[int] = None
+        self._sig: Any = None
+        self.stats = {'rebuilds': 0, 'updates': 0, 'due': 0}
+
+    def _set(self, task_id: str, deadline: Optional[float]):
+        if deadline is None:
+            self._deadline.pop(task_id, None)
+            self._not_before.pop(task_id, None)
+            return
+        deadline = max(deadline, self._not_before.get(task_id, 0.0))
+        if self._deadline.get(task_id) == deadline:
+            return
+        self._deadline[task_id] = deadline
+        heapq.heappush(self._heap, (deadline, task_id))
+        if len(self._heap) > 2 * len(self._deadline) + 64:
+            self._heap = [(d, tid) for tid, d in self._deadline.items()]
+            heapq.heapify(self._heap)
+
+    def sync(self, store, threshold_sec: int):
+        """跟进 store 的写入：只重算变更日志中出现的任务。"""
+        path = store.path
+        sig = file_signature(path) if store.backend == 'json' else None
+        with self._lock:
+            changed = None
+            if path == self._path and threshold_sec == self._threshold and self._version is not None:
+                latest, changed = task_changes.read_since(path, self._version)
+                if changed is not None and latest == self._version and sig != self._sig:
+                    changed = None       # 文件被绕过 store 改写（无变更记录）
+            if changed is None:
+                version = task_changes.current_version(path)
+                tasks = store.tasks()
+                self._heap, self._deadline = [], {}
+                self._not_before = {tid: t for tid, t in self._not_before.items() if t > time.time()}
+                for task in tasks:
+                    if isinstance(task, dict) and task.get('id'):
+                        self._set(str(task['id']), self.deadline_fn(task, threshold_sec))
+                self._path, self._threshold = path, threshold_sec
+                self.stats['rebuilds'] += 1
+            else:
+                version = latest
+                for task_id in changed:
+                    self._set(task_id, self.deadline_fn(store.get(task_id) or {}, threshold_sec))
+                self.stats['updates'] += len(changed)
+            self._version, self._sig = version, sig
+
+    def pop_due(self, now: Optional[float] = None) -> List[str]:
+        """弹出截止时间已过的任务 id；它们在 recheck_sec 之后才会再次到期。"""
+        now = time.time() if now is None else now
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, task_id = heapq.heappop(self._heap)
+                if self._deadline.get(task_id) == deadline:
+                    due.append(task_id)
+            for task_id in due:
+                self._not_before[task_id] = now + self.recheck_sec
+                self._set(task_id, now + self.recheck_sec)
+            self.stats['due'] += len(due)
+        return due
+
+    def requeue(self, store, task_ids, threshold_sec: int):
+        """pop_due 弹出、巡检却未确认停滞的任务：撤销 recheck 推迟，按当前数据重算截止时间。"""
+        with self._lock:
+            for task_id in task_ids:
+                self._not_before.pop(task_id, None)
+                self._set(task_id, self.deadline_fn(store.get(task_id) or {}, threshold_sec))
+
+    def seconds_until_next(self, max_wait: float, now: Optional[float] = None) -> float:
+        """距下一个截止时间的秒数，不超过 max_wait（到那时需要重新 sync）。"""
+        now = time.time() if now is None else now
+        with self._lock:
+            while self._heap and self._deadline.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return max_wait
+            return max(0.0, min(max_wait, self._heap[0][0] - now))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            nxt = min(self._deadline.values(), default=None)
+            return {
+                'tracked': len(self._deadline),
+                'heap': len(self._heap),
+                'nextDeadlineInSec': round(nxt - time.time(), 3) if nxt is not None else None,
+                **self.stats,
+            }
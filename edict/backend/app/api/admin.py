@@ -63,6 +63,21 @@ async def pending_events(
     }
 
 
+@router.get("/archiver")
+async def archiver_status():
+    """事件归档 worker 状态：累计归档数、最近归档事件时间、各 topic 积压。"""
+    bus = await get_event_bus()
+    raw = await bus.redis.get("edict:archiver:stats")
+    return {"running": raw is not None, "stats": json.loads(raw) if raw else None}
+
+
+@router.get("/ws-hub")
+async def ws_hub_status():
+    """本进程 WebSocket 扇出中心状态：订阅者数、队列积压、丢弃帧数。"""
+    from ..services.ws_hub import get_ws_hub
+    return get_ws_hub().snapshot()
+
+
 @router.post("/migrate/check")
 async def migration_check():
     """检查旧数据文件是否存在。"""
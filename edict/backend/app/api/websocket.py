@@ -2,82 +2,95 @@
 
 取代旧架构的 5 秒 HTTP 轮询，改为：
 - 客户端 WebSocket 连接
-- 服务端订阅 Redis Pub/Sub 频道
-- 实时推送事件（状态变更、Agent 思考流、心跳等）
+- 服务端经进程内扇出中心（services/ws_hub.py）订阅 Redis Pub/Sub 频道：
+  每个后端进程一条 Redis 订阅，每条事件只解码一次
+- 实时推送事件（状态变更、Agent 思考流、心跳等），每个连接一个有界发送队列
+
+订阅过滤（/ws）：连接时用查询参数，或随时发送
+    {"type": "subscribe", "topics": [...], "task_ids": [...], "agents": [...],
+     "event_types": ["agent.output*", ...], "coalesce_ms": 500, "batch_ms": 100}
+各条件可选、空表示不限，新的 subscribe 整体替换旧条件。
+coalesce_ms: 心跳（agent.heartbeat，可用 coalesce_topics 指定）每 agent 每窗口只推最新一条；
+batch_ms: 窗口内的事件合并为一帧 {"type": "batch", "events": [...]}。
 """
 
 import asyncio
 import json
 import logging
 
-import redis.asyncio as aioredis
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
-from ..config import get_settings
-from ..services.event_bus import get_event_bus
+from ..services.ws_hub import Subscriber, get_ws_hub
 
 log = logging.getLogger("edict.ws")
 router = APIRouter()
 
-# 活跃连接管理
-_connections: set[WebSocket] = set()
+# 慢连接判定后的关闭码（1013: Try Again Later）
+WS_CLOSE_SLOW = 1013
 
 
-@router.websocket("/ws")
-async def websocket_endpoint(ws: WebSocket):
-    """主 WebSocket 端点 — 推送所有事件。"""
-    await ws.accept()
-    _connections.add(ws)
-    log.info(f"WebSocket connected. Total: {len(_connections)}")
-
-    # 创建独立的 Redis Pub/Sub 连接
-    settings = get_settings()
-    pubsub_redis = aioredis.from_url(settings.redis_url, decode_responses=True)
-    pubsub = pubsub_redis.pubsub()
-
-    # 订阅所有 edict 频道
-    await pubsub.psubscribe("edict:pubsub:*")
-
+async def _serve(ws: WebSocket, sub: Subscriber, handle_messages: bool):
+    """登记订阅，运行发送循环（及客户端消息处理），任一结束即清理。"""
+    hub = get_ws_hub()
+    hub.register(sub)
+    log.info(f"WebSocket connected. Total: {len(hub.subscribers())}")
+    tasks = [asyncio.create_task(sub.run())]
+    if handle_messages:
+        tasks.append(asyncio.create_task(_handle_client_messages(ws, sub)))
+    else:
+        tasks.append(asyncio.create_task(_wait_disconnect(ws)))
     try:
-        # 并发：监听 Redis Pub/Sub + 客户端消息
-        await asyncio.gather(
-            _relay_events(pubsub, ws),
-            _handle_client_messages(ws),
-        )
-    except WebSocketDisconnect:
-        log.info("WebSocket disconnected")
-    except Exception as e:
-        log.error(f"WebSocket error: {e}")
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for t in done:
+            if not t.cancelled() and t.exception() and not isinstance(t.exception(), WebSocketDisconnect):
+                log.error(f"WebSocket error: {t.exception()}")
+        if sub.closed and sub.close_reason == "slow consumer":
+            log.warning(f"Closing slow WebSocket consumer (dropped={sub.dropped})")
+            try:
+                await ws.close(code=WS_CLOSE_SLOW)
+            except Exception:
+                pass
     finally:
-        _connections.discard(ws)
-        await pubsub.punsubscribe("edict:pubsub:*")
-        await pubsub_redis.aclose()
-        log.info(f"WebSocket cleaned up. Remaining: {len(_connections)}")
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        hub.unregister(sub)
+        log.info(f"WebSocket cleaned up. Remaining: {len(hub.subscribers())}")
+
+
+_LIST_FIELDS = ("topics", "task_ids", "agents", "event_types", "coalesce_topics")
+_INT_FIELDS = ("coalesce_ms", "batch_ms")
+
+
+def _parse_filters(data) -> dict:
+    """从 subscribe 消息或查询参数解析过滤条件（列表字段也接受逗号分隔字符串）。"""
+    filters = {}
+    for field in _LIST_FIELDS:
+        value = data.get(field)
+        if field == "task_ids" and not value and data.get("task_id"):
+            value = [data.get("task_id")]
+        if isinstance(value, str):
+            value = [v for v in value.split(",") if v]
+        if value:
+            filters[field] = [str(v) for v in value]
+    for field in _INT_FIELDS:
+        try:
+            filters[field] = max(0, int(data.get(field) or 0))
+        except (TypeError, ValueError):
+            filters[field] = 0
+    return filters
 
 
-async def _relay_events(pubsub, ws: WebSocket):
-    """从 Redis Pub/Sub 接收事件，推送到 WebSocket。"""
-    async for message in pubsub.listen():
-        if message["type"] == "pmessage":
-            channel = message["channel"]
-            data = message["data"]
+@router.websocket("/ws")
+async def websocket_endpoint(ws: WebSocket):
+    """主 WebSocket 端点 — 推送所有事件（可按 topic / task / agent / event_type 过滤）。"""
+    await ws.accept()
+    sub = Subscriber(ws.send_text)
+    sub.set_filter(**_parse_filters(ws.query_params))
+    await _serve(ws, sub, handle_messages=True)
 
-            # 提取 topic 名
-            topic = channel.replace("edict:pubsub:", "") if channel.startswith("edict:pubsub:") else channel
 
-            try:
-                event_data = json.loads(data) if isinstance(data, str) else data
-                await ws.send_json({
-                    "type": "event",
-                    "topic": topic,
-                    "data": event_data,
-                })
-            except Exception as e:
-                log.warning(f"Failed to relay event: {e}")
-                break
-
-
-async def _handle_client_messages(ws: WebSocket):
+async def _handle_client_messages(ws: WebSocket, sub: Subscriber):
     """处理客户端发送的消息（心跳、订阅过滤等）。"""
     while True:
         try:
@@ -85,12 +98,16 @@ async def _handle_client_messages(ws: WebSocket):
             msg_type = data.get("type", "")
 
             if msg_type == "ping":
-                await ws.send_json({"type": "pong"})
+                sub.push(json.dumps({"type": "pong"}), force=True)
             elif msg_type == "subscribe":
-                # 前端可请求只订阅特定 topic（未来扩展）
-                topics = data.get("topics", [])
-                log.debug(f"Client subscribe request: {topics}")
-                await ws.send_json({"type": "subscribed", "topics": topics})
+                filters = _parse_filters(data)
+                get_ws_hub().resubscribe(sub, **filters)
+                log.debug(f"Client subscribe request: {filters}")
+                sub.push(json.dumps({
+                    "type": "subscribed",
+                    "topics": data.get("topics", []),
+                    "filter": sub.describe(),
+                }, ensure_ascii=False), force=True)
             else:
                 log.debug(f"Unknown client message: {msg_type}")
 
@@ -100,51 +117,21 @@ async def _handle_client_messages(ws: WebSocket):
             break
 
 
+async def _wait_disconnect(ws: WebSocket):
+    """只推送的连接：读取并丢弃客户端消息，直到断开。"""
+    while True:
+        message = await ws.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+
 @router.websocket("/ws/task/{task_id}")
 async def task_websocket(ws: WebSocket, task_id: str):
     """单任务 WebSocket — 只推送与特定任务相关的事件。"""
     await ws.accept()
-    _connections.add(ws)
-
-    settings = get_settings()
-    pubsub_redis = aioredis.from_url(settings.redis_url, decode_responses=True)
-    pubsub = pubsub_redis.pubsub()
-    await pubsub.psubscribe("edict:pubsub:*")
-
-    try:
-        async for message in pubsub.listen():
-            if message["type"] == "pmessage":
-                data = message["data"]
-                try:
-                    event_data = json.loads(data) if isinstance(data, str) else data
-                    payload = event_data.get("payload", {})
-                    if isinstance(payload, str):
-                        payload = json.loads(payload)
-
-                    # 只转发与此任务相关的事件
-                    if payload.get("task_id") == task_id:
-                        topic = message["channel"].replace("edict:pubsub:", "")
-                        await ws.send_json({
-                            "type": "event",
-                            "topic": topic,
-                            "data": event_data,
-                        })
-                except Exception:
-                    continue
-    except WebSocketDisconnect:
-        pass
-    finally:
-        _connections.discard(ws)
-        await pubsub.punsubscribe("edict:pubsub:*")
-        await pubsub_redis.aclose()
+    await _serve(ws, Subscriber(ws.send_text, task_id=task_id), handle_messages=False)
 
 
 async def broadcast(event: dict):
     """向所有连接的 WebSocket 客户端广播事件（服务端内部调用用）。"""
-    dead = set()
-    for ws in _connections:
-        try:
-            await ws.send_json(event)
-        except Exception:
-            dead.add(ws)
-    _connections -= dead
+    get_ws_hub().broadcast(event)
@@ -40,8 +40,25 @@ class Settings(BaseSettings):
     stall_threshold_sec: int = 180
     max_dispatch_retry: int = 3
     dispatch_timeout_sec: int = 300
+    agent_timeouts: dict[str, int] = {}  # 按 agent 覆盖超时秒数，如 AGENT_TIMEOUTS='{"gongbu": 900}'
+    dispatch_stop_grace_sec: int = 10  # worker 停止时等待在途派发的秒数，超时后取消并终止子进程
+    dispatch_consumer_id: str | None = None  # 消费者名，默认 disp-<hostname>-<pid>（多副本各不相同）
+    dispatch_lease_ttl_sec: int = 60  # 任务在途租约 TTL，每 TTL/3 续期
+    dispatch_reclaim_interval_sec: int = 30  # 运行中认领遗留 pending 事件的间隔
     heartbeat_interval_sec: int = 30
     scheduler_scan_interval_seconds: int = 60
+    memory_context_tokens: int = 2000  # 派发时注入的记忆上下文 token 预算
+
+    # ── Outbox 保留 ──
+    outbox_retention_enabled: bool = True
+    outbox_retention_hours: int = 72  # 已投递事件保留时长
+    outbox_dead_retention_hours: int = 720  # 进入 DLQ 的事件保留时长
+    outbox_purge_interval_sec: int = 600
+    outbox_purge_batch: int = 1000
+    outbox_archive_dir: str | None = None  # 设置后删除前归档为 outbox-YYYYMMDD-<host>-<pid>-<id>.jsonl.gz
+
+    # ── 事件归档（Redis Streams → events 表）──
+    event_archive_skip_types: list[str] = ["agent.output.line"]  # 不归档的高频事件类型
 
     # ── 消息通知 ──
     notification_enabled: bool = True
@@ -20,6 +20,7 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from .config import get_settings
 from .services.event_bus import get_event_bus
+from .services.ws_hub import get_ws_hub
 from .api import tasks, agents, events, admin, websocket
 from .api import legacy
 
@@ -43,6 +44,7 @@ async def lifespan(app: FastAPI):
     yield
 
     # 清理
+    await get_ws_hub().close()
     await bus.close()
     log.info("Edict Backend shutdown complete")
 
@@ -1,4 +1,5 @@
 from .event_bus import EventBus, get_event_bus
+from .memory_store import MemoryStore, get_memory_store
 from .task_service import TaskService
 
-__all__ = ["EventBus", "get_event_bus", "TaskService"]
+__all__ = ["EventBus", "get_event_bus", "MemoryStore", "get_memory_store", "TaskService"]
@@ -0,0 +1,159 @@
+"""Agent 子进程执行器 — 基于 asyncio 子进程，边运行边逐行回传输出。
+
+原实现在线程池里跑阻塞的 subprocess.run(timeout=300)：每个在途 agent 占用一个 OS 线程，
+输出要等进程结束才一次性拿到，worker 停止时也无法中断。这里：
+- asyncio.create_subprocess_exec 启动，stdout / stderr 分别按块读取、按行切分，
+  每行通过 on_line(stream, line) 回调交给调用方（发布 agent.thoughts 事件）；
+- 只保留 stdout / stderr 的尾部（与原返回值截断长度一致），内存不随输出增长；
+- 超时（读完输出与等待退出共用同一截止时间）或被取消（worker 停止）时终止整个进程组：
+  先 SIGTERM，宽限期后 SIGKILL；
+- 返回值与原实现相同：{"returncode", "stdout", "stderr"}，超时 stderr 含 "TIMEOUT"，
+  找不到可执行文件时 stderr 为 "openclaw command not found"。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import signal
+from typing import Awaitable, Callable
+
+log = logging.getLogger("edict.agent_runner")
+
+STDOUT_TAIL = 5000
+STDERR_TAIL = 2000
+MAX_LINE_CHARS = 4000
+READ_CHUNK = 64 * 1024
+KILL_GRACE_SEC = 5.0
+
+LineCallback = Callable[[str, str], Awaitable[None]]
+
+
+class _Tail:
+    """只保留最近 limit 个字符的文本缓冲。"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._parts: list[str] = []
+        self._size = 0
+
+    def add(self, text: str) -> None:
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size > 2 * self.limit:
+            joined = "".join(self._parts)[-self.limit:]
+            self._parts = [joined]
+            self._size = len(joined)
+
+    def text(self) -> str:
+        return "".join(self._parts)[-self.limit:]
+
+
+async def _pump(reader: asyncio.StreamReader, stream: str, tail: _Tail,
+                on_line: LineCallback | None) -> None:
+    """读取一个管道直到 EOF，按行回调；末尾不带换行的半行在 EOF 时一并回调。"""
+    pending = b""
+    while True:
+        chunk = await reader.read(READ_CHUNK)
+        if not chunk:
+            break
+        tail.add(chunk.decode("utf-8", errors="replace"))
+        if on_line is None:
+            continue
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for raw in lines:
+            await _emit(on_line, stream, raw)
+        if len(pending) > 4 * MAX_LINE_CHARS:
+            # 超长无换行输出：按块切出，避免缓冲无限增长
+            await _emit(on_line, stream, pending)
+            pending = b""
+    if pending and on_line is not None:
+        await _emit(on_line, stream, pending)
+
+
+async def _emit(on_line: LineCallback, stream: str, raw: bytes) -> None:
+    line = raw.decode("utf-8", errors="replace").rstrip("\r")
+    if not line.strip():
+        return
+    try:
+        await on_line(stream, line[:MAX_LINE_CHARS])
+    except Exception as e:  # 回传失败不影响 agent 执行
+        log.debug(f"on_line callback failed: {e}")
+
+
+async def _terminate(proc: asyncio.subprocess.Process) -> None:
+    """终止子进程及其进程组：SIGTERM → 宽限期 → SIGKILL。"""
+    if proc.returncode is not None:
+        return
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(proc.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            try:
+                proc.send_signal(sig)
+            except ProcessLookupError:
+                return
+        try:
+            await asyncio.wait_for(proc.wait(), KILL_GRACE_SEC)
+            return
+        except asyncio.TimeoutError:
+            continue
+
+
+async def run_streaming(
+    cmd: list[str],
+    *,
+    env: dict[str, str] | None = None,
+    cwd: str | None = None,
+    timeout: float = 300,
+    on_line: LineCallback | None = None,
+) -> dict:
+    """运行命令并逐行回传输出，返回 {"returncode", "stdout", "stderr"}（尾部截断）。
+
+    被取消时终止子进程后重新抛出 CancelledError。
+    """
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=env,
+            cwd=cwd,
+            start_new_session=True,
+        )
+    except FileNotFoundError:
+        return {"returncode": -1, "stdout": "", "stderr": "openclaw command not found"}
+
+    out, err = _Tail(STDOUT_TAIL), _Tail(STDERR_TAIL)
+    pumps = asyncio.gather(
+        _pump(proc.stdout, "stdout", out, on_line),
+        _pump(proc.stderr, "stderr", err, on_line),
+    )
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    try:
+        await asyncio.wait_for(asyncio.shield(pumps), timeout)
+        # 管道关闭不代表进程已退出（如关闭了输出仍在运行）：等待退出同样受总超时约束
+        returncode = proc.returncode
+        if returncode is None:
+            returncode = await asyncio.wait_for(proc.wait(), max(deadline - loop.time(), 0.01))
+    except asyncio.TimeoutError:
+        await _terminate(proc)
+        await _drain(pumps)
+        return {"returncode": -1, "stdout": out.text(), "stderr": f"TIMEOUT after {timeout:g}s"}
+    except asyncio.CancelledError:
+        await _terminate(proc)
+        await _drain(pumps)
+        raise
+    return {"returncode": returncode, "stdout": out.text(), "stderr": err.text()}
+
+
+async def _drain(pumps: asyncio.Future) -> None:
+    """进程终止后收尾读取任务（管道已关闭，通常立即结束）。"""
+    try:
+        await asyncio.wait_for(pumps, KILL_GRACE_SEC)
+    except (asyncio.TimeoutError, asyncio.CancelledError, Exception):
+        pumps.cancel()
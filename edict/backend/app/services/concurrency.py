@@ -0,0 +1,209 @@
+"""自适应并发控制 — 按观测到的延迟与错误率动态调整 agent / 桶的并发上限（AIMD）。
+
+原 DispatchWorker 用固定上限的信号量（快桶 4、慢桶 3），某个 agent 持续超时会一直占满
+所在桶的名额。这里每个 agent 和每个桶各有一个 AdaptiveLimit：
+- 成功且延迟不超过基线的 tolerance 倍：加性增长，每满一个「窗口」（limit 次完成）+1；
+  只在名额确实被用满时增长，空闲时上限不会无限上涨；
+- 失败 / 超时 / 延迟超过基线 tolerance 倍：乘性下降（limit × backoff）；
+  在上一次下降之前就已开始的请求不再触发下降（它们是在旧上限下发出的）；
+- 基线为该 agent 成功请求延迟的 EWMA。
+派发需依次取得 agent 名额与桶名额。错误只收缩出错 agent 自己的上限（backoff 0.5），
+桶只在 agent 相对自身基线变慢时缓慢收缩（backoff 0.9）：某个 agent 持续超时时，
+它让出的桶名额由健康的 agent 使用。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import contextlib
+import time
+from typing import AsyncIterator
+
+WINDOW = 200
+
+
+def _percentiles(values) -> dict[str, float]:
+    data = sorted(values)
+    if not data:
+        return {"p50": 0.0, "p90": 0.0, "p99": 0.0}
+
+    def _at(q: float) -> float:
+        return round(data[min(len(data) - 1, int(q * len(data)))], 3)
+
+    return {"p50": _at(0.50), "p90": _at(0.90), "p99": _at(0.99)}
+
+
+class AdaptiveLimit:
+    """一个 AIMD 并发上限 + FIFO 等待队列（单事件循环内使用）。"""
+
+    def __init__(self, name: str, initial: float, min_limit: float = 1, max_limit: float = 8,
+                 backoff: float = 0.7, tolerance: float = 2.0):
+        self.name = name
+        self.limit = float(initial)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.inflight = 0
+        self.baseline: float | None = None
+        self._last_drop = 0.0
+        self._waiters: collections.deque[asyncio.Future] = collections.deque()
+        self._latency: collections.deque[float] = collections.deque(maxlen=WINDOW)
+        self._wait: collections.deque[float] = collections.deque(maxlen=WINDOW)
+        self.counters = {"ok": 0, "errors": 0, "slow": 0, "increases": 0, "drops": 0}
+
+    def _has_room(self) -> bool:
+        return self.inflight < max(1, int(self.limit))
+
+    async def acquire(self) -> float:
+        """取得一个名额，返回排队等待秒数。"""
+        started = time.monotonic()
+        if self._has_room() and not self._waiters:
+            self.inflight += 1
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            self._waiters.append(fut)
+            try:
+                await fut                      # 唤醒方已代为 inflight += 1
+            except asyncio.CancelledError:
+                if fut.done() and not fut.cancelled():
+                    self._release_slot()       # 已分配名额但调用方被取消：归还
+                else:
+                    try:
+                        self._waiters.remove(fut)
+                    except ValueError:
+                        pass
+                raise
+        waited = time.monotonic() - started
+        self._wait.append(waited)
+        return waited
+
+    def _release_slot(self) -> None:
+        self.inflight -= 1
+        while self._waiters and self._has_room():
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self.inflight += 1
+                fut.set_result(None)
+
+    def release(self, started_at: float | None = None, verdict: str | None = None) -> None:
+        """归还名额；带判定（"ok" / "slow" / "error"）时据此调整上限。"""
+        if verdict is not None:
+            self.adjust(started_at or 0.0, verdict)
+        self._release_slot()
+
+    def observe(self, latency: float, ok: bool) -> str:
+        """记录一个样本，返回判定：ok / slow（延迟超过基线 tolerance 倍）/ error。"""
+        if not ok:
+            self.counters["errors"] += 1
+            return "error"
+        slow = self.baseline is not None and latency > self.tolerance * self.baseline
+        self.counters["ok"] += 1
+        self._latency.append(latency)
+        self.baseline = latency if self.baseline is None else 0.8 * self.baseline + 0.2 * latency
+        if slow:
+            self.counters["slow"] += 1
+            return "slow"
+        return "ok"
+
+    def adjust(self, started_at: float, verdict: str) -> None:
+        """按判定调整上限：ok 加性增长（名额用满时），slow / error 乘性下降。"""
+        if verdict == "ok":
+            saturated = self.inflight >= int(self.limit) or bool(self._waiters)
+            if saturated and self.limit < self.max_limit:
+                self.limit = min(self.max_limit, self.limit + 1.0 / max(1.0, self.limit))
+                self.counters["increases"] += 1
+        elif started_at >= self._last_drop:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+            self._last_drop = time.monotonic()
+            self.counters["drops"] += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "effective": max(1, int(self.limit)),
+            "inflight": self.inflight,
+            "waiting": len(self._waiters),
+            "baselineSec": round(self.baseline, 3) if self.baseline is not None else None,
+            "latencySec": _percentiles(self._latency),
+            "waitSec": _percentiles(self._wait),
+            **self.counters,
+        }
+
+
+class _Slot:
+    """一次派发占用的名额；调用方在结束前 record() 一个样本。"""
+
+    def __init__(self, waited: float):
+        self.waited = waited
+        self.started_at = time.monotonic()
+        self.latency: float | None = None
+        self.ok = True
+
+    def record(self, latency: float, ok: bool) -> None:
+        self.latency = latency
+        self.ok = ok
+
+
+class ConcurrencyController:
+    """agent 级 + 桶级自适应并发上限。
+
+    buckets: {name: {"agents": set, "limit": 初始上限, "max": 最大上限}}；
+    未列出的 agent 归入 default_bucket。
+    """
+
+    def __init__(self, buckets: dict[str, dict], default_bucket: str):
+        self._agent_bucket = {a: name for name, cfg in buckets.items() for a in cfg["agents"]}
+        self._bucket_cfg = buckets
+        self.default_bucket = default_bucket
+        self.buckets = {
+            name: AdaptiveLimit(f"bucket:{name}", cfg["limit"], min_limit=1,
+                                max_limit=cfg.get("max", cfg["limit"] * 2), backoff=0.9)
+            for name, cfg in buckets.items()
+        }
+        self.agents: dict[str, AdaptiveLimit] = {}
+
+    def bucket_of(self, agent: str) -> str:
+        return self._agent_bucket.get(agent, self.default_bucket)
+
+    def agent_limit(self, agent: str) -> AdaptiveLimit:
+        lim = self.agents.get(agent)
+        if lim is None:
+            cfg = self._bucket_cfg[self.bucket_of(agent)]
+            lim = self.agents[agent] = AdaptiveLimit(
+                f"agent:{agent}", cfg["limit"], min_limit=1,
+                max_limit=cfg.get("max", cfg["limit"] * 2), backoff=0.5)
+        return lim
+
+    @contextlib.asynccontextmanager
+    async def slot(self, agent: str) -> AsyncIterator[_Slot]:
+        """依次取得 agent 名额与桶名额；退出时归还并按记录的样本调整两级上限。
+
+        样本以 agent 自身的基线判定快慢（各 agent 正常耗时差异很大）。
+        错误只收缩该 agent 的上限；桶只对「变慢」收缩 —— 那意味着共享资源吃紧。
+        """
+        agent_lim = self.agent_limit(agent)
+        bucket_lim = self.buckets[self.bucket_of(agent)]
+        waited = await agent_lim.acquire()
+        try:
+            waited += await bucket_lim.acquire()
+        except BaseException:
+            agent_lim.release()
+            raise
+        slot = _Slot(waited)
+        try:
+            yield slot
+        finally:
+            verdict = None
+            if slot.latency is not None:
+                verdict = agent_lim.observe(slot.latency, slot.ok)
+                bucket_lim.observe(slot.latency, slot.ok)   # 仅用于桶级统计
+            bucket_lim.release(slot.started_at, None if verdict == "error" else verdict)
+            agent_lim.release(slot.started_at, verdict)
+
+    def snapshot(self) -> dict:
+        return {
+            "buckets": {name: lim.snapshot() for name, lim in self.buckets.items()},
+            "agents": {name: lim.snapshot() for name, lim in sorted(self.agents.items())},
+        }
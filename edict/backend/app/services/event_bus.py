@@ -38,6 +38,30 @@ TOPIC_AGENT_HEARTBEAT = "agent.heartbeat"
 
 # 所有 topic 对应的 Redis Stream key 前缀
 STREAM_PREFIX = "edict:stream:"
+# 跨进程租约 key 前缀
+LEASE_PREFIX = "edict:lease:"
+
+# 仅当持有者匹配时续期 / 释放（避免误删其他进程在过期后重新取得的租约）
+_LEASE_RENEW_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_LEASE_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# 仅当消费者没有 pending 事件时删除（检查与 DELCONSUMER 原子执行，避免丢弃刚读到的事件）
+_DELCONSUMER_IF_IDLE_LUA = """
+if #redis.call('XPENDING', KEYS[1], ARGV[1], '-', '+', 1, ARGV[2]) == 0 then
+  return redis.call('XGROUP', 'DELCONSUMER', KEYS[1], ARGV[1], ARGV[2])
+end
+return -1
+"""
 
 
 class EventBus:
@@ -78,14 +102,17 @@ class EventBus:
         producer: str,
         payload: dict[str, Any] | None = None,
         meta: dict[str, Any] | None = None,
+        event_id: str | None = None,
     ) -> str:
         """发布事件到 Redis Stream。
 
+        event_id 缺省时自动生成；OutboxRelay 传入 outbox 行的 event_id，供消费者幂等去重。
+
         Returns:
             event_id (str): 由 Redis 自动生成的 Stream entry ID
         """
         event = {
-            "event_id": str(uuid.uuid4()),
+            "event_id": event_id or str(uuid.uuid4()),
             "trace_id": trace_id,
             "timestamp": datetime.now(timezone.utc).isoformat(),
             "topic": topic,
@@ -152,6 +179,22 @@ class EventBus:
         await self.redis.xack(stream_key, group, entry_id)
         log.debug(f"✅ ACK {stream_key} [{entry_id}] group={group}")
 
+    async def ack_many(self, topic: str, group: str, entry_ids: list[str]):
+        """一次 XACK 确认多条事件。"""
+        if entry_ids:
+            await self.redis.xack(self._stream_key(topic), group, *entry_ids)
+
+    async def group_info(self, topic: str, group: str) -> dict:
+        """消费者组信息（pending、lag 等，lag 需 Redis 7+）；不存在返回空 dict。"""
+        try:
+            groups = await self.redis.xinfo_groups(self._stream_key(topic))
+        except aioredis.ResponseError:
+            return {}
+        for info in groups:
+            if info.get("name") == group:
+                return info
+        return {}
+
     async def get_pending(self, topic: str, group: str, count: int = 10) -> list:
         """查看未 ACK 的 pending 事件（用于诊断和恢复）。"""
         stream_key = self._stream_key(topic)
@@ -232,7 +275,7 @@ class EventBus:
     ) -> list[str]:
         """批量发布事件（pipeline 模式，减少 RTT）。
 
-        每个 event dict 须包含: topic, trace_id, event_type, producer, payload, meta(可选)
+        每个 event dict 须包含: topic, trace_id, event_type, producer, payload, meta(可选), event_id(可选)
         Returns:
             list of entry_ids
         """
@@ -240,14 +283,14 @@ class EventBus:
         for evt in events:
             topic = evt["topic"]
             event_data = {
-                "event_id": str(uuid.uuid4()),
+                "event_id": evt.get("event_id") or str(uuid.uuid4()),
                 "trace_id": evt["trace_id"],
                 "timestamp": datetime.now(timezone.utc).isoformat(),
                 "topic": topic,
                 "event_type": evt["event_type"],
                 "producer": evt["producer"],
-                "payload": json.dumps(evt.get("payload", {}), ensure_ascii=False),
-                "meta": json.dumps(evt.get("meta", {}), ensure_ascii=False),
+                "payload": json.dumps(evt.get("payload") or {}, ensure_ascii=False),
+                "meta": json.dumps(evt.get("meta") or {}, ensure_ascii=False),
             }
             stream_key = self._stream_key(topic)
             pipe.xadd(stream_key, event_data, maxlen=10000)
@@ -270,6 +313,65 @@ class EventBus:
             return pending[0].get("times_delivered", 0)
         return 0
 
+    async def touch_pending(self, topic: str, group: str, consumer: str, entry_ids: list[str]) -> None:
+        """重置自己在途 pending 事件的空闲时间（XCLAIM JUSTID），防止被其他副本的 claim_stale 认领。"""
+        if not entry_ids:
+            return
+        stream_key = self._stream_key(topic)
+        await self.redis.xclaim(
+            stream_key, group, consumer, min_idle_time=0, message_ids=entry_ids, justid=True
+        )
+
+    # ── 消费者清理 ──
+
+    async def consumers_info(self, topic: str, group: str) -> list[dict]:
+        """组内各消费者的 name / pending / idle；组不存在返回空列表。"""
+        try:
+            return await self.redis.xinfo_consumers(self._stream_key(topic), group)
+        except aioredis.ResponseError:
+            return []
+
+    async def delete_consumer_if_idle(self, topic: str, group: str, consumer: str) -> bool:
+        """消费者没有 pending 事件时从组中删除，返回是否删除。"""
+        result = await self.redis.eval(
+            _DELCONSUMER_IF_IDLE_LUA, 1, self._stream_key(topic), group, consumer
+        )
+        return int(result) >= 0
+
+    async def prune_consumers(
+        self, topic: str, group: str, min_idle_ms: int, keep: tuple[str, ...] = ()
+    ) -> list[str]:
+        """删除空闲超过 min_idle_ms 且没有 pending 事件的消费者（进程重启遗留的旧名字）。
+
+        被删的消费者若仍存活，下次 XREADGROUP 会自动重新加入组。
+        """
+        removed = []
+        for info in await self.consumers_info(topic, group):
+            name = info.get("name")
+            if not name or name in keep or info.get("pending", 0) or info.get("idle", 0) < min_idle_ms:
+                continue
+            if await self.delete_consumer_if_idle(topic, group, name):
+                removed.append(name)
+        if removed:
+            log.info(f"Pruned {len(removed)} idle consumers from {group}@{topic}: {removed}")
+        return removed
+
+    # ── 跨进程租约（SET NX PX）──
+
+    async def acquire_lease(self, name: str, owner: str, ttl_ms: int) -> bool:
+        """尝试取得租约；已被他人持有返回 False。"""
+        return bool(await self.redis.set(f"{LEASE_PREFIX}{name}", owner, nx=True, px=ttl_ms))
+
+    async def lease_owner(self, name: str) -> str | None:
+        return await self.redis.get(f"{LEASE_PREFIX}{name}")
+
+    async def renew_lease(self, name: str, owner: str, ttl_ms: int) -> bool:
+        """续期自己持有的租约；租约已过期或易主返回 False。"""
+        return bool(await self.redis.eval(_LEASE_RENEW_LUA, 1, f"{LEASE_PREFIX}{name}", owner, ttl_ms))
+
+    async def release_lease(self, name: str, owner: str) -> bool:
+        return bool(await self.redis.eval(_LEASE_RELEASE_LUA, 1, f"{LEASE_PREFIX}{name}", owner))
+
 
 # ── 全局单例 ──
 _bus: EventBus | None = None
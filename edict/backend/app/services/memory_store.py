@@ -0,0 +1,199 @@
+"""Agent 记忆存储 — 三级记忆（全局规则 / Agent 经验 / 任务决策链）的缓存读取与有界注入。
+
+原 _build_memory_context() 每次派发都重新读取并解析 shared_memory.json、
+agent_memory/<agent>.json、task_memory/<task>.json，并对全部记忆做一次元组排序。
+这里：
+- 每个文件按 (mtime_ns, size) 缓存解析结果及派生索引，文件不变时不再读盘；
+- Agent 记忆加载时建立 tag → 记忆下标 倒排表，并预排好「无 tag 命中」时的基础顺序；
+  查询只对命中 tag 的记忆打分，再与基础顺序归并取前 N 条（排序语义与原实现一致）；
+- 全局规则按内容归一化去重（同一条规则只保留最近一次）；
+- 注入内容受 token 预算约束：按 全局规则 → 上游决策链（新→旧）→ 历史经验（相关性高→低）
+  的优先级逐行装入，超出预算的行丢弃，输出顺序仍为 规则 → 经验 → 决策链。
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import json
+import os
+import pathlib
+import re
+import threading
+from typing import Any, Callable
+
+MAX_SHARED_RULES = 20
+MAX_AGENT_MEMORIES = 50
+DEFAULT_TOKEN_BUDGET = 2000
+
+_CJK_RE = re.compile(r"[\u3000-\u9fff\uff00-\uffef]")
+_WS_RE = re.compile(r"\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中日文字符按 1 个，其余按 4 个字符 1 个。"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def normalize_rule(content: str) -> str:
+    """规则去重用的归一化形式（折叠空白、忽略大小写）。"""
+    return _WS_RE.sub(" ", content or "").strip().lower()
+
+
+class _AgentMemories:
+    """一份 agent_memory/<agent>.json 的解析结果 + tag 倒排表。"""
+
+    def __init__(self, memories: list[dict]):
+        self.memories = [m for m in memories if isinstance(m, dict)]
+        self.by_tag: dict[str, list[int]] = {}
+        for i, m in enumerate(self.memories):
+            for tag in set(m.get("relevance_tags") or []):
+                self.by_tag.setdefault(tag, []).append(i)
+        # 无 tag 命中时的顺序：pinned 优先，其次 feedback，同分保持原顺序
+        self.base_order = sorted(range(len(self.memories)), key=lambda i: self._key(i, 0))
+
+    def _key(self, i: int, overlap: int) -> tuple:
+        m = self.memories[i]
+        return (-(1 if m.get("pinned") else 0), -overlap, -(1 if m.get("type") == "feedback" else 0), i)
+
+    def ranked(self, tags: set[str]):
+        """按 (pinned, tag 交集数, feedback) 降序产出记忆，同分保持文件中的顺序。"""
+        overlap: dict[int, int] = {}
+        for tag in tags:
+            for i in self.by_tag.get(tag, ()):
+                overlap[i] = overlap.get(i, 0) + 1
+        hits = sorted((self._key(i, n) for i, n in overlap.items()))
+        rest = (self._key(i, 0) for i in self.base_order if i not in overlap)
+        for key in heapq.merge(hits, rest):
+            yield self.memories[key[-1]]
+
+
+class MemoryStore:
+    """data/ 目录下三级记忆的读取缓存。线程安全。"""
+
+    def __init__(self, data_dir: pathlib.Path):
+        self.data_dir = pathlib.Path(data_dir)
+        self._lock = threading.Lock()
+        self._cache: dict[str, tuple[Any, Any]] = {}
+        self.hits = 0
+        self.loads = 0
+
+    def _cached(self, path: pathlib.Path, build: Callable[[Any], Any]) -> Any:
+        """按 (mtime_ns, size) 缓存 build(解析后的 JSON)；文件不存在或损坏返回 None。"""
+        key = str(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._cache.pop(key, None)
+            return None
+        sig = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit and hit[0] == sig:
+                self.hits += 1
+                return hit[1]
+        try:
+            value = build(json.loads(path.read_text(encoding="utf-8")))
+        except (json.JSONDecodeError, OSError, AttributeError, TypeError):
+            value = None
+        with self._lock:
+            self._cache[key] = (sig, value)
+            self.loads += 1
+        return value
+
+    # ── 三级记忆 ──
+
+    def shared_rules(self) -> list[str]:
+        """全局规则（按内容去重，同一规则只保留最近一次），最多 MAX_SHARED_RULES 条。"""
+        def _build(data):
+            seen: set[str] = set()
+            out: list[str] = []
+            for rule in reversed(data.get("rules", []) or []):
+                content = (rule.get("content", "") if isinstance(rule, dict) else "") or ""
+                norm = normalize_rule(content)
+                if norm and norm not in seen:
+                    seen.add(norm)
+                    out.append(content)
+            return out[:MAX_SHARED_RULES][::-1]
+        return self._cached(self.data_dir / "shared_memory.json", _build) or []
+
+    def agent_memories(self, agent_id: str) -> _AgentMemories | None:
+        path = self.data_dir / "agent_memory" / f"{agent_id}.json"
+        return self._cached(path, lambda data: _AgentMemories(data.get("memories", []) or []))
+
+    def task_chain(self, task_id: str) -> list[dict]:
+        path = self.data_dir / "task_memory" / f"{task_id}.json"
+        return self._cached(path, lambda data: [c for c in data.get("context_chain", []) or []
+                                                if isinstance(c, dict)]) or []
+
+    # ── 注入 ──
+
+    def build_context(self, agent_id: str, task_id: str, payload: dict,
+                      budget_tokens: int = DEFAULT_TOKEN_BUDGET) -> str:
+        """分层注入三级记忆：全局规则 → Agent 经验 → 任务上下文，总量不超过 budget_tokens。"""
+        remaining = [budget_tokens]
+
+        def _take(line: str) -> bool:
+            cost = estimate_tokens(line) + 1
+            if cost > remaining[0]:
+                return False
+            remaining[0] -= cost
+            return True
+
+        # 1. 全局共享记忆 — 优先装入
+        rule_lines = [f"- {r}" for r in self.shared_rules()]
+        rule_lines = [line for line in rule_lines if _take(line)]
+
+        # 2. 任务上下文记忆 — 从最新的决策开始装入
+        chain_lines = []
+        for c in reversed(self.task_chain(task_id)):
+            decisions = ", ".join(c.get("key_decisions", []))
+            warnings = ", ".join(c.get("warnings", []))
+            line = f"- [{c.get('phase', '')}] {c.get('agent', '')}: {decisions}"
+            if warnings:
+                line += f" ⚠️ {warnings}"
+            if not _take(line):
+                break
+            chain_lines.append(line)
+        chain_lines.reverse()
+
+        # 3. Agent 永久记忆 — 按相关性装入，最多 MAX_AGENT_MEMORIES 条
+        mem_lines = []
+        agent_mem = self.agent_memories(agent_id)
+        if agent_mem is not None:
+            task_tags = set(payload.get("tags", []) or [])
+            if payload.get("org"):
+                task_tags.add(payload["org"])
+            for m in itertools.islice(agent_mem.ranked(task_tags), MAX_AGENT_MEMORIES):
+                line = f"- [{m.get('type', '')}] {m.get('content', '')}"
+                if _take(line):
+                    mem_lines.append(line)
+
+        parts = []
+        if rule_lines:
+            parts.append("## 全局规则\n" + "\n".join(rule_lines))
+        if mem_lines:
+            parts.append("## 历史经验\n" + "\n".join(mem_lines))
+        if chain_lines:
+            parts.append("## 上游决策链\n" + "\n".join(chain_lines))
+        return "\n---\n".join(parts)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"files": len(self._cache), "hits": self.hits, "loads": self.loads}
+
+
+_STORES: dict[str, MemoryStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_memory_store(data_dir: pathlib.Path) -> MemoryStore:
+    """按 data 目录复用 MemoryStore（缓存跨派发保留）。"""
+    key = str(data_dir)
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            store = _STORES[key] = MemoryStore(pathlib.Path(data_dir))
+        return store
@@ -0,0 +1,138 @@
+"""Outbox 保留策略 — 分批清理已投递 / 已进入 DLQ 的 outbox_events 行，可选归档为压缩 JSONL。
+
+outbox_events 投递后从不删除，堆表与 ix_outbox_created_at 索引随 agent 流量持续增长。这里：
+- 已投递行在 outbox_retention_hours 之后删除；投递失败进入 DLQ 的行（attempts 达上限）
+  保留更久（outbox_dead_retention_hours），便于排查；
+- 按 id 分批 DELETE … WHERE id IN (SELECT … LIMIT n FOR UPDATE SKIP LOCKED) RETURNING，
+  每批一个短事务，不与 relay 争锁，也不会一次性产生大量死元组；
+- 配置 outbox_archive_dir 时，删除的行先写入归档文件再提交删除。每批每个创建日期一个文件
+  outbox-YYYYMMDD-<host>-<pid>-<首行 id>.jsonl.gz（临时文件写完后 rename），多个副本同时清理
+  也不会写同一个文件；提交失败可能导致重复归档，按 event_id 去重即可。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import pathlib
+import socket
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, delete, or_, select
+
+from ..config import get_settings
+from ..db import async_session
+from ..models.outbox import OutboxEvent
+
+log = logging.getLogger("edict.outbox_retention")
+
+_ARCHIVE_COLUMNS = (
+    OutboxEvent.id,
+    OutboxEvent.event_id,
+    OutboxEvent.created_at,
+    OutboxEvent.topic,
+    OutboxEvent.trace_id,
+    OutboxEvent.event_type,
+    OutboxEvent.producer,
+    OutboxEvent.payload,
+    OutboxEvent.meta,
+    OutboxEvent.published,
+    OutboxEvent.published_at,
+    OutboxEvent.attempts,
+    OutboxEvent.last_error,
+)
+
+
+def _row_to_dict(row) -> dict:
+    data = dict(row._mapping)
+    for key in ("created_at", "published_at"):
+        if data.get(key) is not None:
+            data[key] = data[key].isoformat()
+    return data
+
+
+def _write_archive(archive_dir: pathlib.Path, rows: list[dict], writer: str) -> None:
+    """一批行按创建日期写入各自的新文件 outbox-YYYYMMDD-<writer>-<首行 id>.jsonl.gz。"""
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    by_day: dict[str, list[dict]] = {}
+    for row in rows:
+        day = (row.get("created_at") or "")[:10].replace("-", "") or "unknown"
+        by_day.setdefault(day, []).append(row)
+    for day, day_rows in by_day.items():
+        first_id = min(r["id"] for r in day_rows)
+        path = archive_dir / f"outbox-{day}-{writer}-{first_id}.jsonl.gz"
+        tmp = path.with_name(path.name + ".tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            for row in day_rows:
+                f.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+        os.replace(tmp, path)
+
+
+class OutboxRetention:
+    """outbox_events 分批清理 + 可选归档。"""
+
+    def __init__(self, max_attempts: int):
+        self.max_attempts = max_attempts
+        self.writer = f"{socket.gethostname()}-{os.getpid()}"
+        self.stats = {"runs": 0, "deleted": 0, "archived": 0}
+
+    async def purge_once(self) -> int:
+        """清理所有超出保留期的行，返回删除行数。"""
+        settings = get_settings()
+        now = datetime.now(timezone.utc)
+        cutoff = now - timedelta(hours=settings.outbox_retention_hours)
+        dead_cutoff = now - timedelta(hours=settings.outbox_dead_retention_hours)
+        archive_dir = pathlib.Path(settings.outbox_archive_dir) if settings.outbox_archive_dir else None
+        expired = or_(
+            and_(OutboxEvent.published == True, OutboxEvent.created_at < cutoff),  # noqa: E712
+            and_(
+                OutboxEvent.published == False,  # noqa: E712
+                OutboxEvent.attempts >= self.max_attempts,
+                OutboxEvent.created_at < dead_cutoff,
+            ),
+        )
+        total = 0
+        while True:
+            async with async_session() as db:
+                ids = (
+                    select(OutboxEvent.id)
+                    .where(expired)
+                    .order_by(OutboxEvent.id)
+                    .limit(settings.outbox_purge_batch)
+                    .with_for_update(skip_locked=True)
+                    .scalar_subquery()
+                )
+                stmt = (
+                    delete(OutboxEvent)
+                    .where(OutboxEvent.id.in_(ids))
+                    .returning(*(_ARCHIVE_COLUMNS if archive_dir else (OutboxEvent.id,)))
+                    .execution_options(synchronize_session=False)
+                )
+                rows = (await db.execute(stmt)).all()
+                if rows and archive_dir:
+                    await asyncio.to_thread(
+                        _write_archive, archive_dir, [_row_to_dict(r) for r in rows], self.writer
+                    )
+                    self.stats["archived"] += len(rows)
+                await db.commit()
+            total += len(rows)
+            if len(rows) < settings.outbox_purge_batch:
+                break
+            await asyncio.sleep(0)  # 批间让出事件循环
+        self.stats["runs"] += 1
+        self.stats["deleted"] += total
+        if total:
+            log.info(f"🧹 Purged {total} outbox rows (archive={'on' if archive_dir else 'off'})")
+        return total
+
+    async def run(self, is_running) -> None:
+        """按 outbox_purge_interval_sec 周期清理，直到 is_running() 为假。"""
+        while is_running():
+            try:
+                await self.purge_once()
+            except Exception as e:
+                log.warning(f"Outbox purge failed: {e}")
+            await asyncio.sleep(get_settings().outbox_purge_interval_sec)
@@ -0,0 +1,139 @@
+"""Prompt 上下文组装缓存 — 供 DispatchWorker 拼装派发消息使用。
+
+原实现每个派发事件都重新读取 GLOBAL.md / groups/*.md / SOUL.md、skills/manifest.json
+与技能文件，并为每次重试重建任务上下文与提醒块。这里：
+- FileCache: 文本 / JSON 文件按 (mtime_ns, size) 缓存，文件不变时不再读盘与解析；
+- BlockMemo: 按 (task, state, version) 记忆纯由 payload 决定的上下文块（LRU，有上限），
+  同一任务几分钟内重试三次只组装一次；version 取 payload 中的版本字段，缺省为 payload 摘要；
+- ContextStats: 记录每个分段的字节数与组装耗时（最近值 / 均值 / 最大值），
+  用于定位是哪一层让 prompt 膨胀。
+"""
+
+from __future__ import annotations
+
+import collections
+import hashlib
+import json
+import os
+import pathlib
+import threading
+from typing import Any, Callable
+
+
+class FileCache:
+    """按 (mtime_ns, size) 缓存文件内容。线程安全。"""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: collections.OrderedDict[tuple[str, str], tuple[Any, Any]] = collections.OrderedDict()
+        self.hits = 0
+        self.loads = 0
+
+    def _get(self, path: pathlib.Path, kind: str, parse: Callable[[str], Any]) -> Any:
+        key = (str(path), kind)
+        try:
+            st = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._entries.pop(key, None)
+            return None
+        sig = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit and hit[0] == sig:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return hit[1]
+        try:
+            value = parse(pathlib.Path(path).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            value = None
+        with self._lock:
+            self._entries[key] = (sig, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.loads += 1
+        return value
+
+    def text(self, path: pathlib.Path) -> str | None:
+        """文件文本；不存在或不可读返回 None。"""
+        return self._get(path, "text", lambda s: s)
+
+    def json(self, path: pathlib.Path) -> Any:
+        """解析后的 JSON（共享对象，调用方只读）；不存在或损坏返回 None。"""
+        return self._get(path, "json", json.loads)
+
+
+def payload_version(payload: dict) -> str:
+    """payload 的版本标识：优先用显式版本/更新时间字段，否则取内容摘要。"""
+    for key in ("version", "updated_at", "updatedAt"):
+        if payload.get(key):
+            return str(payload[key])
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=12).hexdigest()
+
+
+class BlockMemo:
+    """按 key 记忆上下文块（LRU）。"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: collections.OrderedDict[tuple, Any] = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key: tuple, build: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        value = build()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.misses += 1
+        return value
+
+
+class ContextStats:
+    """各分段字节数与组装耗时的滚动统计。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.builds = 0
+        self._sections: dict[str, dict[str, float]] = {}
+        self._build_ms = {"last": 0.0, "total": 0.0, "max": 0.0}
+
+    def record(self, sizes: dict[str, int], build_ms: float) -> None:
+        with self._lock:
+            self.builds += 1
+            for name, size in sizes.items():
+                s = self._sections.setdefault(name, {"last": 0, "total": 0, "max": 0})
+                s["last"] = size
+                s["total"] += size
+                s["max"] = max(s["max"], size)
+            self._build_ms["last"] = build_ms
+            self._build_ms["total"] += build_ms
+            self._build_ms["max"] = max(self._build_ms["max"], build_ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            n = max(1, self.builds)
+            return {
+                "builds": self.builds,
+                "sections": {
+                    name: {"lastBytes": s["last"], "avgBytes": round(s["total"] / n), "maxBytes": s["max"]}
+                    for name, s in self._sections.items()
+                },
+                "buildMs": {
+                    "last": round(self._build_ms["last"], 3),
+                    "avg": round(self._build_ms["total"] / n, 3),
+                    "max": round(self._build_ms["max"], 3),
+                },
+            }
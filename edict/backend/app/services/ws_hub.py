@@ -0,0 +1,364 @@
+"""WebSocket 扇出中心 — 每个后端进程一条 Redis Pub/Sub 订阅，分发给所有 WebSocket 连接。
+
+原实现每个浏览器连接各建一个 Redis 客户端并 psubscribe("edict:pubsub:*")，
+/ws/task/{id} 还要对系统内每条事件做 JSON 解码才能按 task_id 过滤：
+N 个看板 = N 条 Redis 连接 + N 倍解码。这里：
+- WsHub 持有唯一的 psubscribe 连接（首个订阅者到来时启动，断线退避重连）；
+- 每条消息只解码一次（取 payload.task_id），推送帧直接拼接原始 JSON 文本，所有连接共用；
+- 订阅者按 全部 / topic / task_id 三张登记表索引，只投递给相关连接；
+  连接可再按 agent / event_type 过滤，并可开启心跳合并（每 agent 窗口内只发最新一条）
+  与批量发送，看单个任务的浏览器不再接收、解析整个事件流；
+- 每个连接一个有界发送队列 + 独立发送任务：慢连接不拖累其他连接。
+  队列满时按策略处理：drop_oldest 丢弃最旧的帧并计数（默认），disconnect 断开该连接。
+
+Subscriber 只依赖标准库；redis 与配置在 WsHub 中按需导入。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import json
+import logging
+import time
+from typing import Awaitable, Callable
+
+log = logging.getLogger("edict.ws_hub")
+
+CHANNEL_PREFIX = "edict:pubsub:"
+DEFAULT_QUEUE_SIZE = 256
+MAX_BATCH = 200
+# 默认参与合并的 topic（开启 coalesce_ms 时）：心跳只需最新值
+COALESCE_TOPICS = ("agent.heartbeat",)
+
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_DISCONNECT = "disconnect"
+
+
+def _agent_of(event: dict, payload) -> str | None:
+    """事件所属 agent：payload.agent，否则取 producer 形如 agent.<id> 的后缀。"""
+    if isinstance(payload, dict) and payload.get("agent"):
+        return str(payload["agent"])
+    producer = str(event.get("producer", ""))
+    return producer[len("agent."):] if producer.startswith("agent.") else None
+
+
+def _type_matches(event_type: str, patterns: set[str]) -> bool:
+    """event_type 过滤：精确匹配，或以 * 结尾的前缀匹配（如 agent.output*）。"""
+    if event_type in patterns:
+        return True
+    return any(p.endswith("*") and event_type.startswith(p[:-1]) for p in patterns)
+
+
+class Subscriber:
+    """一个 WebSocket 连接的订阅：过滤条件 + 有界发送队列 + 可选合并 / 批量发送。
+
+    过滤条件（均为可选，未设置表示不限）：topics、task_ids、agents、event_types，
+    在构造推送帧之前判断，不匹配的事件不占用该连接的任何开销。
+    coalesce_ms > 0 时，coalesce_topics 中的事件按 (topic, agent) 只保留窗口内最新一条；
+    batch_ms > 0 时，窗口内排队的事件合并为一帧 {"type":"batch","events":[…]} 发送。
+    """
+
+    def __init__(self, send: Callable[[str], Awaitable[None]], *, topics: set[str] | None = None,
+                 task_id: str | None = None, max_queue: int = DEFAULT_QUEUE_SIZE,
+                 policy: str = POLICY_DROP_OLDEST):
+        self.send = send
+        self.max_queue = max_queue
+        self.policy = policy
+        self.topics: set[str] | None = None
+        self.task_ids: set[str] | None = None
+        self.agents: set[str] | None = None
+        self.event_types: set[str] | None = None
+        self.coalesce_ms = 0
+        self.coalesce_topics: set[str] = set(COALESCE_TOPICS)
+        self.batch_ms = 0
+        self.set_filter(topics=topics, task_ids=[task_id] if task_id is not None else None)
+        self._queue: collections.deque[str] = collections.deque()
+        self._control: collections.deque[str] = collections.deque()
+        self._coalesced: dict[tuple[str, str], str] = {}
+        self._flush_at: float | None = None
+        self._ready = asyncio.Event()
+        self.closed = False
+        self.close_reason = ""
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.filtered = 0
+
+    def set_filter(self, *, topics=None, task_ids=None, agents=None, event_types=None,
+                   coalesce_ms: int = 0, coalesce_topics=None, batch_ms: int = 0) -> None:
+        """设置过滤 / 合并 / 批量参数（空列表等同于不限）。调用方负责在 hub 中重新登记。"""
+        self.topics = {str(t) for t in topics} if topics else None
+        self.task_ids = {str(t) for t in task_ids} if task_ids else None
+        self.agents = {str(a) for a in agents} if agents else None
+        self.event_types = {str(e) for e in event_types} if event_types else None
+        self.coalesce_ms = max(0, int(coalesce_ms or 0))
+        if coalesce_topics:
+            self.coalesce_topics = {str(t) for t in coalesce_topics}
+        self.batch_ms = max(0, int(batch_ms or 0))
+
+    def describe(self) -> dict:
+        return {
+            "topics": sorted(self.topics) if self.topics else None,
+            "task_ids": sorted(self.task_ids) if self.task_ids else None,
+            "agents": sorted(self.agents) if self.agents else None,
+            "event_types": sorted(self.event_types) if self.event_types else None,
+            "coalesce_ms": self.coalesce_ms,
+            "coalesce_topics": sorted(self.coalesce_topics) if self.coalesce_ms else None,
+            "batch_ms": self.batch_ms,
+        }
+
+    @property
+    def task_id(self) -> str | None:
+        """单任务订阅时的 task_id（兼容 /ws/task/{id}）。"""
+        return next(iter(self.task_ids)) if self.task_ids and len(self.task_ids) == 1 else None
+
+    def matches(self, topic: str, task_id: str | None, event: dict) -> bool:
+        if self.topics is not None and topic not in self.topics:
+            return False
+        if self.task_ids is not None and task_id not in self.task_ids:
+            return False
+        if self.agents is not None and _agent_of(event, event.get("payload")) not in self.agents:
+            return False
+        if self.event_types is not None and not _type_matches(str(event.get("event_type", "")), self.event_types):
+            return False
+        return True
+
+    def offer(self, topic: str, event: dict, frame: str) -> None:
+        """投递一条已匹配的事件：需要合并的进入合并槽，其余直接入队。"""
+        if self.coalesce_ms and topic in self.coalesce_topics:
+            key = (topic, _agent_of(event, event.get("payload")) or "")
+            if key in self._coalesced:
+                self.coalesced += 1
+            self._coalesced[key] = frame
+            if self._flush_at is None:
+                self._flush_at = time.monotonic() + self.coalesce_ms / 1000
+                self._ready.set()
+            return
+        self.push(frame)
+
+    def push(self, frame: str, force: bool = False) -> None:
+        """入队一帧；force 用于控制帧（pong 等），不受队列上限约束、不参与批量。"""
+        if self.closed:
+            return
+        if force:
+            self._control.append(frame)
+            self._ready.set()
+            return
+        if len(self._queue) >= self.max_queue:
+            if self.policy == POLICY_DISCONNECT:
+                self.close("slow consumer")
+                return
+            self._queue.popleft()
+            self.dropped += 1
+        self._queue.append(frame)
+        self._ready.set()
+
+    def close(self, reason: str = "") -> None:
+        self.closed = True
+        self.close_reason = reason
+        self._ready.set()
+
+    def _flush_coalesced(self) -> None:
+        if self._flush_at is not None and time.monotonic() >= self._flush_at:
+            coalesced, self._coalesced, self._flush_at = self._coalesced, {}, None
+            for frame in coalesced.values():
+                self.push(frame)
+
+    async def _send(self, frame: str) -> bool:
+        try:
+            await self.send(frame)
+        except Exception as e:
+            self.close(f"send failed: {e}")
+            return False
+        self.sent += 1
+        return True
+
+    async def run(self) -> None:
+        """发送循环：直到连接关闭（发送失败或被判定为慢连接）。"""
+        while not self.closed:
+            timeout = None
+            if self._flush_at is not None:
+                timeout = max(0.0, self._flush_at - time.monotonic())
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._ready.clear()
+            while self._control and not self.closed:
+                if not await self._send(self._control.popleft()):
+                    return
+            if self.batch_ms and self._queue:
+                await asyncio.sleep(self.batch_ms / 1000)   # 攒一个窗口
+            self._flush_coalesced()
+            if self.batch_ms:
+                while self._queue and not self.closed:
+                    frames = [self._queue.popleft() for _ in range(min(len(self._queue), MAX_BATCH))]
+                    if not await self._send('{"type":"batch","events":[' + ",".join(frames) + "]}"):
+                        return
+            else:
+                while self._queue and not self.closed:
+                    if not await self._send(self._queue.popleft()):
+                        return
+
+
+class WsHub:
+    """进程内 Redis Pub/Sub → WebSocket 扇出。单事件循环内使用。"""
+
+    def __init__(self, redis_url: str | None = None):
+        if redis_url is None:
+            from ..config import get_settings
+            redis_url = get_settings().redis_url
+        self._redis_url = redis_url
+        self._all: set[Subscriber] = set()
+        self._by_topic: dict[str, set[Subscriber]] = {}
+        self._by_task: dict[str, set[Subscriber]] = {}
+        self._reader: asyncio.Task | None = None
+        self.stats = {"messages": 0, "frames": 0, "decodeErrors": 0, "reconnects": 0,
+                      "slowDisconnects": 0, "droppedClosed": 0}
+
+    # ── 订阅登记 ──
+
+    def register(self, sub: Subscriber) -> Subscriber:
+        # 按最具选择性的条件登记；其余条件在 matches() 中判断
+        if sub.task_ids is not None:
+            for task_id in sub.task_ids:
+                self._by_task.setdefault(task_id, set()).add(sub)
+        elif sub.topics is not None:
+            for topic in sub.topics:
+                self._by_topic.setdefault(topic, set()).add(sub)
+        else:
+            self._all.add(sub)
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read_loop())
+        return sub
+
+    def resubscribe(self, sub: Subscriber, **filters) -> None:
+        """更新连接的过滤条件并重新登记索引。"""
+        self._deindex(sub)
+        sub.set_filter(**filters)
+        self.register(sub)
+
+    def unregister(self, sub: Subscriber) -> None:
+        if sub.close_reason == "slow consumer":
+            self.stats["slowDisconnects"] += 1
+        self.stats["droppedClosed"] += sub.dropped
+        sub.close(sub.close_reason or "unregistered")
+        self._deindex(sub)
+
+    def _deindex(self, sub: Subscriber) -> None:
+        self._all.discard(sub)
+        for registry in (self._by_topic, self._by_task):
+            for key in [k for k, subs in registry.items() if sub in subs]:
+                registry[key].discard(sub)
+                if not registry[key]:
+                    del registry[key]
+
+    def subscribers(self) -> set[Subscriber]:
+        subs = set(self._all)
+        for registry in (self._by_topic, self._by_task):
+            for group in registry.values():
+                subs |= group
+        return subs
+
+    # ── 扇出 ──
+
+    async def _read_loop(self) -> None:
+        import redis.asyncio as aioredis
+
+        backoff = 1.0
+        while True:
+            client = aioredis.from_url(self._redis_url, decode_responses=True)
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                log.info("WebSocket hub subscribed to Redis Pub/Sub")
+                backoff = 1.0
+                async for message in pubsub.listen():
+                    if message["type"] == "pmessage":
+                        self.fanout(message["channel"], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["reconnects"] += 1
+                log.warning(f"WebSocket hub Pub/Sub error, reconnecting in {backoff:.0f}s: {e}")
+            finally:
+                try:
+                    await pubsub.aclose()
+                    await client.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    def fanout(self, channel: str, raw: str) -> None:
+        """把一条 Pub/Sub 消息投递给相关订阅者（只解码一次，帧文本共享）。"""
+        self.stats["messages"] += 1
+        topic = channel[len(CHANNEL_PREFIX):] if channel.startswith(CHANNEL_PREFIX) else channel
+        try:
+            event = json.loads(raw) if isinstance(raw, str) else raw
+            payload = event.get("payload", {})
+            if isinstance(payload, str):
+                payload = json.loads(payload)
+            event["payload"] = payload
+        except (ValueError, AttributeError):
+            self.stats["decodeErrors"] += 1
+            return
+        task_id = payload.get("task_id") if isinstance(payload, dict) else None
+        task_id = str(task_id) if task_id is not None else None
+
+        candidates = set(self._all)
+        candidates |= self._by_topic.get(topic, set())
+        if task_id is not None:
+            candidates |= self._by_task.get(task_id, set())
+        if not candidates:
+            return
+        if not isinstance(raw, str):
+            raw = json.dumps(raw, ensure_ascii=False)
+        frame = None
+        for sub in candidates:
+            if not sub.matches(topic, task_id, event):
+                sub.filtered += 1
+                continue
+            if frame is None:
+                # 与原 send_json({"type", "topic", "data"}) 相同的结构，data 为原始事件文本
+                frame = f'{{"type":"event","topic":{json.dumps(topic, ensure_ascii=False)},"data":{raw}}}'
+            sub.offer(topic, event, frame)
+            self.stats["frames"] += 1
+
+    def broadcast(self, message: dict) -> None:
+        """向所有订阅者广播一条服务端消息。"""
+        frame = json.dumps(message, ensure_ascii=False)
+        for sub in self.subscribers():
+            sub.push(frame)
+
+    def snapshot(self) -> dict:
+        subs = self.subscribers()
+        return {
+            **self.stats,
+            "subscribers": len(subs),
+            "byTopic": {k: len(v) for k, v in self._by_topic.items()},
+            "byTask": len(self._by_task),
+            "queued": sum(len(s._queue) for s in subs),
+            "dropped": self.stats["droppedClosed"] + sum(s.dropped for s in subs),
+            "coalesced": sum(s.coalesced for s in subs),
+            "filtered": sum(s.filtered for s in subs),
+        }
+
+    async def close(self) -> None:
+        for sub in self.subscribers():
+            sub.close("server shutdown")
+        if self._reader is not None:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+
+
+_hub: WsHub | None = None
+
+
+def get_ws_hub() -> WsHub:
+    global _hub
+    if _hub is None:
+        _hub = WsHub()
+    return _hub
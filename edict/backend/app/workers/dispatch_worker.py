@@ -19,13 +19,17 @@ import os
 import pathlib
 import re
 import signal
-import subprocess
+import socket
 import tempfile
 import time
 import uuid
 from datetime import datetime, timezone
 
 from ..config import get_settings
+from ..services.agent_runner import run_streaming
+from ..services.concurrency import ConcurrencyController
+from ..services.memory_store import get_memory_store
+from ..services.prompt_cache import BlockMemo, ContextStats, FileCache, payload_version
 from ..services.event_bus import (
     EventBus,
     TOPIC_TASK_DISPATCH,
@@ -38,7 +42,98 @@ from ..services.event_bus import (
 log = logging.getLogger("edict.dispatcher")
 
 GROUP = "dispatcher"
-CONSUMER = "disp-1"
+# 认领其他消费者遗留 pending 事件的空闲阈值
+CLAIM_MIN_IDLE_MS = 60000
+CONSUMER_PRUNE_IDLE_MS = 3600_000   # 空闲超过 1 小时且无 pending 的消费者从组中删除
+# agent 输出行批量发布：攒够 OUTPUT_BATCH_LINES 行或每隔 OUTPUT_FLUSH_SEC 秒一次 publish_batch
+OUTPUT_BATCH_LINES = 50
+OUTPUT_FLUSH_SEC = 0.2
+
+
+def _consumer_name() -> str:
+    """每个进程唯一的消费者名（可用 DISPATCH_CONSUMER_ID 固定）。"""
+    return get_settings().dispatch_consumer_id or f"disp-{socket.gethostname()}-{os.getpid()}"
+
+# Prompt 组装缓存：markdown / 技能清单按 mtime 缓存，任务上下文块按 (task, state, version) 记忆
+_FILES = FileCache()
+_BLOCKS = BlockMemo()
+CONTEXT_STATS = ContextStats()
+
+
+def _dispatch_fields(event: dict) -> tuple[dict, str, str, str, str, str]:
+    """派发事件的常用字段：(payload, task_id, agent, message, trace_id, state)。"""
+    payload = event.get("payload", {})
+    return (
+        payload,
+        payload.get("task_id", ""),
+        payload.get("agent", ""),
+        payload.get("message", ""),
+        event.get("trace_id", ""),
+        payload.get("state", ""),
+    )
+
+
+class _LinePublisher:
+    """agent.output.line 的批量发布器。
+
+    逐行 XADD + PUBLISH 每行都要等一次 Redis 往返；这里按行缓冲，
+    攒够 OUTPUT_BATCH_LINES 行或每 OUTPUT_FLUSH_SEC 秒用一个 pipeline 发布，
+    close() 时发出剩余行。发布失败只记日志，不影响 agent 执行。
+    """
+
+    def __init__(self, bus: EventBus, trace_id: str, task_id: str, agent: str):
+        self.bus = bus
+        self.trace_id = trace_id
+        self.task_id = task_id
+        self.agent = agent
+        self._seq = 0
+        self._buf: list[dict] = []
+        self._lock = asyncio.Lock()          # 定时与满批两条路径串行发布，保证顺序
+        self._closed = asyncio.Event()
+        self._ticker: asyncio.Task | None = None
+
+    async def on_line(self, stream: str, line: str):
+        self._seq += 1
+        self._buf.append({
+            "topic": TOPIC_AGENT_THOUGHTS,
+            "trace_id": self.trace_id,
+            "event_type": "agent.output.line",
+            "producer": f"agent.{self.agent}",
+            "payload": {
+                "task_id": self.task_id,
+                "agent": self.agent,
+                "stream": stream,
+                "seq": self._seq,
+                "line": line,
+            },
+        })
+        if self._ticker is None:
+            self._ticker = asyncio.create_task(self._tick())
+        if len(self._buf) >= OUTPUT_BATCH_LINES:
+            await self.flush()
+
+    async def _tick(self):
+        while not self._closed.is_set():
+            try:
+                await asyncio.wait_for(self._closed.wait(), OUTPUT_FLUSH_SEC)
+            except asyncio.TimeoutError:
+                await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            if not self._buf:
+                return
+            batch, self._buf = self._buf, []
+            try:
+                await self.bus.publish_batch(batch)
+            except Exception as e:
+                log.debug(f"Publish {len(batch)} output lines for {self.task_id} failed: {e}")
+
+    async def close(self):
+        self._closed.set()
+        if self._ticker is not None:
+            await asyncio.gather(self._ticker, return_exceptions=True)
+        await self.flush()
 
 
 class DispatchError(Exception):
@@ -78,19 +173,15 @@ def _build_soul_context(agent_id: str) -> str:
     agents_dir = _resolve_agents_dir()
     parts = []
 
-    global_md = agents_dir / "GLOBAL.md"
-    if global_md.exists():
-        parts.append(global_md.read_text(encoding="utf-8"))
-
+    paths = [agents_dir / "GLOBAL.md"]
     group = _GROUP_MAP.get(agent_id)
     if group:
-        group_md = agents_dir / "groups" / f"{group}.md"
-        if group_md.exists():
-            parts.append(group_md.read_text(encoding="utf-8"))
-
-    soul_md = agents_dir / agent_id / "SOUL.md"
-    if soul_md.exists():
-        parts.append(soul_md.read_text(encoding="utf-8"))
+        paths.append(agents_dir / "groups" / f"{group}.md")
+    paths.append(agents_dir / agent_id / "SOUL.md")
+    for path in paths:
+        text = _FILES.text(path)
+        if text is not None:
+            parts.append(text)
 
     return "\n---\n".join(parts) if parts else ""
 
@@ -184,70 +275,10 @@ def _resolve_project_root() -> pathlib.Path:
 
 
 def _build_memory_context(agent_id: str, task_id: str, payload: dict) -> str:
-    """分层注入三级记忆：全局规则 → Agent 经验 → 任务上下文。"""
-    root = _resolve_project_root()
-    parts = []
-
-    # 1. 全局共享记忆 — 始终注入
-    shared_file = root / "data" / "shared_memory.json"
-    if shared_file.exists():
-        try:
-            shared = json.loads(shared_file.read_text(encoding="utf-8"))
-            rules = shared.get("rules", [])
-            if rules:
-                rule_lines = [r.get("content", "") for r in rules[-20:]]
-                parts.append("## 全局规则\n" + "\n".join(f"- {r}" for r in rule_lines if r))
-        except (json.JSONDecodeError, OSError):
-            pass
-
-    # 2. Agent 永久记忆 — 按相关性过滤，最多 50 条
-    agent_mem_file = root / "data" / "agent_memory" / f"{agent_id}.json"
-    if agent_mem_file.exists():
-        try:
-            agent_data = json.loads(agent_mem_file.read_text(encoding="utf-8"))
-            memories = agent_data.get("memories", [])
-            if memories:
-                # 相关性排序：pinned 优先，其次按 tags 交集匹配当前任务
-                task_tags = set(payload.get("tags", []))
-                task_org = payload.get("org", "")
-                if task_org:
-                    task_tags.add(task_org)
-
-                def _relevance(m):
-                    pinned = 1 if m.get("pinned") else 0
-                    overlap = len(task_tags & set(m.get("relevance_tags", [])))
-                    is_feedback = 1 if m.get("type") == "feedback" else 0
-                    return (pinned, overlap, is_feedback)
-
-                memories.sort(key=_relevance, reverse=True)
-                top = memories[:50]
-                mem_lines = [f"- [{m.get('type', '')}] {m.get('content', '')}" for m in top]
-                parts.append("## 历史经验\n" + "\n".join(mem_lines))
-        except (json.JSONDecodeError, OSError):
-            pass
-
-    # 3. 任务上下文记忆 — 完整注入上游 Agent 决策链
-    task_mem_file = root / "data" / "task_memory" / f"{task_id}.json"
-    if task_mem_file.exists():
-        try:
-            task_data = json.loads(task_mem_file.read_text(encoding="utf-8"))
-            chain = task_data.get("context_chain", [])
-            if chain:
-                chain_lines = []
-                for c in chain:
-                    decisions = ", ".join(c.get("key_decisions", []))
-                    warnings = ", ".join(c.get("warnings", []))
-                    line = f"- [{c.get('phase', '')}] {c.get('agent', '')}: {decisions}"
-                    if warnings:
-                        line += f" ⚠️ {warnings}"
-                    chain_lines.append(line)
-                parts.append("## 上游决策链\n" + "\n".join(chain_lines))
-        except (json.JSONDecodeError, OSError):
-            pass
-
-    if not parts:
-        return ""
-    return "\n---\n".join(parts)
+    """分层注入三级记忆：全局规则 → Agent 经验 → 任务上下文（缓存读取，受 token 预算约束）。"""
+    store = get_memory_store(_resolve_project_root() / "data")
+    return store.build_context(agent_id, task_id, payload,
+                               budget_tokens=get_settings().memory_context_tokens)
 
 
 # ── Prompt 注入检测 ──
@@ -277,13 +308,8 @@ def _sanitize_agent_output(output: str, agent_id: str) -> tuple[str, list[str]]:
 def _load_agent_skills(agent_id: str, payload: dict) -> str:
     """按任务特征动态加载 Agent Skills（延迟能力加载）。"""
     agents_dir = _resolve_agents_dir()
-    manifest_path = agents_dir / agent_id / "skills" / "manifest.json"
-    if not manifest_path.exists():
-        return ""
-
-    try:
-        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
-    except (json.JSONDecodeError, OSError):
+    manifest = _FILES.json(agents_dir / agent_id / "skills" / "manifest.json")
+    if not isinstance(manifest, dict):
         return ""
 
     task_tags = set(payload.get("tags", []))
@@ -294,54 +320,80 @@ def _load_agent_skills(agent_id: str, payload: dict) -> str:
         tag_match = task_tags & set(skill.get("match_tags", []))
         org_match = task_org in skill.get("match_orgs", [])
         if tag_match or org_match:
-            skill_path = agents_dir / agent_id / "skills" / skill["file"]
-            if skill_path.exists():
-                try:
-                    matched_skills.append(skill_path.read_text(encoding="utf-8"))
-                except OSError:
-                    pass
+            text = _FILES.text(agents_dir / agent_id / "skills" / skill["file"])
+            if text is not None:
+                matched_skills.append(text)
 
     if matched_skills:
         return "## 本次任务相关技能\n" + "\n---\n".join(matched_skills)
     return ""
 
 
+def _assemble_message(agent_id: str, task_id: str, message: str, payload: dict) -> tuple[str, dict, float]:
+    """组装派发消息（任务上下文 → 记忆 → 技能 → 提醒），返回 (消息, 各分段字节数, 耗时 ms)。
+
+    任务上下文与提醒只由 payload 决定，按 (task, state, agent, version) 记忆，重试时直接复用；
+    记忆与技能文件由各自的缓存按 mtime 失效。
+    """
+    started = time.perf_counter()
+    task_context, reminder = _BLOCKS.get_or_build(
+        (task_id, payload.get("state", ""), agent_id, payload_version(payload)),
+        lambda: (_build_task_context(payload), _build_reminder(agent_id, payload)),
+    )
+    memory_context = _build_memory_context(agent_id, task_id, payload)
+    skills_context = _load_agent_skills(agent_id, payload)
+    enriched_message = message
+    if task_context:
+        enriched_message = f"{message}\n\n---\n{task_context}"
+    if memory_context:
+        enriched_message = f"{enriched_message}\n\n---\n{memory_context}"
+    if skills_context:
+        enriched_message = f"{enriched_message}\n\n---\n{skills_context}"
+    if reminder:
+        enriched_message = f"{enriched_message}\n{reminder}"
+
+    sections = {"message": message, "task": task_context, "memory": memory_context,
+                "skills": skills_context, "reminder": reminder}
+    sizes = {name: len(block.encode("utf-8")) for name, block in sections.items()}
+    build_ms = (time.perf_counter() - started) * 1000
+    CONTEXT_STATS.record(sizes, build_ms)
+    return enriched_message, sizes, build_ms
+
+
 class DispatchWorker:
-    """Agent 派发 Worker — 快慢 Agent 分桶并发控制。"""
+    """Agent 派发 Worker — 快慢 Agent 分桶 + 自适应并发控制。"""
 
-    # 快/慢 Agent 分桶 — 互不阻塞
+    # 快/慢 Agent 分桶 — 互不阻塞；limit 为初始上限，实际上限按延迟与错误率在 [1, max] 内调整
     _BUCKET_CONFIG = {
-        "fast": {"agents": {"taizi", "zhongshu", "menxia", "shangshu", "zaochao"}, "limit": 4},
-        "slow": {"agents": {"hubu", "libu", "bingbu", "xingbu", "gongbu", "libu_hr"}, "limit": 3},
+        "fast": {"agents": {"taizi", "zhongshu", "menxia", "shangshu", "zaochao"}, "limit": 4, "max": 8},
+        "slow": {"agents": {"hubu", "libu", "bingbu", "xingbu", "gongbu", "libu_hr"}, "limit": 3, "max": 6},
     }
 
     def __init__(self):
         self.bus = EventBus()
         self._running = False
-        self._buckets: dict[str, asyncio.Semaphore] = {
-            name: asyncio.Semaphore(cfg["limit"])
-            for name, cfg in self._BUCKET_CONFIG.items()
-        }
+        # 未知 Agent 归入慢桶
+        self._limits = ConcurrencyController(self._BUCKET_CONFIG, default_bucket="slow")
+        self.consumer = _consumer_name()
         self._active_tasks: dict[str, asyncio.Task] = {}
-        self._inflight: set[str] = set()
-        # 执行时间记录（仅用于监控告警）
-        self._durations: dict[str, list[float]] = {}
-
-    def _get_bucket(self, agent_id: str) -> asyncio.Semaphore:
-        """根据 agent 类型返回对应桶的信号量。"""
-        for name, cfg in self._BUCKET_CONFIG.items():
-            if agent_id in cfg["agents"]:
-                return self._buckets[name]
-        return self._buckets["slow"]  # 未知 Agent 归入慢桶
+        # 本进程在途派发 task_id → entry_id；跨进程去重靠 Redis 租约 dispatch:<task_id>
+        self._inflight: dict[str, str] = {}
+        self._background: list[asyncio.Task] = []
 
     async def start(self):
         await self.bus.connect()
         await self.bus.ensure_consumer_group(TOPIC_TASK_DISPATCH, GROUP)
         self._running = True
-        log.info("🚀 Dispatch worker started")
-
-        # 恢复崩溃遗留
-        await self._recover_pending()
+        log.info(f"🚀 Dispatch worker started (consumer={self.consumer})")
+
+        self._background = [
+            # 定期发布并发状态（当前上限、排队等待、延迟分位数）
+            asyncio.create_task(self._publish_stats_loop()),
+            # 续期在途租约 + 刷新自己 pending 事件的空闲时间
+            asyncio.create_task(self._lease_loop()),
+            # 定期认领崩溃副本遗留的 pending 事件（启动时先执行一次）
+            asyncio.create_task(self._reclaim_loop()),
+        ]
 
         while self._running:
             try:
@@ -350,92 +402,184 @@ class DispatchWorker:
                 log.error(f"Dispatch poll error: {e}", exc_info=True)
                 await asyncio.sleep(2)
 
+    def context_stats(self) -> dict:
+        """Prompt 组装统计：各分段字节数、组装耗时与缓存命中。"""
+        return {
+            **CONTEXT_STATS.snapshot(),
+            "files": {"hits": _FILES.hits, "loads": _FILES.loads},
+            "blocks": {"hits": _BLOCKS.hits, "misses": _BLOCKS.misses},
+        }
+
+    def concurrency_stats(self) -> dict:
+        """自适应并发状态：各桶 / 各 agent 的当前上限、在途数、排队等待与延迟分位数。"""
+        return self._limits.snapshot()
+
+    async def _publish_stats_loop(self):
+        interval = get_settings().heartbeat_interval_sec
+        while self._running:
+            await asyncio.sleep(interval)
+            try:
+                await self.bus.publish(
+                    topic=TOPIC_AGENT_HEARTBEAT,
+                    trace_id="",
+                    event_type="dispatch.concurrency",
+                    producer="dispatcher",
+                    payload=self.concurrency_stats(),
+                )
+            except Exception as e:
+                log.debug(f"Publish concurrency stats failed: {e}")
+
     async def stop(self):
         self._running = False
-        # 等待进行中的 agent 调用完成
+        for t in self._background:
+            t.cancel()
+        log.info(f"Prompt context stats: {self.context_stats()}")
+        log.info(f"Concurrency stats: {self.concurrency_stats()}")
+        # 等待进行中的 agent 调用完成；超过宽限期则取消（终止子进程，事件不 ACK，稍后重投递）
         if self._active_tasks:
-            log.info(f"Waiting for {len(self._active_tasks)} active dispatches...")
-            await asyncio.gather(*self._active_tasks.values(), return_exceptions=True)
+            tasks = list(self._active_tasks.values())
+            grace = get_settings().dispatch_stop_grace_sec
+            log.info(f"Waiting up to {grace}s for {len(tasks)} active dispatches...")
+            _, pending = await asyncio.wait(tasks, timeout=grace)
+            if pending:
+                log.warning(f"Cancelling {len(pending)} active dispatches")
+                for t in pending:
+                    t.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+        # 每次启动的消费者名不同：没有遗留 pending 时把自己移出组，避免组内消费者越积越多
+        try:
+            if await self.bus.delete_consumer_if_idle(TOPIC_TASK_DISPATCH, GROUP, self.consumer):
+                log.info(f"Removed consumer {self.consumer} from group {GROUP}")
+        except Exception as e:
+            log.debug(f"Remove consumer {self.consumer} failed: {e}")
         await self.bus.close()
         log.info("Dispatch worker stopped")
 
+    def _lease_ms(self) -> int:
+        return get_settings().dispatch_lease_ttl_sec * 1000
+
+    async def _lease_loop(self):
+        interval = max(1.0, get_settings().dispatch_lease_ttl_sec / 3)
+        while self._running:
+            await asyncio.sleep(interval)
+            try:
+                for task_id, entry_id in list(self._inflight.items()):
+                    ok = await self.bus.renew_lease(
+                        f"dispatch:{task_id}", f"{self.consumer}|{entry_id}", self._lease_ms()
+                    )
+                    if not ok:
+                        log.warning(f"⚠️ Lost dispatch lease for {task_id} (expired or taken over)")
+                await self.bus.touch_pending(
+                    TOPIC_TASK_DISPATCH, GROUP, self.consumer, list(self._inflight.values())
+                )
+            except Exception as e:
+                log.warning(f"Lease renewal failed: {e}")
+
+    async def _reclaim_loop(self):
+        interval = get_settings().dispatch_reclaim_interval_sec
+        while self._running:
+            try:
+                await self._recover_pending()
+                # 崩溃副本的 pending 认领完后，其消费者名已无用
+                await self.bus.prune_consumers(
+                    TOPIC_TASK_DISPATCH, GROUP, CONSUMER_PRUNE_IDLE_MS, keep=(self.consumer,)
+                )
+            except Exception as e:
+                log.warning(f"Reclaim sweep failed: {e}")
+            await asyncio.sleep(interval)
+
     async def _recover_pending(self):
         events = await self.bus.claim_stale(
-            TOPIC_TASK_DISPATCH, GROUP, CONSUMER, min_idle_ms=60000, count=20
+            TOPIC_TASK_DISPATCH, GROUP, self.consumer, min_idle_ms=CLAIM_MIN_IDLE_MS, count=20
         )
         if events:
             log.info(f"Recovering {len(events)} stale dispatch events")
             for entry_id, event in events:
-                await self._dispatch(entry_id, event)
+                self._spawn(entry_id, event)
 
     async def _poll_cycle(self):
         events = await self.bus.consume(
-            TOPIC_TASK_DISPATCH, GROUP, CONSUMER, count=3, block_ms=2000
+            TOPIC_TASK_DISPATCH, GROUP, self.consumer, count=3, block_ms=2000
         )
         for entry_id, event in events:
-            # 每个派发在独立任务中执行，带并发控制
-            task = asyncio.create_task(self._dispatch(entry_id, event))
-            task_id = event.get("payload", {}).get("task_id", entry_id)
-            self._active_tasks[task_id] = task
-            task.add_done_callback(lambda t, tid=task_id: self._active_tasks.pop(tid, None))
+            self._spawn(entry_id, event)
+
+    def _spawn(self, entry_id: str, event: dict):
+        # 每个派发在独立任务中执行，带并发控制
+        if entry_id in self._active_tasks:
+            return
+        task = asyncio.create_task(self._dispatch(entry_id, event))
+        self._active_tasks[entry_id] = task
+        task.add_done_callback(lambda t, eid=entry_id: self._active_tasks.pop(eid, None))
 
     async def _dispatch(self, entry_id: str, event: dict):
         """执行一次 agent 派发（桶级并发控制）。"""
-        payload = event.get("payload", {})
-        task_id = payload.get("task_id", "")
-        agent = payload.get("agent", "")
-        message = payload.get("message", "")
-        trace_id = event.get("trace_id", "")
-        state = payload.get("state", "")
-
-        # 去重：同一任务如果已在派发中，跳过并 ACK
+        fields = _dispatch_fields(event)
+        task_id = fields[1]
+
+        # 去重：同一任务如果已在派发中（本进程或其他副本），跳过并 ACK
         if task_id in self._inflight:
-            log.warning(f"⚡ Skipping duplicate dispatch for task {task_id} (already in-flight)")
-            await self.bus.ack(TOPIC_TASK_DISPATCH, GROUP, entry_id)
+            if self._inflight[task_id] != entry_id:
+                log.warning(f"⚡ Skipping duplicate dispatch for task {task_id} (already in-flight)")
+                await self.bus.ack(TOPIC_TASK_DISPATCH, GROUP, entry_id)
             return
-        self._inflight.add(task_id)
+        lease = f"dispatch:{task_id}"
+        owner = f"{self.consumer}|{entry_id}"
+        if not await self.bus.acquire_lease(lease, owner, self._lease_ms()):
+            holder = await self.bus.lease_owner(lease) or ""
+            if holder.endswith(f"|{entry_id}"):
+                # 同一事件仍在其他副本执行（被认领得过早）：不 ACK，由持有者完成后 ACK
+                log.info(f"⏳ Dispatch {task_id} [{entry_id}] still running on {holder.split('|')[0]}")
+            else:
+                log.warning(f"⚡ Skipping duplicate dispatch for task {task_id} (in-flight on {holder})")
+                await self.bus.ack(TOPIC_TASK_DISPATCH, GROUP, entry_id)
+            return
+        self._inflight[task_id] = entry_id
+        try:
+            await self._dispatch_leased(entry_id, fields)
+        finally:
+            self._inflight.pop(task_id, None)
+            try:
+                await self.bus.release_lease(lease, owner)
+            except Exception as e:
+                log.debug(f"Release lease {lease} failed: {e}")  # 租约到期自动释放
 
-        sem = self._get_bucket(agent)
-        async with sem:
+    async def _dispatch_leased(self, entry_id: str, fields: tuple):
+        """持有任务租约后执行派发；fields 见 _dispatch_fields。"""
+        payload, task_id, agent, message, trace_id, state = fields
 
-            log.info(f"🔄 Dispatching task {task_id} → agent '{agent}' state={state}")
+        async with self._limits.slot(agent) as slot:
+
+            log.info(
+                f"🔄 Dispatching task {task_id} → agent '{agent}' state={state} "
+                f"(waited {slot.waited:.1f}s)"
+            )
 
             # 组装富上下文
-            task_context = _build_task_context(payload)
-            reminder = _build_reminder(agent, payload)
-            memory_context = _build_memory_context(agent, task_id, payload)
-            skills_context = _load_agent_skills(agent, payload)
-            enriched_message = message
-            if task_context:
-                enriched_message = f"{message}\n\n---\n{task_context}"
-            if memory_context:
-                enriched_message = f"{enriched_message}\n\n---\n{memory_context}"
-            if skills_context:
-                enriched_message = f"{enriched_message}\n\n---\n{skills_context}"
-            if reminder:
-                enriched_message = f"{enriched_message}\n{reminder}"
-
-            # 发布心跳
+            enriched_message, context_bytes, build_ms = _assemble_message(agent, task_id, message, payload)
+            log.debug(f"Context for {task_id}: {context_bytes} ({build_ms:.1f}ms)")
+
+            # 发布心跳（附各分段字节数，便于定位 prompt 膨胀来源）
             await self.bus.publish(
                 topic=TOPIC_AGENT_HEARTBEAT,
                 trace_id=trace_id,
                 event_type="agent.dispatch.start",
                 producer="dispatcher",
-                payload={"task_id": task_id, "agent": agent},
+                payload={
+                    "task_id": task_id,
+                    "agent": agent,
+                    "context_bytes": context_bytes,
+                    "context_build_ms": round(build_ms, 3),
+                    "queue_wait_sec": round(slot.waited, 3),
+                },
             )
 
             try:
-                start_time = time.monotonic()
-                result = await self._call_openclaw(agent, enriched_message, task_id, trace_id, payload)
-                elapsed = time.monotonic() - start_time
-
-                # 记录执行时间（仅用于监控和告警）
-                self._durations.setdefault(agent, []).append(elapsed)
-                if len(self._durations[agent]) > 20:
-                    self._durations[agent] = self._durations[agent][-20:]
-                avg = sum(self._durations[agent]) / len(self._durations[agent])
-                if elapsed > 2 * avg and elapsed > 120:
-                    log.warning(f"⚠️ Agent {agent} slowdown: {elapsed:.0f}s (avg: {avg:.0f}s)")
+                result, elapsed = await self._call_in_slot(
+                    slot, agent, enriched_message, task_id, trace_id, payload)
+                baseline = self._limits.agent_limit(agent).baseline
+                if baseline and elapsed > 2 * baseline and elapsed > 120:
+                    log.warning(f"⚠️ Agent {agent} slowdown: {elapsed:.0f}s (baseline: {baseline:.0f}s)")
 
                 # Prompt 注入检测
                 stdout = result.get("stdout", "")
@@ -536,8 +680,23 @@ class DispatchWorker:
             except Exception as e:
                 log.error(f"❌ Dispatch failed: task {task_id} → {agent}: {e}", exc_info=True)
                 # 不 ACK → Redis 会重新投递给其他消费者
-            finally:
-                self._inflight.discard(task_id)
+
+    async def _call_in_slot(self, slot, agent: str, message: str, task_id: str,
+                            trace_id: str, payload: dict) -> tuple[dict, float]:
+        """在已占用的并发名额内调用 agent，返回 (结果, 耗时)。
+
+        样本驱动并发上限调整：失败 / 超时收缩，健康则增长；
+        调用本身抛异常也记一个失败样本，否则名额按成功归还。
+        """
+        start_time = time.monotonic()
+        try:
+            result = await self._call_openclaw(agent, message, task_id, trace_id, payload)
+        except Exception:
+            slot.record(time.monotonic() - start_time, ok=False)
+            raise
+        elapsed = time.monotonic() - start_time
+        slot.record(elapsed, ok=result.get("returncode") == 0)
+        return result, elapsed
 
     async def _call_openclaw(
         self,
@@ -547,7 +706,7 @@ class DispatchWorker:
         trace_id: str,
         payload: dict | None = None,
     ) -> dict:
-        """异步调用 OpenClaw CLI — 在线程池中执行，带富上下文注入。"""
+        """异步调用 OpenClaw CLI — asyncio 子进程执行，输出逐行回传，带富上下文注入。"""
         settings = get_settings()
         cmd = [
             settings.openclaw_bin,
@@ -599,35 +758,25 @@ class DispatchWorker:
 
         log.debug(f"Executing: {' '.join(cmd)}")
 
-        def _run():
-            try:
-                proc = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=300,
-                    env=env,
-                    cwd=settings.openclaw_project_dir or None,
-                )
-                return {
-                    "returncode": proc.returncode,
-                    "stdout": proc.stdout[-5000:] if proc.stdout else "",
-                    "stderr": proc.stderr[-2000:] if proc.stderr else "",
-                }
-            except subprocess.TimeoutExpired:
-                return {"returncode": -1, "stdout": "", "stderr": "TIMEOUT after 300s"}
-            except FileNotFoundError:
-                return {"returncode": -1, "stdout": "", "stderr": "openclaw command not found"}
-            finally:
-                # 清理临时上下文文件
-                if context_file:
-                    try:
-                        os.unlink(context_file)
-                    except OSError:
-                        pass
-
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, _run)
+        # 逐行回传输出（批量发布）：看板实时看到 agent 进展
+        lines = _LinePublisher(self.bus, trace_id, task_id, agent)
+
+        try:
+            return await run_streaming(
+                cmd,
+                env=env,
+                cwd=settings.openclaw_project_dir or None,
+                timeout=settings.agent_timeouts.get(agent, settings.dispatch_timeout_sec),
+                on_line=lines.on_line,
+            )
+        finally:
+            await lines.close()
+            # 清理临时上下文文件
+            if context_file:
+                try:
+                    os.unlink(context_file)
+                except OSError:
+                    pass
 
 
 async def run_dispatcher():
@@ -0,0 +1,301 @@
+"""Event Archiver Worker — 把 Redis Streams 中的事件批量写入 Postgres events 表。
+
+Redis Stream 以 maxlen=10000 截断，旧事件会被丢弃；GET /api/events 查询的 events 表
+此前无人写入。本 worker：
+- 以独立消费者组 archiver 订阅全部 topic（新建组从流的开头读，首次启动即回填现存事件）
+- 每块最多 BATCH_SIZE 行（XREADGROUP 的 count 按 stream 计，一次读取可能远多于此，
+  分块也让绑定参数数远低于 asyncpg 的 32767 上限），一条多行
+  INSERT … ON CONFLICT (event_id) DO NOTHING 写入，提交后再 ACK：崩溃重放只会产生被忽略的重复行
+- 整块写入因数据错误失败时逐行重试，仍失败的事件发到 dead_letter 后 ACK，不阻塞其余事件；
+  连接类错误不逐行重试，整块不 ACK 等待重投递
+- 事件缺少合法 event_id 时以 (stream, entry_id) 生成确定性 UUID，同样幂等
+- 跳过 event_archive_skip_types 中的高频事件类型（默认 agent.output.line，
+  完整输出已在 agent.output 中）
+- 定期认领崩溃消费者遗留的 pending 事件，删除空闲且无 pending 的旧消费者（停止时也移除自己），
+  并把积压（lag / pending / 最近归档事件时间）写入 Redis edict:archiver:stats，
+  供 GET /api/admin/archiver 查看
+"""
+
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import time
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import InterfaceError, OperationalError, StatementError
+
+from ..config import get_settings
+from ..db import async_session
+from ..models.event import Event
+from ..services.event_bus import (
+    EventBus,
+    STREAM_PREFIX,
+    TOPIC_TASK_CREATED,
+    TOPIC_TASK_PLANNING_REQUEST,
+    TOPIC_TASK_PLANNING_COMPLETE,
+    TOPIC_TASK_REVIEW_REQUEST,
+    TOPIC_TASK_REVIEW_RESULT,
+    TOPIC_TASK_DISPATCH,
+    TOPIC_TASK_STATUS,
+    TOPIC_TASK_COMPLETED,
+    TOPIC_TASK_CLOSED,
+    TOPIC_TASK_REPLAN,
+    TOPIC_TASK_STALLED,
+    TOPIC_TASK_ESCALATED,
+    TOPIC_AGENT_THOUGHTS,
+    TOPIC_AGENT_TODO_UPDATE,
+    TOPIC_AGENT_HEARTBEAT,
+)
+
+log = logging.getLogger("edict.archiver")
+
+GROUP = "archiver"
+BATCH_SIZE = 500
+STATS_KEY = "edict:archiver:stats"
+STATS_INTERVAL = 15.0  # 秒
+CLAIM_MIN_IDLE_MS = 60000
+CONSUMER_PRUNE_IDLE_MS = 3600_000   # 空闲超过 1 小时且无 pending 的消费者从组中删除
+
+ARCHIVED_TOPICS = [
+    TOPIC_TASK_CREATED,
+    TOPIC_TASK_PLANNING_REQUEST,
+    TOPIC_TASK_PLANNING_COMPLETE,
+    TOPIC_TASK_REVIEW_REQUEST,
+    TOPIC_TASK_REVIEW_RESULT,
+    TOPIC_TASK_DISPATCH,
+    TOPIC_TASK_STATUS,
+    TOPIC_TASK_COMPLETED,
+    TOPIC_TASK_CLOSED,
+    TOPIC_TASK_REPLAN,
+    TOPIC_TASK_STALLED,
+    TOPIC_TASK_ESCALATED,
+    TOPIC_AGENT_THOUGHTS,
+    TOPIC_AGENT_TODO_UPDATE,
+    TOPIC_AGENT_HEARTBEAT,
+    "dead_letter",
+]
+
+
+def _event_uuid(topic: str, entry_id: str, event: dict) -> uuid.UUID:
+    try:
+        return uuid.UUID(str(event.get("event_id", "")))
+    except ValueError:
+        return uuid.uuid5(uuid.NAMESPACE_URL, f"{STREAM_PREFIX}{topic}/{entry_id}")
+
+
+def _event_time(event: dict) -> datetime:
+    try:
+        ts = datetime.fromisoformat(str(event.get("timestamp", "")))
+        return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+    except ValueError:
+        return datetime.now(timezone.utc)
+
+
+def _is_row_error(e: Exception) -> bool:
+    """单行数据导致的错误（类型、编码、约束等）；连接 / 超时类错误返回 False。"""
+    return (
+        isinstance(e, StatementError)
+        and not isinstance(e, (OperationalError, InterfaceError))
+        and not getattr(e, "connection_invalidated", False)
+    )
+
+
+def _to_row(topic: str, entry_id: str, event: dict) -> dict:
+    return {
+        "event_id": _event_uuid(topic, entry_id, event),
+        "trace_id": str(event.get("trace_id", "")),
+        "timestamp": _event_time(event),
+        "topic": event.get("topic") or topic,
+        "event_type": event.get("event_type", ""),
+        "producer": event.get("producer", ""),
+        "payload": event.get("payload") or {},
+        "meta": event.get("meta") or {},
+    }
+
+
+class EventArchiver:
+    """消费全部 topic，批量归档到 events 表。"""
+
+    def __init__(self):
+        self.bus = EventBus()
+        self.consumer = f"arch-{socket.gethostname()}-{os.getpid()}"
+        self._running = False
+        self._background: list[asyncio.Task] = []
+        self._skip_types = set(get_settings().event_archive_skip_types)
+        self.stats = {"archived": 0, "skipped": 0, "deadLettered": 0, "batches": 0,
+                      "lastEventAt": None, "lastBatchMs": 0.0}
+
+    async def start(self):
+        await self.bus.connect()
+        for topic in ARCHIVED_TOPICS:
+            await self.bus.ensure_consumer_group(topic, GROUP)
+        self._running = True
+        log.info(f"🗄️ Event archiver started (consumer={self.consumer})")
+
+        self._background = [
+            asyncio.create_task(self._reclaim_loop()),
+            asyncio.create_task(self._stats_loop()),
+        ]
+
+        while self._running:
+            try:
+                events = await self.bus.consume_multi(
+                    ARCHIVED_TOPICS, GROUP, self.consumer, count=BATCH_SIZE, block_ms=2000
+                )
+                if events:
+                    await self._archive(events)
+            except Exception as e:
+                log.error(f"Archiver poll error: {e}", exc_info=True)
+                await asyncio.sleep(2)
+
+    async def stop(self):
+        self._running = False
+        for t in self._background:
+            t.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+        for topic in ARCHIVED_TOPICS:
+            try:
+                await self.bus.delete_consumer_if_idle(topic, GROUP, self.consumer)
+            except Exception as e:
+                log.debug(f"Remove consumer {self.consumer} from {topic} failed: {e}")
+        await self.bus.close()
+        log.info(f"Event archiver stopped: {self.stats}")
+
+    async def _archive(self, events: list[tuple[str, str, dict]]):
+        """按 BATCH_SIZE 分块归档（一次 XREADGROUP 每个 stream 都可能返回 BATCH_SIZE 条）。"""
+        for i in range(0, len(events), BATCH_SIZE):
+            await self._archive_chunk(events[i:i + BATCH_SIZE])
+
+    async def _archive_chunk(self, events: list[tuple[str, str, dict]]):
+        """一块事件：多行 INSERT（event_id 冲突忽略）→ 提交 → 按 topic 批量 ACK。"""
+        started = time.perf_counter()
+        rows = {}
+        sources: dict[uuid.UUID, tuple[str, str, dict]] = {}
+        acks: dict[str, list[str]] = {}
+        for topic, entry_id, event in events:
+            acks.setdefault(topic, []).append(entry_id)
+            if event.get("event_type") in self._skip_types:
+                self.stats["skipped"] += 1
+                continue
+            row = _to_row(topic, entry_id, event)
+            rows[row["event_id"]] = row  # 同块内重复 event_id 只保留一条
+            sources[row["event_id"]] = (topic, entry_id, event)
+
+        archived = list(rows.values())
+        if archived:
+            try:
+                await self._insert(archived)
+            except Exception as e:
+                if not _is_row_error(e):
+                    raise  # 不 ACK，整块稍后重投递
+                log.warning(f"Batch insert of {len(archived)} events failed ({e}); retrying row by row")
+                archived = await self._insert_each(archived, sources)
+        if archived:
+            self.stats["archived"] += len(archived)
+            self.stats["lastEventAt"] = max(r["timestamp"] for r in archived).isoformat()
+
+        for topic, entry_ids in acks.items():
+            await self.bus.ack_many(topic, GROUP, entry_ids)
+        self.stats["batches"] += 1
+        self.stats["lastBatchMs"] = round((time.perf_counter() - started) * 1000, 3)
+        log.debug(f"Archived {len(archived)}/{len(events)} events in {self.stats['lastBatchMs']}ms")
+
+    async def _insert(self, rows: list[dict]):
+        async with async_session() as db:
+            stmt = pg_insert(Event).values(rows)
+            await db.execute(stmt.on_conflict_do_nothing(index_elements=["event_id"]))
+            await db.commit()
+
+    async def _insert_each(self, rows: list[dict], sources: dict) -> list[dict]:
+        """逐行写入；数据错误的行发往 dead_letter，返回写入成功的行。"""
+        ok = []
+        for row in rows:
+            try:
+                await self._insert([row])
+                ok.append(row)
+            except Exception as e:
+                if not _is_row_error(e):
+                    raise
+                await self._dead_letter(*sources[row["event_id"]], error=e)
+        return ok
+
+    async def _dead_letter(self, topic: str, entry_id: str, event: dict, error: Exception):
+        """无法归档的事件：记录到 dead_letter（只带定位信息，不复制原始数据）。"""
+        self.stats["deadLettered"] += 1
+        log.error(f"💀 Cannot archive {topic} [{entry_id}] ({event.get('event_type', '')}): {error}")
+        if topic == "dead_letter":
+            return  # 不为 dead_letter 自身再生成 dead_letter，避免循环
+        await self.bus.publish(
+            topic="dead_letter",
+            trace_id=str(event.get("trace_id", "")),
+            event_type="event.archive.dead_letter",
+            producer="archiver",
+            payload={
+                "topic": topic,
+                "entry_id": entry_id,
+                "event_id": str(event.get("event_id", "")),
+                "event_type": event.get("event_type", ""),
+                "error": str(error)[:500],
+            },
+        )
+
+    async def _reclaim_loop(self):
+        """认领崩溃消费者遗留的 pending 事件（启动时先执行一次）。"""
+        while self._running:
+            for topic in ARCHIVED_TOPICS:
+                try:
+                    events = await self.bus.claim_stale(
+                        topic, GROUP, self.consumer, min_idle_ms=CLAIM_MIN_IDLE_MS, count=BATCH_SIZE
+                    )
+                    if events:
+                        log.info(f"Recovering {len(events)} stale events from {topic}")
+                        await self._archive([(topic, entry_id, event) for entry_id, event in events])
+                    await self.bus.prune_consumers(
+                        topic, GROUP, CONSUMER_PRUNE_IDLE_MS, keep=(self.consumer,)
+                    )
+                except Exception as e:
+                    log.warning(f"Archiver reclaim on {topic} failed: {e}")
+            await asyncio.sleep(CLAIM_MIN_IDLE_MS / 1000)
+
+    async def lag(self) -> dict:
+        """各 topic 上 archiver 组的积压：lag（尚未读取）与 pending（已读未 ACK）。"""
+        out = {}
+        for topic in ARCHIVED_TOPICS:
+            info = await self.bus.group_info(topic, GROUP)
+            if info:
+                out[topic] = {"lag": info.get("lag"), "pending": info.get("pending", 0)}
+        return out
+
+    async def _stats_loop(self):
+        while self._running:
+            try:
+                snapshot = {**self.stats, "consumer": self.consumer, "topics": await self.lag(),
+                            "updatedAt": datetime.now(timezone.utc).isoformat()}
+                await self.bus.redis.set(STATS_KEY, json.dumps(snapshot), ex=int(STATS_INTERVAL * 4))
+            except Exception as e:
+                log.debug(f"Archiver stats update failed: {e}")
+            await asyncio.sleep(STATS_INTERVAL)
+
+
+async def run_event_archiver():
+    """入口函数 — 用于直接运行 worker。"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(name)s] %(levelname)s: %(message)s",
+    )
+    archiver = EventArchiver()
+
+    loop = asyncio.get_event_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, lambda: asyncio.create_task(archiver.stop()))
+
+    await archiver.start()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_event_archiver())
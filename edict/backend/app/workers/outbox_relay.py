@@ -1,10 +1,14 @@
-"""Outbox Relay Worker — 轮询 outbox_events 表，投递未发布事件到 Redis Streams。
+"""Outbox Relay Worker — 投递 outbox_events 表中未发布事件到 Redis Streams。
 
 Transactional Outbox Pattern 的投递端：
 - 事务层把事件写入 outbox 表（与业务数据同一事务）
-- 本 worker 轮询 unpublished 事件，调用 EventBus.publish 投递到 Redis
-- 投递成功标记 published=True；失败累计 attempts，达到上限进入 DLQ
-- 消费者必须用 event_id 做幂等，防止 relay 重启造成重复投递
+- outbox_events 上的语句级触发器在提交时 NOTIFY edict_outbox；本 worker LISTEN 该频道，
+  收到通知立即投递（毫秒级延迟），LISTEN 不可用或漏通知时退回定时轮询
+- 每批未发布事件经 EventBus.publish_batch 一次 pipeline 投递（XADD + PUBLISH 不再逐条往返），
+  再用一条 UPDATE … WHERE id = ANY(:ids) 批量标记 published
+- 批量投递失败时退回逐条投递：失败累计 attempts，达到上限进入 DLQ（不再重试）
+- 投递沿用 outbox 行的 event_id，消费者用 event_id 做幂等，防止 relay 重启造成重复投递
+- 后台按保留期分批清理已投递 / 已进入 DLQ 的行（可选归档），见 services/outbox_retention.py
 """
 
 import asyncio
@@ -12,106 +16,248 @@ import logging
 import signal
 from datetime import datetime, timezone
 
-from sqlalchemy import select, update
+import asyncpg
+from sqlalchemy import BigInteger, any_, bindparam, select, text, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.engine import make_url
 
-from ..db import async_session
+from ..config import get_settings
+from ..db import async_session, engine
 from ..models.outbox import OutboxEvent
 from ..services.event_bus import EventBus
+from ..services.outbox_retention import OutboxRetention
 
 log = logging.getLogger("edict.outbox_relay")
 
 MAX_ATTEMPTS = 5
 BATCH_SIZE = 50
-POLL_INTERVAL = 1.0  # 秒
+POLL_INTERVAL = 1.0  # 秒 — 未在 LISTEN 时的轮询间隔
+FALLBACK_POLL_INTERVAL = 10.0  # 秒 — LISTEN 正常时的兜底轮询间隔
+NOTIFY_CHANNEL = "edict_outbox"
+
+# 语句级触发器：同一事务内多次 NOTIFY 同一载荷会被 Postgres 合并，提交时才送达
+_NOTIFY_DDL = [
+    f"""
+    CREATE OR REPLACE FUNCTION edict_outbox_notify() RETURNS trigger AS $$
+    BEGIN
+      PERFORM pg_notify('{NOTIFY_CHANNEL}', '');
+      RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS outbox_events_notify ON outbox_events",
+    """
+    CREATE TRIGGER outbox_events_notify
+    AFTER INSERT ON outbox_events
+    FOR EACH STATEMENT EXECUTE FUNCTION edict_outbox_notify()
+    """,
+]
+
+_SELECT_COLUMNS = (
+    OutboxEvent.id,
+    OutboxEvent.event_id,
+    OutboxEvent.topic,
+    OutboxEvent.trace_id,
+    OutboxEvent.event_type,
+    OutboxEvent.producer,
+    OutboxEvent.payload,
+    OutboxEvent.meta,
+    OutboxEvent.attempts,
+)
 
 
 class OutboxRelay:
-    """轮询 outbox_events 表，投递到 Redis Streams。"""
+    """LISTEN/NOTIFY 唤醒 + 轮询兜底，批量投递 outbox_events 到 Redis Streams。"""
 
     def __init__(self):
         self.bus = EventBus()
         self._running = False
+        self._wake = asyncio.Event()
+        self._listening = False
+        self._listen_conn: asyncpg.Connection | None = None
+        self._listener_task: asyncio.Task | None = None
+        self.retention = OutboxRetention(max_attempts=MAX_ATTEMPTS)
+        self._retention_task: asyncio.Task | None = None
 
     async def start(self):
         await self.bus.connect()
         self._running = True
+        await self._install_notify_trigger()
+        self._listener_task = asyncio.create_task(self._listen_loop())
+        if get_settings().outbox_retention_enabled:
+            self._retention_task = asyncio.create_task(self.retention.run(lambda: self._running))
         log.info("🚀 Outbox Relay started")
 
         while self._running:
             try:
+                # 先清除再处理：处理期间到达的通知会触发下一轮
+                self._wake.clear()
                 relayed = await self._relay_cycle()
-                if relayed == 0:
-                    await asyncio.sleep(POLL_INTERVAL)
+                if relayed < BATCH_SIZE:
+                    timeout = FALLBACK_POLL_INTERVAL if self._listening else POLL_INTERVAL
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
             except Exception as e:
                 log.error(f"Outbox relay error: {e}", exc_info=True)
                 await asyncio.sleep(POLL_INTERVAL * 2)
 
     async def stop(self):
         self._running = False
+        self._wake.set()
+        for task in (self._listener_task, self._retention_task):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
         await self.bus.close()
         log.info("Outbox Relay stopped")
 
+    # ── LISTEN/NOTIFY ──
+
+    async def _install_notify_trigger(self):
+        """幂等安装 NOTIFY 触发器；失败时仅靠轮询。"""
+        try:
+            async with engine.begin() as conn:
+                # 多个 relay 同时启动时串行执行 DDL
+                await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('edict_outbox_notify'))"))
+                for ddl in _NOTIFY_DDL:
+                    await conn.execute(text(ddl))
+        except Exception as e:
+            log.warning(f"Outbox NOTIFY trigger not installed, polling only: {e}")
+
+    def _on_notify(self, *_args):
+        self._wake.set()
+
+    async def _listen_loop(self):
+        """保持一条 LISTEN 连接；断开后退避重连，期间按 POLL_INTERVAL 轮询。"""
+        url = make_url(get_settings().database_url).set(drivername="postgresql")
+        dsn = url.render_as_string(hide_password=False)
+        backoff = 1.0
+        while self._running:
+            try:
+                conn = await asyncpg.connect(dsn)
+                self._listen_conn = conn
+                await conn.add_listener(NOTIFY_CHANNEL, self._on_notify)
+                self._listening = True
+                self._wake.set()  # 连接建立前的写入可能错过通知，补一轮
+                log.info(f"Outbox relay listening on '{NOTIFY_CHANNEL}'")
+                backoff = 1.0
+                while self._running and not conn.is_closed():
+                    await asyncio.sleep(FALLBACK_POLL_INTERVAL)
+                    await conn.execute("SELECT 1")  # 探活，及时发现断线
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning(f"Outbox LISTEN connection lost: {e}")
+            finally:
+                self._listening = False
+                conn, self._listen_conn = self._listen_conn, None
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    # ── 投递 ──
+
     async def _relay_cycle(self) -> int:
         """处理一批未投递事件。返回本轮处理数量。"""
         async with async_session() as db:
-            # FOR UPDATE SKIP LOCKED 允许多 relay 实例并行
+            # FOR UPDATE SKIP LOCKED 允许多 relay 实例并行；只取列，不构造 ORM 对象
             stmt = (
-                select(OutboxEvent)
+                select(*_SELECT_COLUMNS)
                 .where(OutboxEvent.published == False)  # noqa: E712
+                .where(OutboxEvent.attempts < MAX_ATTEMPTS)
                 .order_by(OutboxEvent.id)
                 .limit(BATCH_SIZE)
                 .with_for_update(skip_locked=True)
             )
-            result = await db.execute(stmt)
-            events = list(result.scalars().all())
+            rows = (await db.execute(stmt)).all()
 
-            if not events:
+            if not rows:
                 return 0
 
-            for event in events:
-                try:
-                    await self.bus.publish(
-                        topic=event.topic,
-                        trace_id=event.trace_id,
-                        event_type=event.event_type,
-                        producer=event.producer,
-                        payload=event.payload or {},
-                        meta=event.meta or {},
-                    )
-                    event.published = True
-                    event.published_at = datetime.now(timezone.utc)
-                    log.debug(f"📤 Relayed outbox #{event.id} → {event.topic}")
-
-                except Exception as exc:
-                    event.attempts += 1
-                    event.last_error = str(exc)[:500]
-                    log.warning(
-                        f"Outbox #{event.id} relay failed (attempt {event.attempts}): {exc}"
-                    )
-
-                    if event.attempts >= MAX_ATTEMPTS:
-                        # 投递到 DLQ
-                        try:
-                            await self.bus.publish(
-                                topic="dead_letter",
-                                trace_id=event.trace_id,
-                                event_type="outbox.dead_letter",
-                                producer="outbox_relay",
-                                payload={
-                                    "outbox_id": event.id,
-                                    "event_id": event.event_id,
-                                    "topic": event.topic,
-                                    "event_type": event.event_type,
-                                    "payload": event.payload,
-                                    "error": event.last_error,
-                                    "attempts": event.attempts,
-                                },
-                            )
-                        except Exception as dlq_err:
-                            log.error(f"Failed to publish DLQ for outbox #{event.id}: {dlq_err}")
+            try:
+                await self.bus.publish_batch([
+                    {
+                        "event_id": row.event_id,
+                        "topic": row.topic,
+                        "trace_id": row.trace_id,
+                        "event_type": row.event_type,
+                        "producer": row.producer,
+                        "payload": row.payload,
+                        "meta": row.meta,
+                    }
+                    for row in rows
+                ])
+                published_ids = [row.id for row in rows]
+            except Exception as exc:
+                log.warning(f"Outbox batch relay failed ({len(rows)} events), retrying one by one: {exc}")
+                published_ids = await self._relay_one_by_one(db, rows)
+
+            if published_ids:
+                await db.execute(
+                    update(OutboxEvent)
+                    .where(OutboxEvent.id == any_(bindparam("ids", published_ids, type_=ARRAY(BigInteger))))
+                    .values(published=True, published_at=datetime.now(timezone.utc))
+                    .execution_options(synchronize_session=False)
+                )
+                log.debug(f"📤 Relayed {len(published_ids)} outbox events")
 
             await db.commit()
-            return len(events)
+            return len(rows)
+
+    async def _relay_one_by_one(self, db, rows) -> list[int]:
+        """逐条投递（批量失败时的退路）。返回投递成功的 id；失败的累计 attempts。"""
+        published_ids = []
+        for row in rows:
+            try:
+                await self.bus.publish(
+                    topic=row.topic,
+                    trace_id=row.trace_id,
+                    event_type=row.event_type,
+                    producer=row.producer,
+                    payload=row.payload or {},
+                    meta=row.meta or {},
+                    event_id=row.event_id,
+                )
+                published_ids.append(row.id)
+                log.debug(f"📤 Relayed outbox #{row.id} → {row.topic}")
+
+            except Exception as exc:
+                attempts = (row.attempts or 0) + 1
+                last_error = str(exc)[:500]
+                await db.execute(
+                    update(OutboxEvent)
+                    .where(OutboxEvent.id == row.id)
+                    .values(attempts=attempts, last_error=last_error)
+                    .execution_options(synchronize_session=False)
+                )
+                log.warning(
+                    f"Outbox #{row.id} relay failed (attempt {attempts}): {exc}"
+                )
+
+                if attempts >= MAX_ATTEMPTS:
+                    # 投递到 DLQ
+                    try:
+                        await self.bus.publish(
+                            topic="dead_letter",
+                            trace_id=row.trace_id,
+                            event_type="outbox.dead_letter",
+                            producer="outbox_relay",
+                            payload={
+                                "outbox_id": row.id,
+                                "event_id": row.event_id,
+                                "topic": row.topic,
+                                "event_type": row.event_type,
+                                "payload": row.payload,
+                                "error": last_error,
+                                "attempts": attempts,
+                            },
+                        )
+                    except Exception as dlq_err:
+                        log.error(f"Failed to publish DLQ for outbox #{row.id}: {dlq_err}")
+        return published_ids
 
 
 async def run_outbox_relay():
@@ -0,0 +1,244 @@
+"""
+审计日志 — 追加式 JSONL 分段存储 + 段级稀疏索引。
+
+原实现每条审计记录都 atomic_json_update 整个 data/audit_log.json（最多 5000 条）：
+读全部 → 追加一条 → 截断 → 整文件重写。这里：
+
+目录: data/audit_log/
+    seg-000001.jsonl       已封存的段（每行一条记录）
+    seg-000001.idx.json    封存时生成的段索引
+    seg-000002.jsonl       当前活动段（只追加）
+
+  - 追加只在短暂的排他锁内 stat + 一次 O_APPEND 写入；活动段超过 SEGMENT_BYTES 时封存并开新段，
+    段数超过 MAX_SEGMENTS 时删除最旧的段（取代原 MAX_AUDIT_LOG 条数上限）；
+  - 段索引记录时间范围、各任务/Agent/动作的条数，以及每 MARK_EVERY 行一个 (偏移, ts) 标记：
+    查询按条件跳过不相关的段，带 since 时从最近的标记处开始读；
+  - 活动段没有索引（不超过 SEGMENT_BYTES），查询时直接扫描；
+  - 旧的 audit_log.json 在第一次追加时导入为最早的段，随后改名为 audit_log.json.migrated。
+
+ts 为 now_iso() 生成的 UTC ISO 字符串，按字符串比较即时间顺序。
+"""
+import json
+import os
+import pathlib
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from file_lock import atomic_json_read, atomic_json_write, locked
+
+SEGMENT_BYTES = int(os.environ.get('EDICT_AUDIT_SEGMENT_BYTES', str(1024 * 1024)))
+MAX_SEGMENTS = int(os.environ.get('EDICT_AUDIT_MAX_SEGMENTS', '32'))
+MARK_EVERY = 256
+
+_SEG_RE = re.compile(r'^seg-(\d{6})\.jsonl$')
+
+
+def _seg_name(n: int) -> str:
+    return f'seg-{n:06d}.jsonl'
+
+
+def _idx_path(seg: pathlib.Path) -> pathlib.Path:
+    return seg.with_name(seg.name[:-len('.jsonl')] + '.idx.json')
+
+
+def _encode(entry: Dict[str, Any]) -> bytes:
+    return (json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def _iter_lines(path: pathlib.Path, start: int = 0) -> Iterator[Tuple[int, bytes]]:
+    """从 start 起逐行产出 (偏移, 原始行)；末尾未写完的半行不产出。"""
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return
+    with f:
+        f.seek(start)
+        pos = start
+        for raw in f:
+            if not raw.endswith(b'\n'):
+                return
+            yield pos, raw
+            pos += len(raw)
+
+
+def build_index(seg: pathlib.Path) -> Dict[str, Any]:
+    """扫描一个段，生成段索引。"""
+    idx = {'count': 0, 'tsMin': None, 'tsMax': None, 'tasks': {}, 'agents': {}, 'actions': {}, 'marks': []}
+    for offset, raw in _iter_lines(seg):
+        try:
+            entry = json.loads(raw)
+        except ValueError:
+            continue
+        ts = entry.get('ts') or ''
+        if idx['count'] % MARK_EVERY == 0:
+            idx['marks'].append([offset, ts])
+        idx['count'] += 1
+        if ts:
+            idx['tsMin'] = ts if idx['tsMin'] is None else min(idx['tsMin'], ts)
+            idx['tsMax'] = ts if idx['tsMax'] is None else max(idx['tsMax'], ts)
+        for key, field in (('tasks', 'task'), ('agents', 'agent'), ('actions', 'action')):
+            val = entry.get(field) or ''
+            idx[key][val] = idx[key].get(val, 0) + 1
+    return idx
+
+
+class AuditLog:
+    """一个审计日志目录。多进程安全（追加与封存在排他锁内进行）。"""
+
+    def __init__(self, directory: pathlib.Path, legacy_file: Optional[pathlib.Path] = None):
+        self.dir = pathlib.Path(directory)
+        self.legacy_file = pathlib.Path(legacy_file) if legacy_file else None
+        self._lock_target = self.dir / '.audit'
+
+    def segments(self) -> List[pathlib.Path]:
+        """全部段，按编号升序（最后一个为活动段）。"""
+        try:
+            names = os.listdir(self.dir)
+        except FileNotFoundError:
+            return []
+        nums = sorted(int(m.group(1)) for m in map(_SEG_RE.match, names) if m)
+        return [self.dir / _seg_name(n) for n in nums]
+
+    # ── 写入 ──
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        line = _encode(entry)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        with locked(self._lock_target, exclusive=True):
+            segs = self.segments()
+            if not segs:
+                segs = self._import_legacy()
+            active = segs[-1] if segs else self.dir / _seg_name(1)
+            try:
+                size = active.stat().st_size
+            except FileNotFoundError:
+                size = 0
+            if size and size + len(line) > SEGMENT_BYTES:
+                active = self._rotate(active, segs)
+            fd = os.open(str(active), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+
+    def _rotate(self, active: pathlib.Path, segs: List[pathlib.Path]) -> pathlib.Path:
+        """封存活动段（写段索引），清理超出 MAX_SEGMENTS 的旧段，返回新活动段路径。"""
+        atomic_json_write(_idx_path(active), build_index(active))
+        n = int(_SEG_RE.match(active.name).group(1)) + 1
+        for old in segs[:max(0, len(segs) + 1 - MAX_SEGMENTS)]:
+            for p in (old, _idx_path(old)):
+                try:
+                    p.unlink()
+                except FileNotFoundError:
+                    pass
+        return self.dir / _seg_name(n)
+
+    def _import_legacy(self) -> List[pathlib.Path]:
+        """把旧的 audit_log.json 导入为最早的段（调用方持有排他锁）。"""
+        if not self.legacy_file or not self.legacy_file.exists():
+            return []
+        entries = atomic_json_read(self.legacy_file, [])
+        segs: List[pathlib.Path] = []
+        active = self.dir / _seg_name(1)
+        buf = b''
+        for entry in entries if isinstance(entries, list) else []:
+            if not isinstance(entry, dict):
+                continue
+            line = _encode(entry)
+            if buf and len(buf) + len(line) > SEGMENT_BYTES:
+                active.write_bytes(buf)
+                segs.append(active)
+                active = self._rotate(active, segs)
+                buf = b''
+            buf += line
+        if buf:
+            active.write_bytes(buf)
+            segs.append(active)
+        self.legacy_file.rename(self.legacy_file.with_name(self.legacy_file.name + '.migrated'))
+        return segs
+
+    # ── 查询 ──
+
+    def _index(self, seg: pathlib.Path, sealed: bool) -> Dict[str, Any]:
+        if not sealed:
+            return build_index(seg)
+        idx = atomic_json_read(_idx_path(seg), None)
+        if not isinstance(idx, dict):
+            idx = build_index(seg)             # 封存中途崩溃：补建索引
+            try:
+                atomic_json_write(_idx_path(seg), idx)
+            except OSError:
+                pass
+        return idx
+
+    @staticmethod
+    def _skip(idx: Dict[str, Any], task, agent, action, since, until) -> bool:
+        if not idx.get('count'):
+            return True
+        if task is not None and task not in idx.get('tasks', {}):
+            return True
+        if agent is not None and agent not in idx.get('agents', {}):
+            return True
+        if action is not None and action not in idx.get('actions', {}):
+            return True
+        if since and idx.get('tsMax') and idx['tsMax'] < since:
+            return True
+        if until and idx.get('tsMin') and idx['tsMin'] > until:
+            return True
+        return False
+
+    def query(self, task: Optional[str] = None, agent: Optional[str] = None,
+              action: Optional[str] = None, since: Optional[str] = None,
+              until: Optional[str] = None, limit: int = 200) -> List[Dict[str, Any]]:
+        """按任务 / Agent / 动作 / 时间范围过滤，返回最近 limit 条（时间正序）。"""
+        wanted = {'task': task, 'agent': agent, 'action': action}
+        # 原始行预过滤：值按 _encode 的格式出现在行内
+        needles = [json.dumps(v, ensure_ascii=False).encode('utf-8') for v in wanted.values() if v is not None]
+        segs = self.segments()
+        if not segs and self.legacy_file and self.legacy_file.exists():
+            # 尚未有写入方完成导入：直接过滤旧文件
+            entries = atomic_json_read(self.legacy_file, [])
+            found = [e for e in entries if isinstance(e, dict)
+                     and all(v is None or (e.get(k) or '') == v for k, v in wanted.items())
+                     and not (since and (e.get('ts') or '') < since)
+                     and not (until and (e.get('ts') or '') > until)] if isinstance(entries, list) else []
+            return found[-limit:] if limit > 0 else []
+        found: List[Dict[str, Any]] = []
+        for i in range(len(segs) - 1, -1, -1):
+            seg = segs[i]
+            idx = self._index(seg, sealed=i < len(segs) - 1)
+            if self._skip(idx, task, agent, action, since, until):
+                continue
+            start = 0
+            if since:
+                for offset, ts in idx.get('marks', []):
+                    if ts and ts < since:
+                        start = offset
+            matched = []
+            for _, raw in _iter_lines(seg, start):
+                if any(n not in raw for n in needles):
+                    continue
+                try:
+                    entry = json.loads(raw)
+                except ValueError:
+                    continue
+                if any(v is not None and (entry.get(k) or '') != v for k, v in wanted.items()):
+                    continue
+                ts = entry.get('ts') or ''
+                if (since and ts < since) or (until and ts > until):
+                    continue
+                matched.append(entry)
+            found = matched + found
+            if len(found) >= limit:
+                break
+        return found[-limit:] if limit > 0 else []
+
+    def stats(self) -> Dict[str, Any]:
+        segs = self.segments()
+        total = 0
+        for seg in segs:
+            try:
+                total += seg.stat().st_size
+            except FileNotFoundError:
+                pass
+        return {'segments': len(segs), 'bytes': total, 'active': segs[-1].name if segs else None}
@@ -12,12 +12,29 @@
         tasks.append(new_task)
         return tasks 
     atomic_json_update(path, modifier, default=[])
+
+    # 自定义临界区（例如读取 + stat 需要在同一把锁内完成）
+    with locked(path):
+        ...
+
+Journaled 模式（EDICT_JSON_JOURNAL=1 开启）:
+    对「以 id 为键的 dict 列表」（tasks_source.json），atomic_json_update 不再
+    整文件重写，而是把字段级 delta 追加到 <path>.wal（同一把 flock 保护）；
+    WAL 超过 EDICT_JOURNAL_MAX_BYTES 或快照早于 EDICT_JOURNAL_MAX_AGE 秒时
+    折叠回快照。所有读取（atomic_json_read）都是「快照 + WAL 回放」，
+    整体写入（atomic_json_write / 非 journaled 更新）会顺带清空 WAL。
+    格式细节见 json_journal.py。
 """
+import contextlib
+import copy
 import json
 import os
 import pathlib
 import tempfile
-from typing import Any, Callable
+import time
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+import json_journal
 
 _IS_WINDOWS = os.name == 'nt'
 
@@ -60,80 +77,207 @@ def _lock_path(path: pathlib.Path) -> pathlib.Path:
     return path.parent / (path.name + '.lock')
 
 
-def atomic_json_read(path: pathlib.Path, default: Any = None) -> Any:
-    """持锁读取 JSON 文件。"""
+@contextlib.contextmanager
+def locked(path: pathlib.Path, exclusive: bool = False) -> Iterator[None]:
+    """持有 path 对应 .lock 文件的共享锁（默认）或排他锁。"""
     lock_file = _lock_path(path)
     lock_file.parent.mkdir(parents=True, exist_ok=True)
     fd = os.open(str(lock_file), os.O_CREAT | os.O_RDWR)
     try:
-        _lock_shared(fd)
-        try:
-            return json.loads(path.read_text(encoding='utf-8')) if path.exists() else default
-        except Exception:
-            return default
+        if exclusive:
+            _lock_exclusive(fd)
+        else:
+            _lock_shared(fd)
+        yield
     finally:
         _unlock(fd)
         os.close(fd)
 
 
+# ── Journaled 模式（WAL） ─────────────────────────────────────────
+
+JOURNAL_MAX_BYTES = int(os.environ.get('EDICT_JOURNAL_MAX_BYTES', str(2 * 1024 * 1024)))
+JOURNAL_MAX_AGE_SEC = float(os.environ.get('EDICT_JOURNAL_MAX_AGE', '600'))
+
+
+def journal_enabled() -> bool:
+    return os.environ.get('EDICT_JSON_JOURNAL', '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def journal_path(path: pathlib.Path) -> pathlib.Path:
+    return path.parent / (path.name + '.wal')
+
+
+def _snapshot_signature(path: pathlib.Path) -> Optional[List[int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_ino, st.st_mtime_ns, st.st_size]
+
+
+def _read_text(path: pathlib.Path) -> Optional[str]:
+    try:
+        return path.read_text(encoding='utf-8')
+    except FileNotFoundError:
+        return None
+
+
+def _read_wal(path: pathlib.Path) -> Tuple[List[list], int, bool]:
+    """返回 (有效记录的 ops 列表, WAL 字节数, 是否干净)。
+
+    WAL 首行签名与当前快照不符（快照已被整体替换）时视为过期，记录为空；
+    遇到残缺行（写入中途崩溃）则截止于此并标记不干净，由下一个写入方折叠。
+    """
+    try:
+        raw = journal_path(path).read_text(encoding='utf-8')
+    except FileNotFoundError:
+        return [], 0, True
+    size = len(raw.encode('utf-8'))
+    lines = raw.split('\n')
+    try:
+        header = json.loads(lines[0])
+    except Exception:
+        return [], size, False
+    if header.get('wal') != json_journal.WAL_VERSION or header.get('base') != _snapshot_signature(path):
+        return [], size, False
+    records = []
+    for line in lines[1:]:
+        if not line:
+            continue
+        try:
+            ops = json.loads(line)['ops']
+        except Exception:
+            return records, size, False
+        records.append(ops)
+    return records, size, True
+
+
+def _materialize(text: Optional[str], records: List[list], default: Any) -> Any:
+    try:
+        data = json.loads(text) if text is not None else default
+    except Exception:
+        data = default
+    if records and isinstance(data, list):
+        index = {t.get('id'): t for t in data if isinstance(t, dict)}
+        for ops in records:
+            json_journal.apply(data, ops, index)
+    return data
+
+
+def read_json_locked(path: pathlib.Path, default: Any = None) -> Any:
+    """读取快照并回放 WAL；调用方需已持有 locked(path)。"""
+    records, _, _ = _read_wal(path)
+    return _materialize(_read_text(path), records, default)
+
+
+def _write_snapshot(path: pathlib.Path, data: Any) -> None:
+    """整体写入快照（tmpfile + rename），随后丢弃已折叠的 WAL。"""
+    tmp_fd, tmp_path = tempfile.mkstemp(
+        dir=str(path.parent), suffix='.tmp', prefix=path.stem + '_'
+    )
+    try:
+        with os.fdopen(tmp_fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, str(path))
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+    # 快照签名已变，即使此处崩溃，残留 WAL 也会因签名不符被忽略
+    try:
+        journal_path(path).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _journal_append(path: pathlib.Path, ops: list, wal_valid: bool) -> None:
+    record = json.dumps({'ts': round(time.time(), 3), 'ops': ops},
+                        ensure_ascii=False, separators=(',', ':')) + '\n'
+    if wal_valid and journal_path(path).exists():
+        mode, payload = 'a', record
+    else:
+        header = json.dumps({'wal': json_journal.WAL_VERSION, 'base': _snapshot_signature(path)})
+        mode, payload = 'w', header + '\n' + record
+    with open(journal_path(path), mode, encoding='utf-8') as f:
+        f.write(payload)
+
+
+def _journal_due(path: pathlib.Path, wal_size: int) -> bool:
+    if wal_size <= 0:
+        return False
+    if wal_size >= JOURNAL_MAX_BYTES:
+        return True
+    try:
+        return time.time() - os.stat(path).st_mtime >= JOURNAL_MAX_AGE_SEC
+    except OSError:
+        return True
+
+
+def compact_json_journal(path: pathlib.Path, force: bool = False) -> bool:
+    """把 WAL 折叠回快照。force=False 时仅在超过大小/时间阈值后执行。
+
+    返回是否发生了折叠。可由常驻进程定期调用。
+    """
+    if not journal_path(path).exists():
+        return False
+    with locked(path, exclusive=True):
+        records, wal_size, clean = _read_wal(path)
+        if not force and clean and not _journal_due(path, wal_size):
+            return False
+        data = _materialize(_read_text(path), records, None)
+        if data is None:
+            return False
+        _write_snapshot(path, data)
+        return True
+
+
+def atomic_json_read(path: pathlib.Path, default: Any = None) -> Any:
+    """持锁读取 JSON 文件（含 WAL 回放）。"""
+    with locked(path):
+        return read_json_locked(path, default)
+
+
 def atomic_json_update(
     path: pathlib.Path,
     modifier: Callable[[Any], Any],
     default: Any = None,
+    on_commit: Optional[Callable[[Any], None]] = None,
+    journal: Optional[bool] = None,
 ) -> Any:
     """
     原子地读取 → 修改 → 写回 JSON 文件。
     modifier(data) 应返回修改后的数据。
     使用临时文件 + rename 保证写入原子性。
+    on_commit(result) 在写入完成、释放锁之前调用（供缓存记录新版本）。
+    journal 为 None 时由 EDICT_JSON_JOURNAL 决定是否走 WAL 追加。
     """
-    lock_file = _lock_path(path)
-    lock_file.parent.mkdir(parents=True, exist_ok=True)
-    fd = os.open(str(lock_file), os.O_CREAT | os.O_RDWR)
-    try:
-        _lock_exclusive(fd)
+    if journal is None:
+        journal = journal_enabled()
+    with locked(path, exclusive=True):
         # Read
-        try:
-            data = json.loads(path.read_text(encoding='utf-8')) if path.exists() else default
-        except Exception:
-            data = default
+        text = _read_text(path)
+        records, wal_size, wal_clean = _read_wal(path)
+        data = _materialize(text, records, default)
+        # journaled 模式需要一份独立的修改前副本用于计算 delta；
+        # 快照缺失或损坏（data 即 default）时没有可对比的基准，走整体重写
+        base = copy.deepcopy(data) if journal and text is not None and data is not default else None
         # Modify
         result = modifier(data)
-        # Atomic write via temp file + rename
-        tmp_fd, tmp_path = tempfile.mkstemp(
-            dir=str(path.parent), suffix='.tmp', prefix=path.stem + '_'
-        )
-        try:
-            with os.fdopen(tmp_fd, 'w', encoding='utf-8') as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
-            os.replace(tmp_path, str(path))
-        except Exception:
-            os.unlink(tmp_path)
-            raise
+        # Write: WAL 追加 delta，或整体重写快照（顺带折叠 WAL）
+        ops = json_journal.diff(base, result) if base is not None else None
+        if ops is not None and wal_clean and not _journal_due(path, wal_size):
+            if ops:
+                _journal_append(path, ops, wal_valid=wal_size > 0)
+        else:
+            _write_snapshot(path, result)
+        if on_commit is not None:
+            on_commit(result)
         return result
-    finally:
-        _unlock(fd)
-        os.close(fd)
 
 
 def atomic_json_write(path: pathlib.Path, data: Any) -> None:
     """原子写入 JSON 文件（持排他锁 + tmpfile rename）。
     直接写入，不读取现有内容（避免 atomic_json_update 的多余读开销）。
     """
-    lock_file = _lock_path(path)
-    lock_file.parent.mkdir(parents=True, exist_ok=True)
-    fd = os.open(str(lock_file), os.O_CREAT | os.O_RDWR)
-    try:
-        _lock_exclusive(fd)
-        tmp_fd, tmp_path = tempfile.mkstemp(
-            dir=str(path.parent), suffix='.tmp', prefix=path.stem + '_'
-        )
-        try:
-            with os.fdopen(tmp_fd, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            os.replace(tmp_path, str(path))
-        except Exception:
-            os.unlink(tmp_path)
-            raise
-    finally:
-        _unlock(fd)
-        os.close(fd)
+    with locked(path, exclusive=True):
+        _write_snapshot(path, data)
@@ -0,0 +1,153 @@
+"""
+JSON 增量日志（WAL）— 供 file_lock 的 journaled 模式使用。
+
+适用于「以 id 为键的 dict 列表」（即 tasks_source.json 的形状）：
+一次修改只把变化的字段写成一条紧凑的 delta 记录，追加到 <path>.wal，
+而不是整文件重写。读取方 = 快照 + 顺序回放 WAL。
+
+WAL 文件格式（每行一个 JSON）:
+    {"wal": 1, "base": [ino, mtime_ns, size]}    # 首行：所依附快照的签名
+    {"ts": 1700000000.0, "ops": [...]}            # 之后每行一条修改记录
+
+ops 元素（均为数组，path 为从任务根开始的 dict 键路径）:
+    ["put", id, index, task]          新增任务，插入到 index
+    ["del", id]                       删除任务
+    ["set", id, path, value]          设置字段
+    ["unset", id, path]               删除字段
+    ["ext", id, path, drop, items]    列表去头 drop 个后追加 items（progress_log 等）
+
+快照被整体替换后签名改变，旧 WAL 自动失效（不会被二次回放）。
+本模块只做纯数据处理，不涉及文件 IO 与加锁。
+"""
+from typing import Any, Dict, List, Optional
+
+WAL_VERSION = 1
+# 列表「截断 + 追加」的最大探测步数（MAX_PROGRESS_LOG 截断通常一次只丢 1 条）
+_MAX_DROP_PROBE = 32
+
+
+def _id_of(item: Any) -> Optional[str]:
+    if isinstance(item, dict):
+        tid = item.get('id')
+        if isinstance(tid, str) and tid:
+            return tid
+    return None
+
+
+def _ids(data: Any) -> Optional[List[str]]:
+    """返回列表中全部 id；不是「唯一 id 的 dict 列表」时返回 None。"""
+    if not isinstance(data, list):
+        return None
+    ids = []
+    for item in data:
+        tid = _id_of(item)
+        if tid is None:
+            return None
+        ids.append(tid)
+    if len(set(ids)) != len(ids):
+        return None
+    return ids
+
+
+def _list_extension(old: list, new: list):
+    """若 new == old[drop:] + items，返回 (drop, items)；否则 None。"""
+    n_old = len(old)
+    for drop in range(0, min(n_old, _MAX_DROP_PROBE) + 1):
+        keep = n_old - drop
+        if len(new) < keep:
+            continue
+        if new[:keep] == old[drop:]:
+            return drop, new[keep:]
+    return None
+
+
+def _diff_value(tid: str, path: list, old: Any, new: Any, ops: list) -> None:
+    if old == new:
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for k, v in new.items():
+            if k not in old:
+                ops.append(['set', tid, path + [k], v])
+            else:
+                _diff_value(tid, path + [k], old[k], v, ops)
+        for k in old:
+            if k not in new:
+                ops.append(['unset', tid, path + [k]])
+        return
+    if isinstance(old, list) and isinstance(new, list) and path:
+        ext = _list_extension(old, new)
+        if ext is not None:
+            ops.append(['ext', tid, path, ext[0], ext[1]])
+            return
+    ops.append(['set', tid, path, new])
+
+
+def diff(base: Any, new: Any) -> Optional[list]:
+    """计算 base → new 的 ops；无法用 ops 表达（形状不符/顺序重排）时返回 None。
+
+    base 必须是修改前的独立副本（modifier 通常原地修改数据）。
+    """
+    base_ids = _ids(base)
+    new_ids = _ids(new)
+    if base_ids is None or new_ids is None:
+        return None
+    base_by_id = dict(zip(base_ids, base))
+    new_set = set(new_ids)
+    ops: list = [['del', tid] for tid in base_ids if tid not in new_set]
+
+    # 校验顺序：保留项相对顺序不变、新增项按最终下标插入后应与 new 一致
+    order = [tid for tid in base_ids if tid in new_set]
+    for i, (tid, task) in enumerate(zip(new_ids, new)):
+        old = base_by_id.get(tid)
+        if old is None:
+            ops.append(['put', tid, i, task])
+            order.insert(i, tid)
+        elif old != task:
+            _diff_value(tid, [], old, task, ops)
+    if order != new_ids:
+        return None
+    return ops
+
+
+def _parent(task: dict, path: list):
+    obj = task
+    for k in path[:-1]:
+        nxt = obj.get(k)
+        if not isinstance(nxt, dict):
+            nxt = obj[k] = {}
+        obj = nxt
+    return obj, path[-1]
+
+
+def apply(data: list, ops: list, index: Optional[Dict[str, dict]] = None) -> list:
+    """把 ops 原地应用到 data；index 为可复用的 id→task 映射（会同步更新）。"""
+    if index is None:
+        index = {t.get('id'): t for t in data if isinstance(t, dict)}
+    for op in ops:
+        kind, tid = op[0], op[1]
+        if kind == 'put':
+            old = index.pop(tid, None)
+            if old is not None:
+                data.remove(old)
+            data.insert(op[2], op[3])
+            index[tid] = op[3]
+        elif kind == 'del':
+            old = index.pop(tid, None)
+            if old is not None:
+                data.remove(old)
+        else:
+            task = index.get(tid)
+            if task is None:
+                continue
+            parent, key = _parent(task, op[2])
+            if kind == 'set':
+                parent[key] = op[3]
+            elif kind == 'unset':
+                parent.pop(key, None)
+            elif kind == 'ext':
+                lst = parent.get(key)
+                if not isinstance(lst, list):
+                    lst = parent[key] = []
+                del lst[:op[3]]
+                lst.extend(op[4])
+    return data
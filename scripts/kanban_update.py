@@ -41,7 +41,13 @@ log = logging.getLogger('kanban')
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(name)s] %(message)s', datefmt='%H:%M:%S')
 
 # 文件锁 —— 防止多 Agent 同时读写 tasks_source.json
-from file_lock import atomic_json_read, atomic_json_update  # noqa: E402
+from file_lock import atomic_json_update  # noqa: E402
+# 任务存储 —— JSON 文件 / SQLite 后端（EDICT_TASK_BACKEND）
+from task_store import open_task_store, task_backend  # noqa: E402
+# 刷新通知 —— 常驻 refresh_watcher 的 Unix socket
+import refresh_watcher  # noqa: E402
+# 审计日志 —— 追加式分段 JSONL
+from audit_log import AuditLog  # noqa: E402
 from utils import now_iso  # noqa: E402
 
 
@@ -105,17 +111,43 @@ _AGENT_LABELS = {
 
 MAX_PROGRESS_LOG = 100  # 单任务最大进展日志条数
 
+_task_store = None
+
+
+def get_task_store():
+    """TASKS_FILE 对应的任务存储（进程内复用；TASKS_FILE 或后端变化时重新打开）。"""
+    global _task_store
+    if _task_store is None or _task_store.path != TASKS_FILE or _task_store.backend != task_backend():
+        _task_store = open_task_store(TASKS_FILE)
+    return _task_store
+
+
 def load():
-    return atomic_json_read(TASKS_FILE, [])
+    return get_task_store().load()
+
+
+def _get_task(task_id):
+    return get_task_store().get(task_id)
+
+
+def _update_tasks(modifier, *task_ids):
+    """原子 读→改→写任务列表。
+
+    task_ids 为 modifier 会查找/新增的任务 id：SQLite 后端据此只读写这几行，
+    JSON 后端忽略（整文件持锁）。
+    """
+    return get_task_store().update(modifier, scope=task_ids or None)
 
 _REFRESH_SIGNAL_FILE = _BASE / 'data' / '.refresh_pending'
 
 def _trigger_refresh():
-    """Debounced refresh — touch 信号文件，由独立 watcher 合并执行。
-    
+    """Debounced refresh — 通知常驻 refresh_watcher，由其在进程内合并执行。
+
     替代原来每次 fork subprocess 的方式，避免多 Agent 并发时产生数百个进程。
-    如果 refresh_watcher 未运行，会 fallback 到直接 fork（保持向后兼容）。
+    socket 不可达时退回 touch 信号文件；watcher 未运行则直接 fork（保持向后兼容）。
     """
+    if refresh_watcher.notify(_BASE / 'data'):
+        return
     try:
         _REFRESH_SIGNAL_FILE.touch(exist_ok=True)
     except Exception:
@@ -131,11 +163,12 @@ def _trigger_refresh():
 
 
 # ── 审计日志 ──
-AUDIT_FILE = _BASE / 'data' / 'audit_log.json'
-MAX_AUDIT_LOG = 5000  # 审计日志最大条数
+AUDIT_DIR = _BASE / 'data' / 'audit_log'
+AUDIT_FILE = _BASE / 'data' / 'audit_log.json'  # 旧版整文件审计日志，首次追加时导入
+_AUDIT = AuditLog(AUDIT_DIR, legacy_file=AUDIT_FILE)
 
 def _append_audit(task_id, agent, action, old_val=None, new_val=None, reason=""):
-    """追加一条审计记录到 data/audit_log.json（原子操作）。"""
+    """追加一条审计记录到 data/audit_log/ 的活动段（只追加一行，不重写）。"""
     entry = {
         "ts": now_iso(),
         "task": task_id or "",
@@ -146,14 +179,7 @@ def _append_audit(task_id, agent, action, old_val=None, new_val=None, reason="")
         "reason": reason,
     }
     try:
-        def modifier(logs):
-            if logs is None:
-                logs = []
-            logs.append(entry)
-            if len(logs) > MAX_AUDIT_LOG:
-                logs = logs[-MAX_AUDIT_LOG:]
-            return logs
-        atomic_json_update(AUDIT_FILE, modifier, [])
+        _AUDIT.append(entry)
     except Exception as e:
         log.warning(f"审计日志写入失败: {e}")
 
@@ -317,7 +343,7 @@ def cmd_create(task_id, title, state, org, official, remark=None):
             "updatedAt": now_iso()
         })
         return tasks
-    atomic_json_update(TASKS_FILE, modifier, [])
+    _update_tasks(modifier, task_id)
     _trigger_refresh()
     log.info(f'✅ 创建 {task_id} | {title[:30]} | state={state}')
     _append_audit(task_id, _infer_agent_id_from_runtime(), 'create', None, state, title)
@@ -400,7 +426,7 @@ def cmd_state(task_id, new_state, now_text=None):
             t['now'] = now_text
         t['updatedAt'] = now_iso()
         return tasks
-    atomic_json_update(TASKS_FILE, modifier, [])
+    _update_tasks(modifier, task_id)
     _trigger_refresh()
     if rejected[0]:
         log.info(f'❌ {task_id} 状态转换被拒: {old_state[0]} → {new_state}')
@@ -431,7 +457,7 @@ def cmd_flow(task_id, from_dept, to_dept, remark):
         t['org'] = to_dept
         t['updatedAt'] = now_iso()
         return tasks
-    atomic_json_update(TASKS_FILE, modifier, [])
+    _update_tasks(modifier, task_id)
     _trigger_refresh()
     log.info(f'✅ {task_id} 流转记录: {from_dept} → {to_dept}')
     _append_audit(task_id, _infer_agent_id_from_runtime(), 'flow', from_dept, to_dept, clean_remark)
@@ -476,7 +502,7 @@ def cmd_done(task_id, output_path='', summary=''):
                 t['outputMeta'] = {"exists": False, "lastModified": None}
         t['updatedAt'] = now_iso()
         return tasks
-    atomic_json_update(TASKS_FILE, modifier, [])
+    _update_tasks(modifier, task_id)
     _trigger_refresh()
     if rejected[0]:
         log.warning(f'⚠️ {task_id} done 被拒绝：{reject_reason[0]}')
@@ -497,7 +523,7 @@ def cmd_block(task_id, reason):
         t['block'] = reason
         t['updatedAt'] = now_iso()
         return tasks
-    atomic_json_update(TASKS_FILE, modifier, [])
+    _update_tasks(modifier, task_id)
     _trigger_refresh()
     log.warning(f'⚠️ {task_id} 已阻塞: {reason}')
     _append_audit(task_id, _infer_agent_id_from_runtime(), 'block', None, 'Blocked', reason)
@@ -544,7 +570,7 @@ def cmd_confirm(task_id, action, reason=''):
             'remark': f'{"✅ 批准" if action == "approve" else "❌ 驳回"}: {reason}',
         })
         return tasks
-    atomic_json_update(TASKS_FILE, modifier, [])
+    _update_tasks(modifier, task_id)
     _trigger_refresh()
     if rejected[0]:
         log.info(f'❌ {task_id} confirm 操作失败')
@@ -637,7 +663,7 @@ def cmd_progress(task_id, now_text, todos_pipe='', tokens=0, cost=0.0, elapsed=0
         done_cnt[0] = sum(1 for td in t.get('todos', []) if td.get('status') == 'completed')
         total_cnt[0] = len(t.get('todos', []))
         return tasks
-    atomic_json_update(TASKS_FILE, modifier, [])
+    _update_tasks(modifier, task_id)
     _trigger_refresh()
     res_info = ''
     if tokens or cost or elapsed:
@@ -699,7 +725,7 @@ def cmd_todo(task_id, todo_id, title, status='not-started', detail=''):
             t['ready_to_close'] = True
             ready_to_close[0] = True
         return tasks
-    atomic_json_update(TASKS_FILE, modifier, [])
+    _update_tasks(modifier, task_id)
     _trigger_refresh()
     if rejected[0]:
         log.info(f'❌ {task_id} todo #{todo_id} → in-progress 被拒（已有进行中的 todo）')
@@ -717,6 +743,7 @@ MEMORY_DIR = _BASE / 'data' / 'agent_memory'
 TASK_MEMORY_DIR = _BASE / 'data' / 'task_memory'
 SHARED_MEMORY_FILE = _BASE / 'data' / 'shared_memory.json'
 MAX_AGENT_MEMORIES = 200
+MAX_SHARED_RULES = 100  # 全局规则上限（注入时只取最近 20 条）
 
 
 def cmd_memory(agent_id, mem_type, content, source_task='', tags=''):
@@ -771,9 +798,8 @@ def cmd_task_memo(task_id, agent_id, decisions, warnings=''):
     decision_list = [d.strip() for d in decisions.split(',') if d.strip()]
     warning_list = [w.strip() for w in warnings.split(',') if w.strip()] if warnings else []
 
-    # 从 tasks_source.json 获取当前状态
-    tasks = atomic_json_read(TASKS_FILE, [])
-    task = next((t for t in tasks if t.get('id') == task_id), None)
+    # 从任务存储获取当前状态
+    task = _get_task(task_id)
     phase = task.get('state', '') if task else ''
 
     chain_entry = {
@@ -795,18 +821,31 @@ def cmd_task_memo(task_id, agent_id, decisions, warnings=''):
     _append_audit(task_id, agent_id, 'task_memo', None, None, f'{len(decision_list)} decisions')
 
 
+def _normalize_rule(content):
+    """规则去重用的归一化形式（折叠空白、忽略大小写）。"""
+    return re.sub(r'\s+', ' ', content or '').strip().lower()
+
+
 def cmd_shared_memo(content, added_by):
-    """写入全局共享记忆（所有 Agent 可读的规则）。"""
+    """写入全局共享记忆（所有 Agent 可读的规则）。
+
+    写入时压缩：内容相同（忽略空白/大小写）的旧规则被新规则取代，
+    总数超过 MAX_SHARED_RULES 时淘汰最旧的规则。
+    """
     entry = {
         'content': content,
         'added_by': added_by,
         'at': now_iso(),
     }
+    norm = _normalize_rule(content)
 
     def modifier(data):
         if not data:
             data = {'rules': []}
-        data.setdefault('rules', []).append(entry)
+        rules = [r for r in data.get('rules', [])
+                 if not isinstance(r, dict) or _normalize_rule(r.get('content', '')) != norm]
+        rules.append(entry)
+        data['rules'] = rules[-MAX_SHARED_RULES:]
         return data
 
     atomic_json_update(SHARED_MEMORY_FILE, modifier, {})
@@ -831,8 +870,7 @@ def cmd_delegate(task_id, from_agent, to_agent, instruction, return_spec=''):
     防死锁：记录 delegation_depth 和 delegation_path，超过 3 层或循环委派时拒绝。
     """
     # 检查父任务，获取委派链信息
-    tasks = atomic_json_read(TASKS_FILE, [])
-    parent = next((t for t in tasks if t.get('id') == task_id), None)
+    parent = _get_task(task_id)
     if not parent:
         log.error(f'父任务 {task_id} 不存在')
         return
@@ -885,7 +923,7 @@ def cmd_delegate(task_id, from_agent, to_agent, instruction, return_spec=''):
         tasks.insert(0, sub_task)
         return tasks
 
-    atomic_json_update(TASKS_FILE, modifier, [])
+    _update_tasks(modifier, sub_task_id)
     _trigger_refresh()
     log.info(f'📋 委派 {sub_task_id}: {from_agent} → {to_agent} (depth={depth})')
     _append_audit(task_id, from_agent, 'delegate', to_agent, sub_task_id, instruction)
@@ -893,8 +931,7 @@ def cmd_delegate(task_id, from_agent, to_agent, instruction, return_spec=''):
 
 def cmd_delegate_result(sub_task_id, result_json):
     """提交委派子任务结果，回写到父任务的 task_memory。"""
-    tasks = atomic_json_read(TASKS_FILE, [])
-    sub = next((t for t in tasks if t.get('id') == sub_task_id), None)
+    sub = _get_task(sub_task_id)
     if not sub:
         log.error(f'子任务 {sub_task_id} 不存在')
         return
@@ -912,7 +949,7 @@ def cmd_delegate_result(sub_task_id, result_json):
             t['updatedAt'] = now_iso()
             t['delegation_result'] = result_json
         return tasks
-    atomic_json_update(TASKS_FILE, modifier, [])
+    _update_tasks(modifier, sub_task_id)
 
     # 写入父任务的 task_memory
     if parent_id:
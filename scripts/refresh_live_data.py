@@ -1,6 +1,19 @@
 #!/usr/bin/env python3
-import json, pathlib, datetime, logging
-from file_lock import atomic_json_write, atomic_json_read
+"""生成 data/live_status.json（看板实时数据）。
+
+增量刷新：任务写入方（task_store）在 tasks_source.changes 记录每次写入涉及的任务 id，
+RefreshEngine 记住上次消费到的版本号，只重新读取、富化变化的任务，
+todayDone / totalDone / inProgress / blocked 以逐任务贡献值累加维护。
+以下情况回退全量刷新：首次运行、变更日志出现整体写入或断档、跨天、
+officials 变化，以及距上次全量超过 FULL_INTERVAL_SEC（兜底绕过任务仓库直接改文件的写入方）。
+
+单次运行（python3 refresh_live_data.py）会从上一份 live_status.json 恢复状态；
+常驻进程可以直接复用同一个 RefreshEngine 实例。
+"""
+import pathlib, datetime, logging, os, time
+from file_lock import atomic_json_write
+from task_store import open_task_store
+import task_changes
 from utils import read_json
 
 log = logging.getLogger('refresh')
@@ -9,6 +22,9 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(name)s] %(message
 BASE = pathlib.Path(__file__).parent.parent
 DATA = BASE / 'data'
 
+FULL_INTERVAL_SEC = 300
+_ACTIVE_STATES = ('Doing', 'Assigned', 'Review')
+
 
 def output_meta(path):
     p = pathlib.Path(path)
@@ -18,104 +34,301 @@ def output_meta(path):
     return {"exists": True, "lastModified": ts}
 
 
-def main():
-    # 使用 officials_stats.json（与 sync_officials_stats.py 统一）
-    officials_data = read_json(DATA / 'officials_stats.json', {})
-    officials = officials_data.get('officials', []) if isinstance(officials_data, dict) else officials_data
-    # 任务源优先：tasks_source.json（可对接外部系统同步写入）
-    tasks = atomic_json_read(DATA / 'tasks_source.json', [])
-    if not tasks:
-        tasks = read_json(DATA / 'tasks.json', [])
-
-    sync_status = read_json(DATA / 'sync_status.json', {})
-
-    org_map = {}
-    for o in officials:
-        label = o.get('label', o.get('name', ''))
-        if label:
-            org_map[label] = label
-
-    now_ts = datetime.datetime.now(datetime.timezone.utc)
-    for t in tasks:
-        t['org'] = t.get('org') or org_map.get(t.get('official', ''), '')
-        t['outputMeta'] = output_meta(t.get('output', ''))
-
-        # 心跳时效检测：对 Doing/Assigned 状态的任务标注活跃度
-        if t.get('state') in ('Doing', 'Assigned', 'Review'):
-            updated_raw = t.get('updatedAt') or t.get('sourceMeta', {}).get('updatedAt')
-            age_sec = None
-            if updated_raw:
-                try:
-                    if isinstance(updated_raw, (int, float)):
-                        updated_dt = datetime.datetime.fromtimestamp(updated_raw / 1000, tz=datetime.timezone.utc)
-                    else:
-                        updated_dt = datetime.datetime.fromisoformat(str(updated_raw).replace('Z', '+00:00'))
-                    age_sec = (now_ts - updated_dt).total_seconds()
-                except Exception:
-                    pass
-            if age_sec is None:
-                t['heartbeat'] = {'status': 'unknown', 'label': '⚪ 未知', 'ageSec': None}
-            elif age_sec < 300:
-                t['heartbeat'] = {'status': 'active', 'label': f'🟢 活跃 {int(age_sec//60)}分钟前', 'ageSec': int(age_sec)}
-            elif age_sec < 900:
-                t['heartbeat'] = {'status': 'warn', 'label': f'🟡 可能停滞 {int(age_sec//60)}分钟前', 'ageSec': int(age_sec)}
+def _heartbeat(t, now_ts):
+    """心跳时效检测：对 Doing/Assigned/Review 状态的任务标注活跃度。"""
+    if t.get('state') not in _ACTIVE_STATES:
+        return None
+    updated_raw = t.get('updatedAt') or t.get('sourceMeta', {}).get('updatedAt')
+    age_sec = None
+    if updated_raw:
+        try:
+            if isinstance(updated_raw, (int, float)):
+                updated_dt = datetime.datetime.fromtimestamp(updated_raw / 1000, tz=datetime.timezone.utc)
             else:
-                t['heartbeat'] = {'status': 'stalled', 'label': f'🔴 已停滞 {int(age_sec//60)}分钟', 'ageSec': int(age_sec)}
-        else:
-            t['heartbeat'] = None
+                updated_dt = datetime.datetime.fromisoformat(str(updated_raw).replace('Z', '+00:00'))
+            age_sec = (now_ts - updated_dt).total_seconds()
+        except Exception:
+            pass
+    if age_sec is None:
+        return {'status': 'unknown', 'label': '⚪ 未知', 'ageSec': None}
+    if age_sec < 300:
+        return {'status': 'active', 'label': f'🟢 活跃 {int(age_sec//60)}分钟前', 'ageSec': int(age_sec)}
+    if age_sec < 900:
+        return {'status': 'warn', 'label': f'🟡 可能停滞 {int(age_sec//60)}分钟前', 'ageSec': int(age_sec)}
+    return {'status': 'stalled', 'label': f'🔴 已停滞 {int(age_sec//60)}分钟', 'ageSec': int(age_sec)}
 
-    today_str = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d')
-    def _is_today_done(t):
-        if t.get('state') != 'Done':
-            return False
-        ua = t.get('updatedAt', '')
-        if isinstance(ua, str) and ua[:10] == today_str:
-            return True
-        # fallback: outputMeta lastModified
-        lm = t.get('outputMeta', {}).get('lastModified', '')
-        if isinstance(lm, str) and lm[:10] == today_str:
-            return True
+
+def _is_today_done(t, today_str):
+    if t.get('state') != 'Done':
         return False
-    today_done = sum(1 for t in tasks if _is_today_done(t))
-    total_done = sum(1 for t in tasks if t.get('state') == 'Done')
-    in_progress = sum(1 for t in tasks if t.get('state') in ['Doing', 'Review', 'Next', 'Blocked'])
-    blocked = sum(1 for t in tasks if t.get('state') == 'Blocked')
-
-    history = []
-    for t in tasks:
-        if t.get('state') == 'Done':
-            lm = t.get('outputMeta', {}).get('lastModified')
-            history.append({
-                'at': lm or '未知',
-                'official': t.get('official'),
-                'task': t.get('title'),
-                'out': t.get('output'),
-                'qa': '通过' if t.get('outputMeta', {}).get('exists') else '待补成果'
-            })
-
-    payload = {
-        'generatedAt': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        'taskSource': 'tasks_source.json' if (DATA / 'tasks_source.json').exists() else 'tasks.json',
-        'officials': officials,
-        'tasks': tasks,
-        'history': history,
-        'metrics': {
-            'officialCount': len(officials),
-            'todayDone': today_done,
-            'totalDone': total_done,
-            'inProgress': in_progress,
-            'blocked': blocked
-        },
-        'syncStatus': sync_status,
-        'health': {
-            'syncOk': bool(sync_status.get('ok', False)),
-            'syncLatencyMs': sync_status.get('durationMs'),
-            'missingFieldCount': len(sync_status.get('missingFields', {})),
-        }
+    ua = t.get('updatedAt', '')
+    if isinstance(ua, str) and ua[:10] == today_str:
+        return True
+    # fallback: outputMeta lastModified
+    lm = t.get('outputMeta', {}).get('lastModified', '')
+    if isinstance(lm, str) and lm[:10] == today_str:
+        return True
+    return False
+
+
+def _contribution(t, today_str):
+    """单个任务对 metrics 的贡献：(todayDone, totalDone, inProgress, blocked)。"""
+    state = t.get('state')
+    return (
+        1 if _is_today_done(t, today_str) else 0,
+        1 if state == 'Done' else 0,
+        1 if state in ('Doing', 'Review', 'Next', 'Blocked') else 0,
+        1 if state == 'Blocked' else 0,
+    )
+
+
+def _history_entry(t):
+    lm = t.get('outputMeta', {}).get('lastModified')
+    return {
+        'at': lm or '未知',
+        'official': t.get('official'),
+        'task': t.get('title'),
+        'out': t.get('output'),
+        'qa': '通过' if t.get('outputMeta', {}).get('exists') else '待补成果'
     }
 
-    atomic_json_write(DATA / 'live_status.json', payload)
-    log.info(f'updated live_status.json ({len(tasks)} tasks)')
+
+def _file_sig(path):
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+class RefreshEngine:
+    """live_status.json 的增量生成器（见模块说明）。"""
+
+    def __init__(self, data_dir=None):
+        self.data = pathlib.Path(data_dir) if data_dir else DATA
+        self.tasks_path = self.data / 'tasks_source.json'
+        self.store = open_task_store(self.tasks_path)
+        self.version = None          # 已消费到的变更版本；None = 需要全量
+        self.tasks = []              # 富化后的任务（与任务源顺序一致）
+        self.index = {}              # id -> 富化后的任务
+        self.pos = {}                # id -> 在 self.tasks 中的下标
+        self.active = set()          # 需要重算心跳的任务 id（_ACTIVE_STATES）
+        self.watch_output = set()    # 增量刷新时复查产出文件的任务 id（未完成且有 output）
+        self.contrib = {}            # id -> metrics 贡献值
+        self.totals = [0, 0, 0, 0]
+        self.today = None
+        self.last_full = 0.0
+        self.officials = []
+        self.org_map = {}
+        self._officials_sig = None
+        self._officials_loaded = False
+        self._output_cache = {}      # 产出路径 -> ((mtime_ns, size), outputMeta)
+        self.stats = {'runs': 0, 'full': 0, 'incremental': 0, 'patched': 0, 'lastMs': 0}
+
+    # ── 输入 ──
+
+    def _load_officials(self):
+        """officials_stats.json 变化时返回 True。"""
+        sig = _file_sig(self.data / 'officials_stats.json')
+        if self._officials_loaded and sig == self._officials_sig:
+            return False
+        self._officials_loaded = True
+        self._officials_sig = sig
+        # 使用 officials_stats.json（与 sync_officials_stats.py 统一）
+        officials_data = read_json(self.data / 'officials_stats.json', {})
+        self.officials = officials_data.get('officials', []) if isinstance(officials_data, dict) else officials_data
+        self.org_map = {}
+        for o in self.officials:
+            label = o.get('label', o.get('name', ''))
+            if label:
+                self.org_map[label] = label
+        return True
+
+    def _output_meta(self, path):
+        """带缓存的 output_meta：文件 (mtime_ns, size) 未变时复用上次结果，只需一次 stat。"""
+        sig = _file_sig(pathlib.Path(path))
+        cached = self._output_cache.get(path)
+        if cached is None or cached[0] != sig:
+            cached = self._output_cache[path] = (sig, output_meta(path))
+        return dict(cached[1])
+
+    def _enrich(self, t, now_ts):
+        t['org'] = t.get('org') or self.org_map.get(t.get('official', ''), '')
+        t['outputMeta'] = self._output_meta(t.get('output', ''))
+        t['heartbeat'] = _heartbeat(t, now_ts)
+        return t
+
+    def _track(self, t):
+        tid = t.get('id')
+        if t.get('state') in _ACTIVE_STATES:
+            self.active.add(tid)
+        else:
+            self.active.discard(tid)
+        if t.get('output') and t.get('state') != 'Done':
+            self.watch_output.add(tid)
+        else:
+            self.watch_output.discard(tid)
+
+    def _index_positions(self):
+        self.pos = {t.get('id'): i for i, t in enumerate(self.tasks) if isinstance(t, dict)}
+
+    def _index_all(self):
+        self.index = {t.get('id'): t for t in self.tasks if isinstance(t, dict)}
+        self._index_positions()
+        self.contrib = {}
+        self.totals = [0, 0, 0, 0]
+        self.active = set()
+        self.watch_output = set()
+        for t in self.tasks:
+            c = _contribution(t, self.today)
+            self.contrib[t.get('id')] = c
+            self.totals = [a + b for a, b in zip(self.totals, c)]
+            self._track(t)
+
+    # ── 刷新 ──
+
+    def _full(self, now_ts):
+        version = task_changes.current_version(self.tasks_path)
+        # 任务源优先：tasks_source.json（可对接外部系统同步写入）
+        tasks = self.store.load()
+        from_store = bool(tasks)
+        if not tasks:
+            tasks = read_json(self.data / 'tasks.json', [])
+        self.tasks = [self._enrich(t, now_ts) for t in tasks]
+        self._index_all()
+        # 旧版 tasks.json 不产生变更日志，只能每次全量
+        self.version = version if from_store else None
+        self.last_full = time.time()
+        self.stats['full'] += 1
+        return len(self.tasks)
+
+    def _patch(self, changed, now_ts):
+        added, removed = [], False
+        for tid in changed:
+            raw = self.store.get(tid)
+            old = self.index.pop(tid, None)
+            old_c = self.contrib.pop(tid, (0, 0, 0, 0))
+            self.totals = [a - b for a, b in zip(self.totals, old_c)]
+            if raw is None:
+                if old is not None:
+                    self.tasks[self.pos.pop(tid)] = None   # 先留空位，循环结束后统一压缩
+                    self.active.discard(tid)
+                    self.watch_output.discard(tid)
+                    removed = True
+                continue
+            t = self._enrich(dict(raw), now_ts)
+            if old is not None:
+                self.tasks[self.pos[tid]] = t
+            else:
+                added.append(t)
+            self.index[tid] = t
+            self._track(t)
+            c = _contribution(t, self.today)
+            self.contrib[tid] = c
+            self.totals = [a + b for a, b in zip(self.totals, c)]
+        if added or removed:
+            # 新任务均插在最前（与 kanban / 看板创建一致），后加入的更靠前
+            self.tasks = added[::-1] + [t for t in self.tasks if t is not None]
+            self._index_positions()
+        # 产出文件可能在任务未写入时变化：只复查未完成且有产出路径的任务，
+        # 已完成任务的产出留给 FULL_INTERVAL_SEC 的全量刷新；签名变化的才重算贡献值
+        for tid in self.watch_output:
+            t = self.index[tid]
+            meta = self._output_meta(t.get('output', ''))
+            if meta != t.get('outputMeta'):
+                t['outputMeta'] = meta
+                old_c = self.contrib.get(tid, (0, 0, 0, 0))
+                c = self.contrib[tid] = _contribution(t, self.today)
+                self.totals = [a - b + d for a, b, d in zip(self.totals, old_c, c)]
+        # 心跳随时间变化：只需重算活跃状态的任务（纯计算，无 IO）
+        for tid in self.active:
+            t = self.index[tid]
+            t['heartbeat'] = _heartbeat(t, now_ts)
+        self.stats['incremental'] += 1
+        self.stats['patched'] += len(changed)
+        return len(changed)
+
+    def refresh(self, meta=None):
+        """执行一次刷新并写出 live_status.json，返回本次统计。
+
+        meta 会合并进输出的 refresh 字段（常驻 watcher 用来附带自身的统计）。
+        """
+        t0 = time.time()
+        now_ts = datetime.datetime.now(datetime.timezone.utc)
+        today_str = now_ts.strftime('%Y-%m-%d')
+        officials_changed = self._load_officials()
+
+        mode, count = 'full', 0
+        if (self.version is not None and not officials_changed and today_str == self.today
+                and time.time() - self.last_full < FULL_INTERVAL_SEC):
+            version, changed = task_changes.read_since(self.tasks_path, self.version)
+            if changed is not None:
+                count = self._patch(changed, now_ts)
+                self.version = version
+                mode = 'incremental'
+        if mode == 'full':
+            self.today = today_str
+            count = self._full(now_ts)
+
+        self._write(mode, meta)
+        elapsed_ms = int((time.time() - t0) * 1000)
+        self.stats['runs'] += 1
+        self.stats['lastMs'] = elapsed_ms
+        log.info(f'updated live_status.json ({len(self.tasks)} tasks, {mode}, {count} recomputed, {elapsed_ms}ms)')
+        return {'mode': mode, 'recomputed': count, 'tasks': len(self.tasks), 'ms': elapsed_ms}
+
+    def _write(self, mode, meta=None):
+        sync_status = read_json(self.data / 'sync_status.json', {})
+        today_done, total_done, in_progress, blocked = self.totals
+        history = [_history_entry(t) for t in self.tasks if t.get('state') == 'Done']
+        payload = {
+            'generatedAt': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'taskSource': 'tasks_source.json' if self.tasks_path.exists() else 'tasks.json',
+            'officials': self.officials,
+            'tasks': self.tasks,
+            'history': history,
+            'metrics': {
+                'officialCount': len(self.officials),
+                'todayDone': today_done,
+                'totalDone': total_done,
+                'inProgress': in_progress,
+                'blocked': blocked
+            },
+            'syncStatus': sync_status,
+            'health': {
+                'syncOk': bool(sync_status.get('ok', False)),
+                'syncLatencyMs': sync_status.get('durationMs'),
+                'missingFieldCount': len(sync_status.get('missingFields', {})),
+            },
+            'refresh': {
+                'mode': mode,
+                'version': self.version,
+                'today': self.today,
+                'lastFullAt': self.last_full,
+                **(meta or {}),
+            },
+        }
+        atomic_json_write(self.data / 'live_status.json', payload)
+
+    def restore(self):
+        """从上一份 live_status.json 恢复状态（单次运行的进程用），成功返回 True。"""
+        prev = read_json(self.data / 'live_status.json', {})
+        meta = prev.get('refresh') if isinstance(prev, dict) else None
+        if not isinstance(meta, dict) or meta.get('version') is None or not isinstance(prev.get('tasks'), list):
+            return False
+        self._load_officials()
+        self.tasks = prev['tasks']
+        self.today = meta.get('today')
+        self.version = int(meta['version'])
+        self.last_full = float(meta.get('lastFullAt') or 0)
+        self._index_all()
+        return True
+
+
+def main():
+    engine = RefreshEngine()
+    engine.restore()
+    engine.refresh()
 
 
 if __name__ == '__main__':
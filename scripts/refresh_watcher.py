@@ -1,8 +1,15 @@
 #!/usr/bin/env python3
-"""Refresh Watcher — 常驻进程，监控信号文件，debounce 后执行 refresh_live_data.py。
-
-替代 kanban_update.py 中每次操作都 fork 子进程的方式。
-多 Agent 并发时，200 次 touch → 合并为 1 次 refresh。
+"""Refresh Watcher — 常驻刷新进程，进程内执行 refresh_live_data 的 RefreshEngine。
+
+替代 kanban_update.py / server.py 中每次写入都 fork 子进程的方式：
+  - 写入方通过 Unix datagram socket（data/.refresh.sock）发一个字节通知，
+    不可达时（watcher 未运行 / 非 Unix 平台）才退回旧方式；
+  - 仍兼容 data/.refresh_pending 信号文件（mtime 轮询），供旧版写入方使用；
+  - 通知在 DEBOUNCE_SEC 静默窗口内合并，最长延迟 MAX_DELAY_SEC；
+    多 Agent 并发时，200 次通知 → 合并为 1 次 refresh；
+  - RefreshEngine 常驻内存，保留上次的任务快照与变更版本，只做增量刷新；
+  - 刷新延迟（首个通知 → live_status.json 写完）与合并次数写入
+    live_status.json 的 refresh.daemon 字段，并定期打日志。
 
 运行方式:
   python3 scripts/refresh_watcher.py
@@ -12,87 +19,226 @@
   - docker-compose: 参见 edict/docker-compose.yml
   - 手动前台: python3 scripts/refresh_watcher.py
 """
+import collections
 import logging
 import os
 import pathlib
+import select
 import signal
-import subprocess
+import socket
 import sys
+import threading
 import time
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent))
+
 _BASE = pathlib.Path(os.environ.get('EDICT_HOME', '')).resolve() if os.environ.get('EDICT_HOME') else pathlib.Path(__file__).resolve().parent.parent
-SIGNAL_FILE = _BASE / 'data' / '.refresh_pending'
-PID_FILE = _BASE / 'data' / '.refresh_watcher_pid'
-REFRESH_SCRIPT = _BASE / 'scripts' / 'refresh_live_data.py'
-DEBOUNCE_SEC = 2       # 信号文件稳定 2 秒后才执行
-POLL_INTERVAL = 0.5    # 检查间隔
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [refresh_watcher] %(message)s',
-    datefmt='%H:%M:%S',
-)
+DATA = _BASE / 'data'
+SIGNAL_FILE = DATA / '.refresh_pending'
+PID_FILE = DATA / '.refresh_watcher_pid'
+SOCKET_NAME = '.refresh.sock'
+DEBOUNCE_SEC = 0.3     # 最后一次通知后静默这么久才执行
+MAX_DELAY_SEC = 2.0    # 持续有通知时，首个通知最多等待这么久
+POLL_INTERVAL = 0.5    # 信号文件（兼容旧写入方）检查间隔
+_LATENCY_WINDOW = 200
+
 log = logging.getLogger('refresh_watcher')
 
-_running = True
+
+def socket_path(data_dir=None) -> pathlib.Path:
+    return pathlib.Path(data_dir or DATA) / SOCKET_NAME
 
 
-def _shutdown(signum, frame):
-    global _running
-    _running = False
-    log.info(f'收到信号 {signum}，准备退出')
+def notify(data_dir=None) -> bool:
+    """通知常驻 watcher 刷新；watcher 不可达时返回 False，由调用方自行兜底。"""
+    if not hasattr(socket, 'AF_UNIX'):
+        return False
+    path = socket_path(data_dir)
+    if not path.exists():
+        return False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as s:
+            s.setblocking(False)
+            s.sendto(b'r', str(path))
+        return True
+    except BlockingIOError:
+        # 接收队列已满：已有大量待合并的通知，本次无需再发
+        return True
+    except OSError:
+        return False
+
+
+class RefreshDaemon:
+    def __init__(self, data_dir=None):
+        from refresh_live_data import RefreshEngine
+
+        self.data = pathlib.Path(data_dir or DATA)
+        self.engine = RefreshEngine(self.data)
+        self.sock = None
+        self._signal_mtime = 0.0
+        self._last_signal_check = 0.0
+        self._stop = threading.Event()
+        self._latencies = collections.deque(maxlen=_LATENCY_WINDOW)
+        self.stats = {
+            'notifications': 0,   # 收到的通知总数（含信号文件）
+            'refreshes': 0,
+            'coalesced': 0,       # 被合并掉的通知数 = notifications - refreshes
+            'maxBatch': 0,
+            'errors': 0,
+            'lastLatencyMs': None,
+            'p50LatencyMs': None,
+            'p95LatencyMs': None,
+        }
+
+    # ── 通知来源 ──
+
+    def open(self):
+        """绑定通知 socket；已有存活的 watcher 时抛 RuntimeError。"""
+        if not hasattr(socket, 'AF_UNIX'):
+            log.warning('当前平台不支持 Unix socket，仅轮询信号文件')
+            return
+        path = socket_path(self.data)
+        if path.exists():
+            if notify(self.data):
+                raise RuntimeError(f'refresh watcher 已在运行 ({path})')
+            path.unlink()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(str(path))
+        self.sock.setblocking(False)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            try:
+                socket_path(self.data).unlink()
+            except FileNotFoundError:
+                pass
+
+    def _drain(self, timeout):
+        """等待最多 timeout 秒，返回收到的通知数（socket + 信号文件）。"""
+        count = 0
+        if self.sock is not None:
+            ready, _, _ = select.select([self.sock], [], [], max(0.0, timeout))
+            if ready:
+                while True:
+                    try:
+                        self.sock.recv(64)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    count += 1
+        elif timeout > 0:
+            self._stop.wait(timeout)
+        now = time.time()
+        if now - self._last_signal_check >= POLL_INTERVAL:
+            self._last_signal_check = now
+            count += self._check_signal_file()
+        return count
+
+    def _check_signal_file(self):
+        signal_file = self.data / SIGNAL_FILE.name
+        try:
+            mtime = signal_file.stat().st_mtime
+        except FileNotFoundError:
+            return 0
+        if mtime <= self._signal_mtime:
+            return 0
+        self._signal_mtime = mtime
+        # 删除信号文件（在执行前删，避免执行期间的新 touch 被吞）
+        try:
+            signal_file.unlink()
+        except FileNotFoundError:
+            pass
+        return 1
+
+    # ── 刷新 ──
+
+    def run_once(self, batch, first_at):
+        try:
+            self.engine.refresh(meta={'daemon': self.stats})
+        except Exception as e:
+            self.stats['errors'] += 1
+            self.engine.version = None   # 状态可能不完整，下次全量重建
+            log.error(f'refresh 执行失败: {e}')
+            return
+        latency_ms = int((time.time() - first_at) * 1000)
+        self._latencies.append(latency_ms)
+        ordered = sorted(self._latencies)
+        self.stats['refreshes'] += 1
+        self.stats['coalesced'] += batch - 1
+        self.stats['maxBatch'] = max(self.stats['maxBatch'], batch)
+        self.stats['lastLatencyMs'] = latency_ms
+        self.stats['p50LatencyMs'] = ordered[len(ordered) // 2]
+        self.stats['p95LatencyMs'] = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        if self.stats['refreshes'] % 50 == 0:
+            log.info(f'📊 refreshes={self.stats["refreshes"]} notifications={self.stats["notifications"]} '
+                     f'coalesced={self.stats["coalesced"]} p50={self.stats["p50LatencyMs"]}ms '
+                     f'p95={self.stats["p95LatencyMs"]}ms')
+
+    def serve_forever(self):
+        self.engine.restore()
+        while not self._stop.is_set():
+            try:
+                batch = self._drain(POLL_INTERVAL)
+                if not batch:
+                    continue
+                first_at = time.time()
+                # 静默 DEBOUNCE_SEC 或累计等待 MAX_DELAY_SEC 后执行，期间的通知全部合并
+                while not self._stop.is_set():
+                    remaining = MAX_DELAY_SEC - (time.time() - first_at)
+                    if remaining <= 0:
+                        break
+                    more = self._drain(min(DEBOUNCE_SEC, remaining))
+                    if not more:
+                        break
+                    batch += more
+                self.stats['notifications'] += batch
+                self.run_once(batch, first_at)
+            except Exception as e:
+                log.error(f'Watcher loop error: {e}')
+                time.sleep(POLL_INTERVAL)
+
+    def stop(self):
+        self._stop.set()
 
 
 def main():
-    # 写 PID 文件，让 kanban_update.py 知道 watcher 在运行
-    PID_FILE.parent.mkdir(parents=True, exist_ok=True)
-    PID_FILE.write_text(str(os.getpid()))
-    log.info(f'Refresh watcher started (pid={os.getpid()}, debounce={DEBOUNCE_SEC}s)')
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s [refresh_watcher] %(message)s',
+        datefmt='%H:%M:%S',
+    )
+    daemon = RefreshDaemon()
+    try:
+        daemon.open()
+    except RuntimeError as e:
+        log.error(str(e))
+        sys.exit(1)
+
+    def _shutdown(signum, frame):
+        log.info(f'收到信号 {signum}，准备退出')
+        daemon.stop()
 
     signal.signal(signal.SIGTERM, _shutdown)
     signal.signal(signal.SIGINT, _shutdown)
 
-    last_seen_mtime = 0.0
-    refresh_count = 0
-
+    # 写 PID 文件，让 kanban_update.py 知道 watcher 在运行
+    PID_FILE.parent.mkdir(parents=True, exist_ok=True)
+    PID_FILE.write_text(str(os.getpid()))
+    log.info(f'Refresh watcher started (pid={os.getpid()}, debounce={DEBOUNCE_SEC}s, '
+             f'socket={socket_path() if daemon.sock else "-"})')
     try:
-        while _running:
-            try:
-                if SIGNAL_FILE.exists():
-                    mtime = SIGNAL_FILE.stat().st_mtime
-                    now = time.time()
-                    # 信号文件存在且已稳定 DEBOUNCE_SEC 秒
-                    if mtime > last_seen_mtime and (now - mtime) >= DEBOUNCE_SEC:
-                        last_seen_mtime = mtime
-                        # 删除信号文件（在执行前删，避免执行期间的新 touch 被吞）
-                        try:
-                            SIGNAL_FILE.unlink()
-                        except FileNotFoundError:
-                            pass
-
-                        refresh_count += 1
-                        log.info(f'🔄 执行 refresh #{refresh_count}')
-                        try:
-                            subprocess.run(
-                                [sys.executable, str(REFRESH_SCRIPT)],
-                                capture_output=True,
-                                timeout=30,
-                            )
-                        except subprocess.TimeoutExpired:
-                            log.warning('refresh_live_data.py 超时 (30s)')
-                        except Exception as e:
-                            log.error(f'refresh 执行失败: {e}')
-            except Exception as e:
-                log.error(f'Watcher loop error: {e}')
-
-            time.sleep(POLL_INTERVAL)
+        daemon.serve_forever()
     finally:
+        daemon.close()
         # 清理 PID 文件
         try:
             PID_FILE.unlink()
         except Exception:
             pass
-        log.info(f'Refresh watcher stopped (total refreshes: {refresh_count})')
+        log.info(f'Refresh watcher stopped (total refreshes: {daemon.stats["refreshes"]}, '
+                 f'coalesced: {daemon.stats["coalesced"]})')
 
 
 if __name__ == '__main__':
@@ -6,6 +6,7 @@ import datetime
 import traceback
 import logging
 from file_lock import atomic_json_write, atomic_json_read
+from task_store import open_task_store
 from utils import get_openclaw_home
 
 log = logging.getLogger('sync_runtime')
@@ -306,10 +307,10 @@ def main():
         # ── 保留已有的 JJC-* 旨意任务（不覆盖皇上下旨记录）──
         # JJC 任务的 now 字段由 Agent 自己通过 kanban_update.py progress 命令主动上报，
         # 不再从会话日志中被动抓取。这里只做合并，不做 activity 映射。
-        existing_tasks_file = DATA / 'tasks_source.json'
-        if existing_tasks_file.exists():
+        task_store = open_task_store(DATA / 'tasks_source.json')
+        if (DATA / 'tasks_source.json').exists() or task_store.backend != 'json':
             try:
-                existing = json.loads(existing_tasks_file.read_text())
+                existing = task_store.load()
                 jjc_existing = [t for t in existing if str(t.get('id', '')).startswith('JJC')]
                 
                 # 去掉 tasks 里已有的 JJC（以防重复），再把旨意放到最前面
@@ -319,7 +320,7 @@ def main():
                 log.error(f'merge existing JJC tasks failed: {e}')
                 pass
 
-        atomic_json_write(DATA / 'tasks_source.json', tasks)
+        task_store.save(tasks)
 
         duration_ms = int((time.time() - start) * 1000)
         write_status(
@@ -2,6 +2,8 @@
 """同步各官员统计数据 → data/officials_stats.json"""
 import json, pathlib, datetime, logging
 from file_lock import atomic_json_write
+import task_history
+from task_store import open_task_store
 from utils import get_openclaw_home
 
 log = logging.getLogger('officials')
@@ -158,7 +160,9 @@ def get_hb(agent_id, live_tasks):
     return {'status':'idle','label':'⚪ 待命','ageSec':None}
 
 def main():
-    tasks = rj(DATA/'tasks_source.json', [])
+    store = open_task_store(DATA/'tasks_source.json')
+    # 流转统计需要完整 flow_log（含冷热分离后迁出的历史）
+    tasks = [task_history.hydrate(t, store.history_dir) for t in store.load()]
     live  = rj(DATA/'live_status.json', {})
     live_tasks = live.get('tasks', [])
 
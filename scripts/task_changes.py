@@ -0,0 +1,99 @@
+"""
+任务变更日志 — 记录每次写入涉及的任务 id，供增量刷新（refresh_live_data）使用。
+
+文件: data/tasks_source.changes（JSONL，每行一次写入）
+    {"v": 42, "at": 1700000000.0, "ids": ["JJC-001"]}   # 仅这些任务可能变化
+    {"v": 43, "at": 1700000001.0, "ids": null}          # 整体写入，需全量刷新
+
+v 单调递增。文件超过 MAX_BYTES 时只保留最新一行重写；
+读取方发现「最早一行的 v 比自己记录的版本 + 1 还大」即说明有记录被裁掉，回退到全量刷新。
+ids 是「可能变化」的超集，多报只会让刷新多算几条，不影响正确性。
+"""
+import json
+import os
+import pathlib
+import time
+from typing import Iterable, Optional, Set, Tuple
+
+from file_lock import locked
+
+MAX_BYTES = 256 * 1024
+_TAIL_BYTES = 4096
+
+
+def changes_path(tasks_path: pathlib.Path) -> pathlib.Path:
+    tasks_path = pathlib.Path(tasks_path)
+    return tasks_path.parent / (tasks_path.stem + '.changes')
+
+
+def _last_version(path: pathlib.Path) -> int:
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - _TAIL_BYTES))
+            tail = f.read().decode('utf-8', errors='replace')
+    except FileNotFoundError:
+        return 0
+    for line in reversed(tail.splitlines()):
+        try:
+            return int(json.loads(line)['v'])
+        except Exception:
+            continue
+    return 0
+
+
+def record(tasks_path: pathlib.Path, ids: Optional[Iterable[str]]) -> int:
+    """追加一条变更记录并返回新版本号；ids=None 表示全量变化。"""
+    path = changes_path(tasks_path)
+    with locked(path, exclusive=True):
+        version = _last_version(path) + 1
+        line = json.dumps({
+            'v': version,
+            'at': round(time.time(), 3),
+            'ids': sorted({str(i) for i in ids}) if ids is not None else None,
+        }, ensure_ascii=False) + '\n'
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            size = 0
+        with open(path, 'w' if size + len(line) > MAX_BYTES else 'a', encoding='utf-8') as f:
+            f.write(line)
+        return version
+
+
+def current_version(tasks_path: pathlib.Path) -> int:
+    path = changes_path(tasks_path)
+    with locked(path):
+        return _last_version(path)
+
+
+def read_since(tasks_path: pathlib.Path, version: int) -> Tuple[int, Optional[Set[str]]]:
+    """返回 (最新版本, version 之后变化过的任务 id)；第二项为 None 表示需要全量刷新。"""
+    path = changes_path(tasks_path)
+    with locked(path):
+        try:
+            lines = path.read_text(encoding='utf-8').splitlines()
+        except FileNotFoundError:
+            lines = []
+    records = []
+    for line in lines:
+        try:
+            rec = json.loads(line)
+            records.append((int(rec['v']), rec.get('ids')))
+        except Exception:
+            continue
+    if not records:
+        return 0, (set() if version == 0 else None)
+    latest = records[-1][0]
+    # 日志被重建（版本回退）或旧记录已被裁掉：无法判断增量
+    if latest < version or records[0][0] > version + 1:
+        return latest, None
+    changed: Set[str] = set()
+    for v, ids in records:
+        if v <= version:
+            continue
+        if ids is None:
+            return latest, None
+        changed.update(ids)
+    return latest, changed
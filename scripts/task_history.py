@@ -0,0 +1,258 @@
+"""
+任务冷热分离 — 把 progress_log / flow_log 的旧条目迁出到按任务的追加式历史文件。
+
+开启方式: EDICT_TASK_HISTORY_SPLIT=1（写入方生效；读取方始终兼容两种布局）
+
+热记录（tasks_source.json / SQLite 行）只保留每个历史字段最近的若干条，
+更早的条目追加到 data/task_history/<task_id>.jsonl：
+    {"f": "progress_log", "e": {...原条目...}}
+
+热记录中的 _history 字段记录冷文件的代数、有效长度与各字段迁出条数:
+    "_history": {"bytes": 12345, "counts": {"progress_log": 40, "flow_log": 3}, "gen": 1}
+
+完整历史 = 冷文件前 bytes 字节中的条目 + 热记录中的尾部条目。
+迁出在任务写锁内进行；写入前先把冷文件截断到 bytes，
+因此热记录写入失败时残留的半截追加会在下次迁出时被覆盖，不会重复。
+
+HISTORY_LIMIT 限制各字段的总条数（progress_log 与 kanban_update.MAX_PROGRESS_LOG 一致）：
+冷文件中超出上限的条目累积到一定量（COMPACT_SLACK）时压缩——只保留上限内的条目，
+写入下一代文件 <task_id>~<gen>.jsonl（旧代文件保持不变，热记录写回失败时仍以旧代为准），
+再下一次压缩时删除更早的一代。读取方始终只返回上限内的最新条目；
+指定 limit 时从冷文件末尾向前按块读取，不解析整份文件。
+"""
+import json
+import os
+import pathlib
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# 热记录中每个历史字段保留的尾部条数
+HOT_TAIL = {
+    'progress_log': int(os.environ.get('EDICT_HOT_PROGRESS_TAIL', '10')),
+    'flow_log': int(os.environ.get('EDICT_HOT_FLOW_TAIL', '30')),
+}
+
+# 各历史字段的总条数上限（冷 + 热）；None 表示不限（flow_log 原本就不截断）
+HISTORY_LIMIT = {
+    'progress_log': 100,
+    'flow_log': None,
+}
+# 冷文件中超出上限的条目达到（上限 × COMPACT_SLACK）时才压缩，避免每次迁出都重写文件
+COMPACT_SLACK = 0.5
+READ_BLOCK_SIZE = 64 * 1024
+
+_UNSAFE_RE = re.compile(r'[^A-Za-z0-9_.\-]')
+
+
+def split_enabled() -> bool:
+    return os.environ.get('EDICT_TASK_HISTORY_SPLIT', '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def history_dir(tasks_path: pathlib.Path) -> pathlib.Path:
+    return pathlib.Path(tasks_path).parent / 'task_history'
+
+
+def history_file(hdir: pathlib.Path, task_id: str, gen: int = 0) -> pathlib.Path:
+    name = _UNSAFE_RE.sub("_", str(task_id))
+    return hdir / (f'{name}~{gen}.jsonl' if gen else f'{name}.jsonl')
+
+
+def _cold_cap(field: str) -> Optional[int]:
+    limit = HISTORY_LIMIT.get(field)
+    return None if limit is None else max(0, limit - HOT_TAIL[field])
+
+
+def _effective_limit(field: str, limit: Optional[int]) -> Optional[int]:
+    cap = HISTORY_LIMIT.get(field)
+    if cap is None:
+        return limit
+    return cap if limit is None else min(limit, cap)
+
+
+def _encode(records) -> bytes:
+    lines = [json.dumps({'f': f, 'e': e}, ensure_ascii=False, separators=(',', ':')) for f, e in records]
+    return ('\n'.join(lines) + '\n').encode('utf-8') if lines else b''
+
+
+def _needs_compaction(counts: Dict[str, int]) -> bool:
+    for field in HOT_TAIL:
+        cap = _cold_cap(field)
+        if cap is not None and int(counts.get(field) or 0) > cap + max(1, int(cap * COMPACT_SLACK)):
+            return True
+    return False
+
+
+def _compact(task: Dict[str, Any], hdir: pathlib.Path, new_records) -> None:
+    """旧冷条目 + 新迁出条目按上限裁剪后写入下一代冷文件。"""
+    task_id = task['id']
+    meta = task.get('_history') if isinstance(task.get('_history'), dict) else {}
+    gen = int(meta.get('gen') or 0)
+    records = [(rec.get('f'), rec.get('e')) for rec in _read_cold(task, hdir)] + new_records
+    keep = {f: _cold_cap(f) for f in HOT_TAIL}
+    kept = []
+    for field, entry in reversed(records):
+        cap = keep.get(field)
+        if cap is not None:
+            if cap <= 0:
+                continue
+            keep[field] = cap - 1
+        kept.append((field, entry))
+    kept.reverse()
+    counts: Dict[str, int] = {}
+    for field, _ in kept:
+        counts[field] = counts.get(field, 0) + 1
+    payload = _encode(kept)
+    path = history_file(hdir, task_id, gen + 1)
+    with open(path, 'wb') as f:
+        f.write(payload)
+    if gen >= 1:
+        # 当前代 gen 已随热记录提交，更早的一代不再被任何热记录引用
+        try:
+            os.unlink(history_file(hdir, task_id, gen - 1))
+        except OSError:
+            pass
+    task['_history'] = {'bytes': len(payload), 'counts': counts, 'gen': gen + 1}
+
+
+def spill(task: Dict[str, Any], hdir: pathlib.Path) -> bool:
+    """把超出 HOT_TAIL 的旧条目迁出到冷文件；返回是否发生迁出。调用方需持有任务写锁。"""
+    task_id = task.get('id')
+    if not task_id:
+        return False
+    meta = task.get('_history') if isinstance(task.get('_history'), dict) else {}
+    counts = dict(meta.get('counts') or {})
+    records = []
+    for field, keep in HOT_TAIL.items():
+        entries = task.get(field)
+        if not isinstance(entries, list) or len(entries) <= keep:
+            continue
+        cut = len(entries) - keep
+        records.extend((field, entry) for entry in entries[:cut])
+        task[field] = entries[cut:]
+        counts[field] = int(counts.get(field) or 0) + cut
+    if not records:
+        return False
+
+    hdir.mkdir(parents=True, exist_ok=True)
+    if _needs_compaction(counts):
+        _compact(task, hdir, records)
+        return True
+    payload = _encode(records)
+    gen = int(meta.get('gen') or 0)
+    offset = int(meta.get('bytes') or 0)
+    fd = os.open(str(history_file(hdir, task_id, gen)), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        os.ftruncate(fd, offset)
+        os.lseek(fd, offset, os.SEEK_SET)
+        os.write(fd, payload)
+    finally:
+        os.close(fd)
+    task['_history'] = {'bytes': offset + len(payload), 'counts': counts}
+    if gen:
+        task['_history']['gen'] = gen
+    return True
+
+
+def spill_all(tasks: Iterable[Dict[str, Any]], hdir: pathlib.Path) -> int:
+    n = 0
+    for task in tasks:
+        if isinstance(task, dict) and spill(task, hdir):
+            n += 1
+    return n
+
+
+def has_cold(task: Dict[str, Any], field: Optional[str] = None) -> bool:
+    meta = task.get('_history')
+    if not isinstance(meta, dict):
+        return False
+    counts = meta.get('counts') or {}
+    return bool(counts.get(field)) if field else any(counts.values())
+
+
+def _cold_path(task: Dict[str, Any], hdir: pathlib.Path):
+    meta = task.get('_history') or {}
+    return history_file(hdir, task.get('id', ''), int(meta.get('gen') or 0)), int(meta.get('bytes') or 0)
+
+
+def _parse(line: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        rec = json.loads(line)
+    except Exception:
+        return None
+    return rec if isinstance(rec, dict) else None
+
+
+def _read_cold(task: Dict[str, Any], hdir: pathlib.Path) -> List[Dict[str, Any]]:
+    path, size = _cold_path(task, hdir)
+    if size <= 0:
+        return []
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read(size)
+    except OSError:
+        return []
+    return [rec for rec in map(_parse, raw.splitlines()) if rec is not None]
+
+
+def _iter_cold_reverse(task: Dict[str, Any], hdir: pathlib.Path) -> Iterator[Dict[str, Any]]:
+    """从冷文件有效长度处向前按块读取，由新到旧产出记录。"""
+    path, size = _cold_path(task, hdir)
+    if size <= 0:
+        return
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return
+    with f:
+        pos, rest = size, b''
+        while pos > 0:
+            step = min(READ_BLOCK_SIZE, pos)
+            pos -= step
+            f.seek(pos)
+            lines = (f.read(step) + rest).split(b'\n')
+            rest = lines[0]              # 可能是被块边界截断的行，留到下一块拼接
+            for line in reversed(lines[1:]):
+                rec = _parse(line) if line else None
+                if rec is not None:
+                    yield rec
+        rec = _parse(rest) if rest else None
+        if rec is not None:
+            yield rec
+
+
+def load_history(task: Dict[str, Any], field: str, hdir: pathlib.Path,
+                 limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """返回某个历史字段的条目（冷 + 热，不超过 HISTORY_LIMIT）；limit 只保留最后 limit 条。"""
+    hot = list(task.get(field) or [])
+    limit = _effective_limit(field, limit)
+    if has_cold(task, field) and (limit is None or len(hot) < limit):
+        if limit is None:
+            cold = [rec.get('e') for rec in _read_cold(task, hdir) if rec.get('f') == field]
+        else:
+            need, cold = limit - len(hot), []
+            for rec in _iter_cold_reverse(task, hdir):
+                if rec.get('f') == field:
+                    cold.append(rec.get('e'))
+                    if len(cold) >= need:
+                        break
+            cold.reverse()
+        hot = cold + hot
+    if limit is not None and len(hot) > limit:
+        hot = hot[-limit:]
+    return hot
+
+
+def hydrate(task: Dict[str, Any], hdir: pathlib.Path) -> Dict[str, Any]:
+    """返回补全冷历史后的任务副本（浅拷贝，不修改原任务）。"""
+    if not has_cold(task):
+        return task
+    full = dict(task)
+    cold = _read_cold(task, hdir)
+    for field in HOT_TAIL:
+        entries = [rec.get('e') for rec in cold if rec.get('f') == field]
+        if entries:
+            entries += list(task.get(field) or [])
+            limit = HISTORY_LIMIT.get(field)
+            full[field] = entries[-limit:] if limit is not None else entries
+    full.pop('_history', None)
+    return full
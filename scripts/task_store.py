@@ -0,0 +1,486 @@
+"""
+任务存储 — 看板任务的统一读写入口（JSON 文件 / SQLite 两种后端）。
+
+后端由环境变量 EDICT_TASK_BACKEND 选择:
+    json（默认）  data/tasks_source.json，整文件 flock（TaskStore）
+    sqlite        data/tasks_source.db，WAL 模式 + 行级更新（SqliteTaskStore）
+                  首次打开时自动导入同目录下的 tasks_source.json；
+                  路径可用 EDICT_TASK_DB 覆盖。
+
+两种后端接口一致:
+    store = open_task_store(DATA / 'tasks_source.json')
+    store.load()                     # 可自由修改的新副本
+    store.save(tasks)                # 整体写回
+    store.update(modifier, scope)    # 原子 读→改→写；scope 为涉及的任务 id（可选提示）
+    store.update_task(id, updater)   # 单任务原子更新
+    store.get(id) / store.tasks()    # 只读快照（带缓存）
+
+EDICT_TASK_HISTORY_SPLIT=1 时，两种后端在写入前都会把旧的 progress_log /
+flow_log 条目迁出到 data/task_history/（见 task_history.py）。
+每次写入提交后都会在 tasks_source.changes 记录涉及的任务 id（见 task_changes.py），
+scope / update_task 的 id 即变更集，未给出时记为全量变化。
+
+── JSON 后端 ──
+进程内缓存已解析的 tasks_source.json，避免每次读取都全量解析。
+
+缓存以文件签名 (inode, mtime_ns, size) 校验，签名在共享锁内获取，
+与 file_lock 的写入方（tempfile + os.replace）保持一致：
+只要签名未变，缓存即与磁盘内容一致；否则重新解析一次。
+journaled 模式下签名同时覆盖快照与 <path>.wal。
+
+用法:
+    store = TaskStore(path)
+    task = store.get('JJC-001')      # O(1) 按 id 查找
+    tasks = store.tasks()            # 共享快照列表
+    atomic_json_update(path, modifier, default=[], on_commit=store.committer(['JJC-001']))
+
+注意：tasks() / get() 返回的是共享快照，调用方只读，不得原地修改；
+需要修改时请走 atomic_json_update（或 server.modify_task）。
+"""
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import task_changes
+import task_history
+from file_lock import (
+    atomic_json_read, atomic_json_update,
+    journal_path, locked, read_json_locked,
+)
+
+Signature = Optional[Tuple[int, int, int]]
+
+
+def file_signature(path: pathlib.Path) -> Signature:
+    """返回 (inode, mtime_ns, size)；文件不存在时返回 None。"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class _WriteHooksMixin:
+    """写入钩子（两种后端共用）：写入前冷热分离，提交后记录变更集。"""
+
+    path: pathlib.Path
+
+    @property
+    def history_dir(self) -> pathlib.Path:
+        return task_history.history_dir(self.path)
+
+    def wrap_modifier(self, modifier: Callable[[list], list]) -> Callable[[list], list]:
+        """未开启冷热分离时原样返回 modifier。"""
+        if not task_history.split_enabled():
+            return modifier
+
+        def _spilling(tasks):
+            result = modifier(tasks)
+            if result is None:
+                result = tasks
+            task_history.spill_all(result, self.history_dir)
+            return result
+        return _spilling
+
+    def wrap_updater(self, updater: Callable[[dict], None]) -> Callable[[dict], None]:
+        if not task_history.split_enabled():
+            return updater
+
+        def _spilling(task):
+            updater(task)
+            task_history.spill(task, self.history_dir)
+        return _spilling
+
+    def record_change(self, ids: Optional[Iterable[str]]) -> None:
+        """提交后调用：ids=None 表示整体写入。"""
+        try:
+            task_changes.record(self.path, ids)
+        except OSError:
+            pass
+
+
+class TaskStore(_WriteHooksMixin):
+    """tasks_source.json 的进程内缓存 + id 索引（线程安全）。"""
+
+    backend = 'json'
+
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+        self._mu = threading.Lock()
+        self._sig: Any = None
+        self._loaded = False
+        self._tasks: List[Dict[str, Any]] = []
+        self._index: Dict[str, Dict[str, Any]] = {}
+        self.version = 0
+        self.hits = 0
+        self.reloads = 0
+
+    def _install(self, tasks: Any, sig: Any) -> None:
+        if not isinstance(tasks, list):
+            tasks = []
+        self._tasks = tasks
+        self._index = {
+            str(t.get('id')): t for t in tasks
+            if isinstance(t, dict) and t.get('id')
+        }
+        self._sig = sig
+        self._loaded = True
+        self.version += 1
+
+    def _signature(self):
+        return (file_signature(self.path), file_signature(journal_path(self.path)))
+
+    def _validate(self) -> None:
+        """在共享锁内比对签名，必要时重新解析。"""
+        with locked(self.path):
+            sig = self._signature()
+            with self._mu:
+                if self._loaded and sig == self._sig:
+                    self.hits += 1
+                    return
+            data = read_json_locked(self.path, [])
+            with self._mu:
+                self._install(data, sig)
+                self.reloads += 1
+
+    def tasks(self) -> List[Dict[str, Any]]:
+        """返回当前任务列表（共享快照，只读）。"""
+        self._validate()
+        with self._mu:
+            return self._tasks
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """按 id 返回任务（共享快照，只读）；不存在返回 None。"""
+        self._validate()
+        with self._mu:
+            return self._index.get(str(task_id))
+
+    def commit(self, tasks: Any) -> None:
+        """写入方回调：在排他锁内记录刚写入的数据，省去下一次重新解析。
+
+        作为 atomic_json_update 的 on_commit 使用，此时文件锁仍被持有，
+        取到的签名一定对应本次写入。
+        """
+        sig = self._signature()
+        with self._mu:
+            self._install(tasks, sig)
+
+    def committer(self, scope: Optional[Iterable[str]] = None) -> Callable[[Any], None]:
+        """atomic_json_update 的 on_commit：写入缓存并记录变更集（仍在文件锁内）。"""
+        def _on_commit(tasks):
+            self.commit(tasks)
+            # scope 在提交时才求值：modifier 可以边修改边往 scope 里登记 id
+            self.record_change(list(scope) if scope is not None else None)
+        return _on_commit
+
+    def invalidate(self) -> None:
+        """丢弃缓存（绕过 commit 的写入方使用），下次读取时重新解析。"""
+        with self._mu:
+            self._loaded = False
+            self._sig = None
+
+    def load(self) -> List[Dict[str, Any]]:
+        return atomic_json_read(self.path, [])
+
+    def save(self, tasks: List[Dict[str, Any]]) -> None:
+        """整体写回：冷热分离与写入在同一次排他锁内完成。"""
+        atomic_json_update(self.path, self.wrap_modifier(lambda _old: tasks), default=[],
+                           on_commit=self.committer(None))
+
+    def update(self, modifier: Callable[[list], list], scope: Optional[Iterable[str]] = None) -> list:
+        """整文件持锁 读→改→写；scope 仅用于记录变更集。"""
+        return atomic_json_update(self.path, self.wrap_modifier(modifier), default=[],
+                                  on_commit=self.committer(scope))
+
+    def update_task(self, task_id: str, updater: Callable[[dict], None]) -> bool:
+        found = [False]
+
+        def _modifier(tasks):
+            task = next((t for t in tasks if t.get('id') == task_id), None)
+            if task is not None:
+                updater(task)
+                found[0] = True
+            return tasks
+
+        self.update(_modifier, scope=[task_id])
+        return found[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._mu:
+            return {
+                'backend': self.backend,
+                'path': str(self.path),
+                'tasks': len(self._tasks),
+                'version': self.version,
+                'hits': self.hits,
+                'reloads': self.reloads,
+            }
+
+
+# ── SQLite 后端 ──────────────────────────────────────────────────
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id          TEXT PRIMARY KEY,
+    ord         INTEGER NOT NULL,
+    state       TEXT NOT NULL DEFAULT '',
+    org         TEXT NOT NULL DEFAULT '',
+    updated_at  TEXT NOT NULL DEFAULT '',
+    archived    INTEGER NOT NULL DEFAULT 0,
+    data        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_ord ON tasks(ord);
+CREATE INDEX IF NOT EXISTS idx_tasks_state ON tasks(state);
+CREATE INDEX IF NOT EXISTS idx_tasks_org ON tasks(org);
+CREATE INDEX IF NOT EXISTS idx_tasks_updated_at ON tasks(updated_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _encode(task: dict) -> str:
+    return json.dumps(task, ensure_ascii=False, separators=(',', ':'))
+
+
+def _row(task: dict, ord_: int) -> tuple:
+    return (
+        str(task.get('id')), ord_,
+        str(task.get('state') or ''), str(task.get('org') or ''),
+        str(task.get('updatedAt') or ''), 1 if task.get('archived') else 0,
+        _encode(task),
+    )
+
+
+class SqliteTaskStore(_WriteHooksMixin):
+    """SQLite（WAL 模式）任务存储：单任务写入只重写一行，读写互不阻塞。
+
+    列表顺序由 ord 列表示（ORDER BY ord DESC），新任务插到最前只需取 max(ord)+1。
+    每行 data 列保存完整任务 JSON，state/org/updated_at/archived 为冗余索引列。
+    """
+
+    backend = 'sqlite'
+
+    def __init__(self, path: pathlib.Path, db_path: Optional[pathlib.Path] = None):
+        self.path = pathlib.Path(path)
+        self.db_path = pathlib.Path(db_path) if db_path else self.path.with_suffix('.db')
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._mu = threading.RLock()
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30,
+                                     isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+        self._cache_key: Any = None
+        self._tasks: List[Dict[str, Any]] = []
+        self._writes = 0
+        self._changed: Any = ()       # 当前事务的变更集，() 表示无变化
+        self.version = 0
+        self.hits = 0
+        self.reloads = 0
+        self._import_json()
+
+    # ── 事务 ──
+
+    def _begin(self) -> None:
+        self._conn.execute('BEGIN IMMEDIATE')
+
+    def _end(self, ok: bool) -> None:
+        self._conn.execute('COMMIT' if ok else 'ROLLBACK')
+        changed, self._changed = self._changed, ()
+        if ok:
+            self._writes += 1
+            if changed != ():
+                self.record_change(changed)
+
+    def _import_json(self) -> None:
+        """首次打开：把同目录 tasks_source.json 导入空库（只做一次）。"""
+        with self._mu:
+            self._begin()
+            ok = False
+            try:
+                done = self._conn.execute("SELECT 1 FROM meta WHERE key='imported'").fetchone()
+                empty = self._conn.execute('SELECT 1 FROM tasks LIMIT 1').fetchone() is None
+                if not done and empty and self.path.exists():
+                    tasks = atomic_json_read(self.path, [])
+                    if isinstance(tasks, list):
+                        self._replace_all([t for t in tasks if isinstance(t, dict) and t.get('id')])
+                        self._changed = None
+                self._conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES('imported', '1')")
+                ok = True
+            finally:
+                self._end(ok)
+
+    def _replace_all(self, tasks: List[dict]) -> None:
+        n = len(tasks)
+        self._conn.execute('DELETE FROM tasks')
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO tasks(id, ord, state, org, updated_at, archived, data) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [_row(t, n - 1 - i) for i, t in enumerate(tasks)],
+        )
+
+    def _select(self, where: str = '', args: tuple = ()) -> List[Tuple[str, int, str]]:
+        return self._conn.execute(
+            f'SELECT id, ord, data FROM tasks {where} ORDER BY ord DESC', args
+        ).fetchall()
+
+    # ── 读取 ──
+
+    def load(self) -> List[Dict[str, Any]]:
+        with self._mu:
+            return [json.loads(d) for _, _, d in self._select()]
+
+    def tasks(self) -> List[Dict[str, Any]]:
+        """只读快照；其他连接提交后（PRAGMA data_version 变化）重新加载。"""
+        with self._mu:
+            key = (self._conn.execute('PRAGMA data_version').fetchone()[0], self._writes)
+            if key == self._cache_key:
+                self.hits += 1
+                return self._tasks
+            self._tasks = self.load()
+            self._cache_key = key
+            self.version += 1
+            self.reloads += 1
+            return self._tasks
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """主键查询，O(log n)，不走整表缓存。"""
+        with self._mu:
+            row = self._conn.execute('SELECT data FROM tasks WHERE id=?', (str(task_id),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # ── 写入 ──
+
+    def save(self, tasks: List[Dict[str, Any]]) -> None:
+        with self._mu:
+            self._begin()
+            ok = False
+            try:
+                if task_history.split_enabled():
+                    task_history.spill_all(tasks, self.history_dir)
+                self._replace_all([t for t in tasks if isinstance(t, dict) and t.get('id')])
+                self._changed = None
+                ok = True
+            finally:
+                self._end(ok)
+
+    def update_task(self, task_id: str, updater: Callable[[dict], None]) -> bool:
+        """行级 读→改→写：只读取并重写这一行。"""
+        with self._mu:
+            self._begin()
+            ok = False
+            try:
+                row = self._conn.execute('SELECT ord, data FROM tasks WHERE id=?', (str(task_id),)).fetchone()
+                if row is None:
+                    ok = True
+                    return False
+                task = json.loads(row[1])
+                self.wrap_updater(updater)(task)
+                self._conn.execute(
+                    'UPDATE tasks SET state=?, org=?, updated_at=?, archived=?, data=? WHERE id=?',
+                    _row(task, row[0])[2:] + (str(task_id),),
+                )
+                self._changed = [str(task_id)]
+                ok = True
+                return True
+            finally:
+                self._end(ok)
+
+    def update(self, modifier: Callable[[list], list], scope: Optional[Iterable[str]] = None) -> list:
+        """与 JSON 后端语义一致的 读→改→写。
+
+        scope 给出时只把这些 id 对应的行交给 modifier（其余行不读不写），
+        适用于 kanban_update 这类「按 id 找任务再修改」的 modifier；
+        scope 内新增的任务若排在已有任务之前则插到最前，否则追加到末尾。
+        """
+        with self._mu:
+            self._begin()
+            ok = False
+            try:
+                if scope is None:
+                    rows = self._select()
+                else:
+                    ids = [str(i) for i in scope]
+                    marks = ','.join('?' * len(ids)) or "''"
+                    rows = self._select(f'WHERE id IN ({marks})', tuple(ids))
+                before = {tid: (ord_, data) for tid, ord_, data in rows}
+                tasks = [json.loads(d) for _, _, d in rows]
+                result = self.wrap_modifier(modifier)(tasks)
+                if result is None:
+                    result = tasks
+                self._apply_result(before, [tid for tid, _, _ in rows], result, full=scope is None)
+                self._changed = ids if scope is not None else None
+                ok = True
+                return result
+            finally:
+                self._end(ok)
+
+    def _apply_result(self, before: dict, old_order: List[str], result: list, full: bool) -> None:
+        result = [t for t in result if isinstance(t, dict) and t.get('id')]
+        new_ids = [str(t['id']) for t in result]
+        new_set = set(new_ids)
+        removed = [tid for tid in old_order if tid not in new_set]
+        if removed:
+            self._conn.executemany('DELETE FROM tasks WHERE id=?', [(tid,) for tid in removed])
+
+        kept = [tid for tid in new_ids if tid in before]
+        if full and kept != [tid for tid in old_order if tid in new_set]:
+            # 整表重排：按新顺序重新编号
+            self._replace_all(result)
+            return
+
+        hi = self._conn.execute('SELECT COALESCE(MAX(ord), -1) FROM tasks').fetchone()[0]
+        lo = self._conn.execute('SELECT COALESCE(MIN(ord), 0) FROM tasks').fetchone()[0]
+        first_kept = new_ids.index(kept[0]) if kept else len(new_ids)
+        head = [t for i, t in enumerate(result) if i < first_kept and str(t['id']) not in before]
+        rows = []
+        for i, t in enumerate(head):
+            rows.append(_row(t, hi + len(head) - i))
+        tail = [t for i, t in enumerate(result) if i >= first_kept and str(t['id']) not in before]
+        for i, t in enumerate(tail):
+            rows.append(_row(t, lo - 1 - i))
+        for t in result:
+            tid = str(t['id'])
+            if tid in before:
+                ord_, old_data = before[tid]
+                row = _row(t, ord_)
+                if row[6] != old_data:
+                    rows.append(row)
+        if rows:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO tasks(id, ord, state, org, updated_at, archived, data) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', rows,
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._mu:
+            count = self._conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
+            return {
+                'backend': self.backend,
+                'path': str(self.db_path),
+                'tasks': count,
+                'version': self.version,
+                'hits': self.hits,
+                'reloads': self.reloads,
+            }
+
+    def close(self) -> None:
+        with self._mu:
+            self._conn.close()
+
+
+def task_backend() -> str:
+    return (os.environ.get('EDICT_TASK_BACKEND') or 'json').strip().lower()
+
+
+def open_task_store(path: pathlib.Path):
+    """按 EDICT_TASK_BACKEND 打开 path（tasks_source.json）对应的任务存储。"""
+    if task_backend() == 'sqlite':
+        db = os.environ.get('EDICT_TASK_DB')
+        return SqliteTaskStore(path, pathlib.Path(db) if db else None)
+    return TaskStore(path)
@@ -0,0 +1,37 @@
+"""pytest 公共夹具：测试期间把脚本与看板的数据目录重定向到 tmp_path。
+
+kanban_update / server 在导入时就确定了仓库内 data/ 下的路径（任务源、审计日志、
+刷新信号），刷新还会起子进程改写 data/live_status.json；这里逐个替换为临时目录，
+跑测试不再改动工作区。需要特定数据的测试照常在此基础上自行 monkeypatch。
+"""
+import pathlib
+import sys
+
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'dashboard'))
+sys.path.insert(0, str(ROOT / 'scripts'))
+
+
+@pytest.fixture(autouse=True)
+def _isolated_data_dir(monkeypatch, tmp_path_factory):
+    import kanban_update as kb
+    import server as srv
+    from audit_log import AuditLog
+
+    data_dir = tmp_path_factory.mktemp('data')
+    tasks_file = data_dir / 'tasks_source.json'
+    tasks_file.write_text('[]', encoding='utf-8')
+
+    monkeypatch.setattr(kb, 'TASKS_FILE', tasks_file)
+    monkeypatch.setattr(kb, 'AUDIT_DIR', data_dir / 'audit_log')
+    monkeypatch.setattr(kb, 'AUDIT_FILE', data_dir / 'audit_log.json')
+    monkeypatch.setattr(kb, '_AUDIT', AuditLog(data_dir / 'audit_log', legacy_file=data_dir / 'audit_log.json'))
+    monkeypatch.setattr(kb, '_REFRESH_SIGNAL_FILE', data_dir / '.refresh_pending')
+    monkeypatch.setattr(kb, '_trigger_refresh', lambda: None)
+
+    monkeypatch.setattr(srv, 'DATA', data_dir)
+    monkeypatch.setattr(srv, '_ACTIVE_TASK_DATA_DIR', data_dir)
+    monkeypatch.setattr(srv, '_trigger_refresh', lambda: srv.EVENT_HUB.wake())
+    return data_dir
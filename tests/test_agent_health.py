@@ -0,0 +1,78 @@
+"""tests for dashboard/agent_health.py and the cached /api/agents-status."""
+import json
+import pathlib
+import subprocess
+import sys
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'dashboard'))
+sys.path.insert(0, str(ROOT / 'scripts'))
+
+from agent_health import HealthSampler, ProcessTable, cached_json
+
+
+def test_process_table_matches_like_pgrep():
+    table = ProcessTable(['/usr/bin/node openclaw-gateway --port 18789',
+                          'openclaw agent --agent gongbu -m hi'])
+    assert table.matches('openclaw-gateway')
+    assert table.matches('openclaw.*--agent.*gongbu')
+    assert not table.matches('openclaw.*--agent.*hubu')
+
+
+def test_process_table_scan_sees_running_process():
+    marker = 'edict-health-marker-7f3a'
+    proc = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(10)', marker])
+    try:
+        time.sleep(0.1)
+        assert ProcessTable.scan().matches(marker)
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def test_cached_json_reparses_only_on_change(tmp_path):
+    p = tmp_path / 'sessions.json'
+    p.write_text('{"a": {"updatedAt": 1}}')
+    first = cached_json(p)
+    assert cached_json(p) is first
+    p.write_text('{"a": {"updatedAt": 1}, "b": {"updatedAt": 2}}')
+    assert len(cached_json(p)) == 2
+    p.unlink()
+    assert cached_json(p) is None
+
+
+def test_sampler_serves_snapshot_without_resampling():
+    calls = []
+    sampler = HealthSampler(lambda: calls.append(1) or {'ok': True}, interval=60)
+    try:
+        first = sampler.snapshot()
+        second = sampler.snapshot()
+        assert len(calls) == 1
+        assert first['ok'] and second['ageSec'] >= 0 and 'sampledAt' in second
+    finally:
+        sampler.stop()
+
+
+def test_agents_status_served_from_sampler(monkeypatch, tmp_path):
+    import server as srv
+
+    (tmp_path / 'workspace-gongbu').mkdir()
+    sessions = tmp_path / 'agents' / 'gongbu' / 'sessions'
+    sessions.mkdir(parents=True)
+    now_ms = int(time.time() * 1000)
+    (sessions / 'sessions.json').write_text(json.dumps({'s1': {'updatedAt': now_ms}, 's2': {'updatedAt': 1}}))
+    monkeypatch.setattr(srv, 'OCLAW_HOME', tmp_path)
+    monkeypatch.setattr(srv, '_check_gateway_probe', lambda: True)
+    sampler = HealthSampler(srv._sample_agents_status, interval=60)
+    monkeypatch.setattr(srv, 'AGENT_HEALTH', sampler)
+    try:
+        status = srv.get_agents_status()
+        gongbu = next(a for a in status['agents'] if a['id'] == 'gongbu')
+        assert status['gateway']['alive'] and status['gateway']['probe']
+        assert gongbu['status'] == 'running' and gongbu['sessions'] == 2
+        assert next(a for a in status['agents'] if a['id'] == 'hubu')['status'] == 'unconfigured'
+        assert srv.get_agents_status()['sampledAt'] == status['sampledAt']
+        assert srv._check_gateway_alive() is True
+    finally:
+        sampler.stop()
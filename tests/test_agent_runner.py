@@ -0,0 +1,37 @@
+"""tests for the streaming subprocess runner in edict/backend/app/services/agent_runner.py."""
+import asyncio
+import importlib.util
+import pathlib
+import sys
+import time
+
+SERVICES_DIR = pathlib.Path(__file__).resolve().parent.parent / "edict" / "backend" / "app" / "services"
+
+_SPEC = importlib.util.spec_from_file_location("edict_agent_runner", SERVICES_DIR / "agent_runner.py")
+agent_runner = importlib.util.module_from_spec(_SPEC)
+assert _SPEC.loader is not None
+_SPEC.loader.exec_module(agent_runner)
+
+
+def test_lines_are_streamed_and_tails_returned():
+    lines = []
+
+    async def on_line(stream, line):
+        lines.append((stream, line))
+
+    cmd = [sys.executable, "-c", "import sys; print('a'); print('b'); print('oops', file=sys.stderr)"]
+    result = asyncio.run(agent_runner.run_streaming(cmd, timeout=10, on_line=on_line))
+    assert result["returncode"] == 0
+    assert result["stdout"].split() == ["a", "b"]
+    assert ("stderr", "oops") in lines
+    assert [line for stream, line in lines if stream == "stdout"] == ["a", "b"]
+
+
+def test_process_that_closes_its_pipes_is_still_bounded_by_the_timeout():
+    # 关闭 stdout / stderr 后继续运行：读完管道后等待退出也必须受同一超时约束
+    cmd = [sys.executable, "-c", "import os, time; os.close(1); os.close(2); time.sleep(30)"]
+    started = time.monotonic()
+    result = asyncio.run(agent_runner.run_streaming(cmd, timeout=0.5))
+    assert result["returncode"] == -1
+    assert "TIMEOUT" in result["stderr"]
+    assert time.monotonic() - started < agent_runner.KILL_GRACE_SEC
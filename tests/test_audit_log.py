@@ -0,0 +1,75 @@
+"""tests for scripts/audit_log.py — segmented append-only audit log."""
+import json
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'scripts'))
+
+import audit_log
+from audit_log import AuditLog
+
+
+def _entry(i, task, agent='gongbu', action='progress'):
+    return {'ts': f'2026-05-01T00:{i // 60:02d}:{i % 60:02d}Z', 'task': task, 'agent': agent,
+            'action': action, 'from': None, 'to': None, 'reason': f'第{i}条'}
+
+
+def test_rotation_seals_segments_and_query_uses_index(monkeypatch, tmp_path):
+    monkeypatch.setattr(audit_log, 'SEGMENT_BYTES', 600)
+    monkeypatch.setattr(audit_log, 'MARK_EVERY', 2)
+    log = AuditLog(tmp_path / 'audit_log')
+    for i in range(40):
+        log.append(_entry(i, 'JJC-A' if i < 20 else 'JJC-B', action='state' if i % 10 == 0 else 'progress'))
+
+    segs = log.segments()
+    assert len(segs) > 3
+    assert all(audit_log._idx_path(s).exists() for s in segs[:-1])
+    assert not audit_log._idx_path(segs[-1]).exists()
+
+    scanned = []
+    real_iter = audit_log._iter_lines
+    monkeypatch.setattr(audit_log, '_iter_lines', lambda seg, start=0: scanned.append((seg, start)) or real_iter(seg, start))
+    a = log.query(task='JJC-A')
+    assert [e['reason'] for e in a] == [f'第{i}条' for i in range(20)]
+    assert [e['reason'] for e in log.query(action='state')] == ['第0条', '第10条', '第20条', '第30条']
+    assert [e['reason'] for e in log.query(task='JJC-B', limit=3)] == ['第37条', '第38条', '第39条']
+    # 封存段按索引跳过：只查 JJC-B 时不读只含 JJC-A 的段
+    scanned.clear()
+    log.query(task='JJC-B', limit=1000)
+    idx_a = [s for s in segs[:-1] if set(json.loads(audit_log._idx_path(s).read_text())['tasks']) == {'JJC-A'}]
+    assert idx_a and not any(seg in idx_a for seg, _ in scanned)
+    since = _entry(25, '')['ts']
+    assert [e['reason'] for e in log.query(since=since, until=_entry(27, '')['ts'])] == ['第25条', '第26条', '第27条']
+
+
+def test_retention_drops_oldest_segments(monkeypatch, tmp_path):
+    monkeypatch.setattr(audit_log, 'SEGMENT_BYTES', 300)
+    monkeypatch.setattr(audit_log, 'MAX_SEGMENTS', 3)
+    log = AuditLog(tmp_path / 'audit_log')
+    for i in range(60):
+        log.append(_entry(i, 'JJC-A'))
+    assert len(log.segments()) == 3
+    assert log.query(limit=1000)[-1]['reason'] == '第59条'
+    assert len(list((tmp_path / 'audit_log').glob('*.idx.json'))) == 2
+
+
+def test_legacy_file_is_imported_on_first_append(tmp_path):
+    legacy = tmp_path / 'audit_log.json'
+    legacy.write_text(json.dumps([_entry(i, 'JJC-OLD') for i in range(3)], ensure_ascii=False))
+    log = AuditLog(tmp_path / 'audit_log', legacy_file=legacy)
+    assert len(log.query(task='JJC-OLD')) == 3          # 导入前直接读旧文件
+
+    log.append(_entry(3, 'JJC-NEW'))
+    assert not legacy.exists() and (tmp_path / 'audit_log.json.migrated').exists()
+    assert [e['task'] for e in log.query()] == ['JJC-OLD'] * 3 + ['JJC-NEW']
+
+
+def test_kanban_update_appends_one_line(monkeypatch, tmp_path):
+    import kanban_update as kb
+
+    monkeypatch.setattr(kb, '_AUDIT', AuditLog(tmp_path / 'audit_log'))
+    kb._append_audit('JJC-1', 'gongbu', 'progress', None, None, '进行中')
+    kb._append_audit('JJC-1', 'gongbu', 'todo', '1', 'completed', '写文档')
+    lines = (tmp_path / 'audit_log' / 'seg-000001.jsonl').read_text(encoding='utf-8').splitlines()
+    assert [json.loads(l)['action'] for l in lines] == ['progress', 'todo']
@@ -0,0 +1,90 @@
+"""tests for the AIMD limits in edict/backend/app/services/concurrency.py."""
+import asyncio
+import importlib.util
+import pathlib
+import time
+
+SERVICES_DIR = pathlib.Path(__file__).resolve().parent.parent / "edict" / "backend" / "app" / "services"
+
+_SPEC = importlib.util.spec_from_file_location("edict_concurrency", SERVICES_DIR / "concurrency.py")
+concurrency = importlib.util.module_from_spec(_SPEC)
+assert _SPEC.loader is not None
+_SPEC.loader.exec_module(concurrency)
+
+
+def test_limit_grows_only_when_saturated():
+    async def main():
+        lim = concurrency.AdaptiveLimit("t", 2, max_limit=8)
+        # 只用了 1 个名额：成功不增长
+        await lim.acquire()
+        lim.release(time.monotonic(), "ok")
+        assert lim.limit == 2
+
+        # 名额用满：每个成功 +1/limit
+        await lim.acquire()
+        await lim.acquire()
+        lim.release(time.monotonic(), "ok")
+        assert lim.limit == 2.5
+        lim.release(time.monotonic(), "ok")
+        assert lim.inflight == 0
+        assert lim.counters["increases"] == 1
+
+    asyncio.run(main())
+
+
+def test_requests_started_before_a_drop_do_not_drop_again():
+    lim = concurrency.AdaptiveLimit("t", 8, backoff=0.5)
+    lim.inflight = 3
+    started = time.monotonic()
+    lim.release(started, "error")
+    assert lim.limit == 4
+    # 同一批（下降前已发出）的失败不再下降
+    lim.release(started, "slow")
+    assert lim.limit == 4
+    # 下降之后才开始的请求会再次下降
+    lim.release(time.monotonic(), "error")
+    assert lim.limit == 2
+    assert lim.counters["drops"] == 2
+
+
+def test_cancelled_waiter_returns_its_slot():
+    async def main():
+        lim = concurrency.AdaptiveLimit("t", 1)
+        await lim.acquire()
+
+        # 排队中被取消：从等待队列移除
+        waiting = asyncio.create_task(lim.acquire())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert lim.snapshot()["waiting"] == 0
+
+        # 已被唤醒（名额已代为分配）但尚未运行就被取消：名额归还
+        woken = asyncio.create_task(lim.acquire())
+        await asyncio.sleep(0)
+        lim.release()
+        assert lim.inflight == 1
+        woken.cancel()
+        await asyncio.gather(woken, return_exceptions=True)
+        assert lim.inflight == 0
+
+        # 名额没有泄漏：之后仍能立即取得
+        await asyncio.wait_for(lim.acquire(), 1)
+        assert lim.inflight == 1
+
+    asyncio.run(main())
+
+
+def test_agent_errors_shrink_the_agent_but_not_its_bucket():
+    async def main():
+        ctl = concurrency.ConcurrencyController(
+            {"slow": {"agents": {"gongbu", "xingbu"}, "limit": 4, "max": 8}}, default_bucket="slow")
+        for _ in range(3):
+            async with ctl.slot("xingbu") as slot:
+                slot.record(1.0, ok=False)
+        snap = ctl.snapshot()
+        assert snap["agents"]["xingbu"]["limit"] == 1
+        assert snap["buckets"]["slow"]["limit"] == 4
+        assert snap["buckets"]["slow"]["inflight"] == 0
+
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+"""tests for dashboard/dispatch_queue.py and the server's dispatch executor wiring."""
+import json
+import pathlib
+import sys
+import threading
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'dashboard'))
+sys.path.insert(0, str(ROOT / 'scripts'))
+
+from dispatch_queue import DispatchExecutor
+
+
+def _wait(cond, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if cond():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _job(task_id, agent, state='Doing'):
+    return {'kind': 'dispatch', 'key': f'{task_id}:{state}', 'taskId': task_id, 'state': state,
+            'agentId': agent, 'trigger': 'test', 'message': 'hi'}
+
+
+def test_limits_bound_concurrency_and_duplicates_coalesce(tmp_path):
+    release = threading.Event()
+    started = []
+    lock = threading.Lock()
+
+    def handler(job):
+        with lock:
+            started.append(job['taskId'])
+        release.wait(5)
+
+    ex = DispatchExecutor(lambda: tmp_path / 'q.json', {'dispatch': handler}, max_workers=3, per_agent=2)
+    try:
+        for i in range(4):
+            assert ex.submit(_job(f'A-{i}', 'gongbu'))
+        assert ex.submit(_job('B-0', 'hubu'))
+        assert ex.submit(_job('B-1', 'hubu'))
+        assert not ex.submit(_job('A-0', 'gongbu'))      # 执行中 → 合并
+        assert not ex.submit(_job('A-3', 'gongbu'))      # 排队中 → 合并
+
+        assert _wait(lambda: len(started) == 3)
+        stats = ex.stats()
+        assert stats['running'] == 3 and stats['queueDepth'] == 3
+        assert stats['runningByAgent'] == {'gongbu': 2, 'hubu': 1}
+        assert stats['coalesced'] == 2
+        assert len(json.loads((tmp_path / 'q.json').read_text())) == 6
+    finally:
+        release.set()
+    assert _wait(lambda: ex.stats()['completed'] == 6)
+    assert ex.stats()['runMs']['count'] == 6
+    assert json.loads((tmp_path / 'q.json').read_text()) == []
+
+
+def test_replay_requeues_jobs_left_on_disk(tmp_path):
+    path = tmp_path / 'q.json'
+    path.write_text(json.dumps([dict(_job('A-1', 'gongbu'), durable=True, enqueuedAt=1, startedAt=2)]))
+    ran = []
+    ex = DispatchExecutor(lambda: path, {'dispatch': ran.append})
+    replayed = ex.replay()
+    assert [j['taskId'] for j in replayed] == ['A-1']
+    assert _wait(lambda: ran) and ran[0]['recovered'] is True
+    assert ex.stats()['replayed'] == 1
+
+
+def test_startup_recovery_replays_queue_and_skips_stale(monkeypatch, tmp_path):
+    import server as srv
+
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    tasks = [
+        {'id': 'JJC-1', 'title': 't1', 'state': 'Zhongshu', 'org': '中书省'},
+        {'id': 'JJC-2', 'title': 't2', 'state': 'Done', 'org': '中书省'},
+        {'id': 'JJC-3', 'title': 't3', 'state': 'Menxia', 'org': '门下省',
+         '_scheduler': {'lastDispatchStatus': 'queued'}},
+    ]
+    (data_dir / 'tasks_source.json').write_text(json.dumps(tasks, ensure_ascii=False))
+    (data_dir / 'dispatch_queue.json').write_text(json.dumps([
+        dict(_job('JJC-1', 'zhongshu', 'Zhongshu'), durable=True, enqueuedAt=1),
+        dict(_job('JJC-2', 'zhongshu', 'Zhongshu'), durable=True, enqueuedAt=1),
+    ]))
+    monkeypatch.setattr(srv, 'DATA', data_dir)
+    monkeypatch.setattr(srv, '_ACTIVE_TASK_DATA_DIR', data_dir)
+
+    monkeypatch.setattr(srv, '_check_gateway_alive', lambda: True)
+    monkeypatch.setattr(srv, '_resolve_openclaw_bin', lambda: None)
+    touched = []
+    monkeypatch.setattr(srv, '_update_task_scheduler', lambda task_id, fn: touched.append(task_id))
+    ex = DispatchExecutor(lambda: data_dir / 'dispatch_queue.json', {'dispatch': srv._run_dispatch_job})
+    monkeypatch.setattr(srv, 'DISPATCHER', ex)
+
+    srv._startup_recover_queued_dispatches()
+    assert _wait(lambda: ex.stats()['completed'] == 3)
+    # JJC-2 已完结：重放时跳过；JJC-3 不在队列中，由兜底扫描重新派发
+    assert 'JJC-2' not in touched
+    assert touched.count('JJC-1') == 1 and touched.count('JJC-3') == 2
+    assert ex.stats()['replayed'] == 2 and ex.stats()['submitted'] == 3
+    assert json.loads((data_dir / 'dispatch_queue.json').read_text()) == []
@@ -10,33 +10,23 @@ _SCRIPTS_DIR = os.path.join(os.path.dirname(__file__), '..', 'scripts')
 os.chdir(_SCRIPTS_DIR)
 sys.path.insert(0, '.')
 
+import kanban_update
 from kanban_update import (
     _sanitize_title, _sanitize_remark, _is_valid_task_title,
-    cmd_create, cmd_flow, cmd_state, cmd_done, load, TASKS_FILE
+    cmd_create, cmd_flow, cmd_state, cmd_done, load,
 )
 
-# ── 确保 data 目录和 tasks_source.json 存在（CI 环境可能没有）
-data_dir = TASKS_FILE.parent
-if data_dir.exists() and not data_dir.is_dir():
-    data_dir.unlink()
-data_dir.mkdir(parents=True, exist_ok=True)
-if not TASKS_FILE.exists():
-    TASKS_FILE.write_text('[]')
-
 
 def _get_task(tid):
     return next((x for x in load() if x['id'] == tid), None)
 
 
 @pytest.fixture(autouse=True)
-def _backup_and_restore():
-    """每个测试前备份数据，测试后恢复并清理测试任务。"""
-    backup = TASKS_FILE.read_text()
-    yield
-    TASKS_FILE.write_text(backup)
-    tasks = json.loads(TASKS_FILE.read_text())
-    tasks = [t for t in tasks if not t.get('id', '').startswith('JJC-TEST-')]
-    TASKS_FILE.write_text(json.dumps(tasks, ensure_ascii=False, indent=2))
+def _tasks_file(tmp_path, monkeypatch):
+    """每个测试使用独立的 tasks_source.json，不读写仓库内的 data/。"""
+    tasks_file = tmp_path / 'tasks_source.json'
+    tasks_file.write_text('[]')
+    monkeypatch.setattr(kanban_update, 'TASKS_FILE', tasks_file)
 
 
 # ── TEST 1: 脏标题(含文件路径+Conversation)应被清洗后创建
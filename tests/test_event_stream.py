@@ -0,0 +1,87 @@
+"""tests for the SSE push channel (dashboard/event_stream.py, GET /api/events)."""
+import json
+import pathlib
+import socket
+import sys
+import threading
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'dashboard'))
+sys.path.insert(0, str(ROOT / 'scripts'))
+
+from event_stream import EventHub, diff_task
+from task_store import TaskStore
+
+
+def test_diff_task_reports_changed_and_removed_fields():
+    assert diff_task({'id': 'T', 'a': 1}, {'id': 'T', 'a': 1}) is None
+    assert diff_task({'id': 'T', 'a': 1, 'b': 2}, {'id': 'T', 'a': 3}) == {
+        'id': 'T', 'set': {'a': 3}, 'unset': ['b']}
+
+
+def test_hub_replays_missed_events_by_last_event_id(tmp_path):
+    store = TaskStore(tmp_path / 'tasks_source.json')
+    store.save([{'id': 'T-1', 'state': 'Doing'}])
+    hub = EventHub(lambda: store)
+    hub.poll_sources()
+
+    store.update_task('T-1', lambda t: t.update({'state': 'Review'}))
+    hub.poll_sources()
+    store.update_task('T-1', lambda t: t.update({'state': 'Done'}))
+    hub.poll_sources()
+    assert hub.stats['events'] == 2
+
+    # 只补发 id > 1 的事件
+    backlog = hub._backlog('1').decode()
+    assert backlog.count('event: task\n') == 1
+    assert '"state":"Done"' in backlog
+    assert 'event: hello' in hub._backlog(None).decode()
+
+
+def _read_events(sock, want, timeout=5.0):
+    sock.settimeout(timeout)
+    buf = b''
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        events = [e for e in buf.decode('utf-8', errors='replace').split('\n\n') if 'event: ' in e]
+        if len(events) >= want:
+            return buf.decode('utf-8', errors='replace'), events
+        buf += sock.recv(65536)
+    raise AssertionError(f'only got {buf!r}')
+
+
+def test_sse_endpoint_pushes_task_diffs(monkeypatch, tmp_path):
+    import server as srv
+
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    (data_dir / 'tasks_source.json').write_text(json.dumps([{'id': 'T-1', 'state': 'Doing'}]))
+    monkeypatch.setattr(srv, 'DATA', data_dir)
+    monkeypatch.setattr(srv, '_ACTIVE_TASK_DATA_DIR', data_dir)
+    monkeypatch.setattr(srv, '_trigger_refresh', lambda: srv.EVENT_HUB.wake())
+    # 独立的 hub：测试结束即关闭，后台线程不会在 monkeypatch 还原后去读仓库内的 data/
+    hub = EventHub(srv.get_task_store)
+    monkeypatch.setattr(srv, 'EVENT_HUB', hub)
+
+    httpd = srv.PooledHTTPServer(('127.0.0.1', 0), srv.Handler, workers=1, max_queue=0, request_timeout=5)
+    port = httpd.server_address[1]
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    sock = socket.create_connection(('127.0.0.1', port))
+    try:
+        sock.sendall(b'GET /api/events HTTP/1.1\r\nHost: x\r\n\r\n')
+        raw, events = _read_events(sock, 1)
+        assert 'text/event-stream' in raw and 'event: hello' in events[0]
+
+        # SSE 连接不占用 worker：单线程池仍能处理普通请求
+        srv.modify_task('T-1', lambda t: t.update({'state': 'Review'}))
+        _, events = _read_events(sock, 1)
+        data = json.loads(events[0].split('data: ', 1)[1])
+        assert data['id'] == 'T-1'
+        assert data['set']['state'] == 'Review'
+        assert httpd.stats()['active'] == 0
+    finally:
+        sock.close()
+        httpd.shutdown()
+        httpd.server_close()
+        hub.close()
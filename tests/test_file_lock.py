@@ -63,3 +63,87 @@ def test_unicode_roundtrip(tmp_path):
     result = atomic_json_read(p, {})
     assert result['name'] == '户部尚书'
     assert result['emoji'] == '🏛️'
+
+
+# ── journaled 模式（WAL） ──
+
+from file_lock import compact_json_journal, journal_path
+
+
+def _seed_tasks(p, n=50):
+    tasks = [{'id': f'T-{i}', 'state': 'Doing', 'now': '', 'progress_log': [],
+              '_scheduler': {'retryCount': 0, 'flow': []}} for i in range(n)]
+    atomic_json_write(p, tasks)
+    return tasks
+
+
+def test_journal_appends_small_delta(tmp_path):
+    p = tmp_path / 'tasks_source.json'
+    _seed_tasks(p)
+    snapshot_before = p.read_text()
+
+    def progress(tasks):
+        t = tasks[3]
+        t['now'] = '进行中'
+        t['progress_log'].append({'at': 'x', 'text': '进度'})
+        t['_scheduler']['retryCount'] += 1
+        return tasks
+
+    atomic_json_update(p, progress, [], journal=True)
+    assert p.read_text() == snapshot_before          # 快照未重写
+    wal = journal_path(p)
+    assert wal.exists() and wal.stat().st_size < 600
+
+    t = atomic_json_read(p, [])[3]
+    assert t['now'] == '进行中'
+    assert t['progress_log'] == [{'at': 'x', 'text': '进度'}]
+    assert t['_scheduler']['retryCount'] == 1
+
+
+def test_journal_insert_delete_and_trim(tmp_path):
+    p = tmp_path / 'tasks_source.json'
+    _seed_tasks(p, 5)
+
+    def mutate(tasks):
+        tasks.insert(0, {'id': 'T-NEW', 'state': 'Pending'})
+        tasks[:] = [t for t in tasks if t['id'] != 'T-2']
+        for t in tasks:
+            if t['id'] == 'T-1':
+                t['progress_log'] = [{'n': i} for i in range(3)]
+        return tasks
+
+    def trim(tasks):
+        for t in tasks:
+            if t['id'] == 'T-1':
+                t['progress_log'].append({'n': 3})
+                t['progress_log'] = t['progress_log'][-3:]
+            t.pop('now', None)
+        return tasks
+
+    expected = atomic_json_update(p, mutate, [], journal=True)
+    expected = atomic_json_update(p, trim, [], journal=True)
+    expected = json.loads(json.dumps(expected))
+    assert atomic_json_read(p, []) == expected
+    assert [t['id'] for t in expected] == ['T-NEW', 'T-0', 'T-1', 'T-3', 'T-4']
+
+    assert compact_json_journal(p, force=True) is True
+    assert not journal_path(p).exists()
+    assert json.loads(p.read_text()) == expected
+
+
+def test_full_write_discards_journal(tmp_path):
+    p = tmp_path / 'tasks_source.json'
+    _seed_tasks(p, 3)
+    atomic_json_update(p, lambda ts: [dict(t, state='Done') for t in ts], [], journal=True)
+    assert journal_path(p).exists()
+
+    # 非 journaled 写入方先回放 WAL，再整体写回
+    atomic_json_update(p, lambda ts: ts, [], journal=False)
+    assert not journal_path(p).exists()
+    assert all(t['state'] == 'Done' for t in json.loads(p.read_text()))
+
+    # 快照被整体替换后，残留的旧 WAL 不会被回放
+    atomic_json_update(p, lambda ts: [dict(t, state='Review') for t in ts], [], journal=True)
+    p.write_text(json.dumps([{'id': 'T-X'}]), encoding='utf-8')
+    assert journal_path(p).exists()
+    assert atomic_json_read(p, []) == [{'id': 'T-X'}]
@@ -0,0 +1,57 @@
+"""tests for the agent memory ranking in edict/backend/app/services/memory_store.py."""
+import importlib.util
+import json
+import pathlib
+import random
+
+SERVICES_DIR = pathlib.Path(__file__).resolve().parent.parent / "edict" / "backend" / "app" / "services"
+
+_SPEC = importlib.util.spec_from_file_location("edict_memory_store", SERVICES_DIR / "memory_store.py")
+memory_store = importlib.util.module_from_spec(_SPEC)
+assert _SPEC.loader is not None
+_SPEC.loader.exec_module(memory_store)
+
+TAGS = ["工部", "礼部", "deploy", "docs", "test"]
+
+
+def _old_ranking(memories, task_tags):
+    """原 _build_memory_context 的排序：稳定排序，(pinned, tag 交集数, feedback) 降序。"""
+    def _relevance(m):
+        pinned = 1 if m.get("pinned") else 0
+        overlap = len(task_tags & set(m.get("relevance_tags", [])))
+        is_feedback = 1 if m.get("type") == "feedback" else 0
+        return (pinned, overlap, is_feedback)
+    return sorted(memories, key=_relevance, reverse=True)
+
+
+def test_ranking_matches_the_old_stable_sort(tmp_path):
+    rng = random.Random(7)
+    (tmp_path / "agent_memory").mkdir()
+    store = memory_store.MemoryStore(tmp_path)
+    for round_ in range(30):
+        memories = [{
+            "content": f"m{round_}-{i}",
+            "type": rng.choice(["feedback", "lesson", "fact"]),
+            "pinned": rng.random() < 0.2,
+            "relevance_tags": rng.sample(TAGS, rng.randint(0, 3)) * rng.randint(1, 2),
+        } for i in range(rng.randint(0, 40))]
+        path = tmp_path / "agent_memory" / f"a{round_}.json"
+        path.write_text(json.dumps({"memories": memories}, ensure_ascii=False), encoding="utf-8")
+        for _ in range(5):
+            task_tags = set(rng.sample(TAGS, rng.randint(0, 3)))
+            ranked = list(store.agent_memories(f"a{round_}").ranked(task_tags))
+            assert [m["content"] for m in ranked] == [m["content"] for m in _old_ranking(memories, task_tags)]
+
+
+def test_memory_file_is_parsed_once_until_it_changes(tmp_path):
+    (tmp_path / "agent_memory").mkdir()
+    path = tmp_path / "agent_memory" / "gongbu.json"
+    path.write_text(json.dumps({"memories": [{"content": "a", "type": "lesson"}]}), encoding="utf-8")
+    store = memory_store.MemoryStore(tmp_path)
+    first = store.agent_memories("gongbu")
+    assert store.agent_memories("gongbu") is first
+    assert store.stats()["loads"] == 1
+
+    path.write_text(json.dumps({"memories": [{"content": "b", "type": "feedback"},
+                                             {"content": "c", "pinned": True}]}), encoding="utf-8")
+    assert [m["content"] for m in store.agent_memories("gongbu").ranked(set())] == ["c", "b"]
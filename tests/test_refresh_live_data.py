@@ -0,0 +1,108 @@
+"""tests for the incremental refresh in scripts/refresh_live_data.py."""
+import json
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'scripts'))
+
+import task_changes
+from refresh_live_data import RefreshEngine
+from task_store import TaskStore
+
+
+def _live(data_dir):
+    return json.loads((data_dir / 'live_status.json').read_text(encoding='utf-8'))
+
+
+def _setup(tmp_path):
+    store = TaskStore(tmp_path / 'tasks_source.json')
+    store.save([{'id': 'T-1', 'state': 'Doing', 'title': 'a'},
+                {'id': 'T-2', 'state': 'Blocked', 'title': 'b'}])
+    return store
+
+
+def test_incremental_refresh_only_touches_changed_tasks(tmp_path):
+    store = _setup(tmp_path)
+    engine = RefreshEngine(tmp_path)
+    assert engine.refresh()['mode'] == 'full'
+    assert _live(tmp_path)['metrics']['blocked'] == 1
+
+    store.update_task('T-2', lambda t: t.update({'state': 'Done'}))
+    store.update(lambda ts: [{'id': 'T-3', 'state': 'Next'}] + ts, scope=['T-3'])
+
+    result = engine.refresh()
+    assert result['mode'] == 'incremental'
+    assert result['recomputed'] == 2
+    live = _live(tmp_path)
+    assert [t['id'] for t in live['tasks']] == ['T-3', 'T-1', 'T-2']
+    assert live['metrics']['blocked'] == 0
+    assert live['metrics']['totalDone'] == 1
+    assert live['metrics']['inProgress'] == 2
+    assert [h['task'] for h in live['history']] == ['b']
+
+    # 没有变化时不重读任何任务
+    assert engine.refresh()['recomputed'] == 0
+
+
+def test_delete_and_full_write_fall_back_correctly(tmp_path):
+    store = _setup(tmp_path)
+    engine = RefreshEngine(tmp_path)
+    engine.refresh()
+
+    store.update(lambda ts: [t for t in ts if t['id'] != 'T-1'], scope=['T-1'])
+    assert engine.refresh()['mode'] == 'incremental'
+    assert [t['id'] for t in _live(tmp_path)['tasks']] == ['T-2']
+
+    store.save([{'id': 'T-9', 'state': 'Done'}])
+    assert engine.refresh()['mode'] == 'full'
+    assert _live(tmp_path)['metrics']['totalDone'] == 1
+
+
+def test_one_shot_run_resumes_from_previous_output(tmp_path):
+    store = _setup(tmp_path)
+    RefreshEngine(tmp_path).refresh()
+    store.update_task('T-1', lambda t: t.update({'state': 'Blocked'}))
+
+    engine = RefreshEngine(tmp_path)
+    assert engine.restore() is True
+    assert engine.refresh()['mode'] == 'incremental'
+    assert _live(tmp_path)['metrics']['blocked'] == 2
+    assert _live(tmp_path)['refresh']['version'] == task_changes.current_version(tmp_path / 'tasks_source.json')
+
+
+def test_output_meta_follows_output_file(tmp_path):
+    out = tmp_path / 'report.md'
+    store = TaskStore(tmp_path / 'tasks_source.json')
+    store.save([{'id': 'T-1', 'state': 'Doing', 'output': str(out)}])
+    engine = RefreshEngine(tmp_path)
+    engine.refresh()
+    assert _live(tmp_path)['tasks'][0]['outputMeta'] == {'exists': False, 'lastModified': None}
+
+    # 产出文件出现但任务本身未写入：增量刷新也要反映出来
+    out.write_text('done', encoding='utf-8')
+    assert engine.refresh()['mode'] == 'incremental'
+    meta = _live(tmp_path)['tasks'][0]['outputMeta']
+    assert meta['exists'] is True and meta['lastModified']
+
+
+def test_incremental_refresh_only_rechecks_open_task_outputs(tmp_path, monkeypatch):
+    store = TaskStore(tmp_path / 'tasks_source.json')
+    store.save([{'id': f'T-{i}', 'state': 'Done' if i % 2 else 'Doing', 'output': str(tmp_path / f'{i}.md')}
+                for i in range(6)])
+    engine = RefreshEngine(tmp_path)
+    engine.refresh()
+    assert engine.watch_output == {'T-0', 'T-2', 'T-4'}
+    assert engine.active == {'T-0', 'T-2', 'T-4'}
+
+    stat_calls = []
+    real = engine._output_meta
+    monkeypatch.setattr(engine, '_output_meta', lambda path: stat_calls.append(path) or real(path))
+    store.update(lambda ts: [{'id': 'T-9', 'state': 'Next'}] + [t for t in ts if t['id'] != 'T-2'],
+                 scope=['T-9', 'T-2'])
+    store.update_task('T-0', lambda t: t.update({'state': 'Done'}))
+    engine.refresh()
+    assert sorted(stat_calls) == sorted([str(tmp_path / '0.md'), str(tmp_path / '4.md'), ''])
+    assert [t['id'] for t in _live(tmp_path)['tasks']] == ['T-9', 'T-0', 'T-1', 'T-3', 'T-4', 'T-5']
+    assert engine.pos == {t['id']: i for i, t in enumerate(engine.tasks)}
+    assert engine.active == {'T-4'} and engine.watch_output == {'T-4'}
@@ -0,0 +1,56 @@
+"""tests for the resident refresh daemon in scripts/refresh_watcher.py."""
+import json
+import pathlib
+import sys
+import threading
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'scripts'))
+
+import refresh_watcher
+from task_store import TaskStore
+
+
+def _wait_for(cond, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if cond():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_notify_without_daemon_reports_unreachable(tmp_path):
+    assert refresh_watcher.notify(tmp_path) is False
+
+
+def test_daemon_coalesces_notifications_into_one_refresh(monkeypatch, tmp_path):
+    monkeypatch.setattr(refresh_watcher, 'DEBOUNCE_SEC', 0.2)
+    TaskStore(tmp_path / 'tasks_source.json').save([{'id': 'T-1', 'state': 'Doing'}])
+
+    daemon = refresh_watcher.RefreshDaemon(tmp_path)
+    daemon.open()
+    worker = threading.Thread(target=daemon.serve_forever, daemon=True)
+    worker.start()
+    try:
+        for _ in range(5):
+            assert refresh_watcher.notify(tmp_path) is True
+        assert _wait_for(lambda: daemon.stats['refreshes'] >= 1)
+        assert daemon.stats['notifications'] == 5
+        assert daemon.stats['coalesced'] == 4
+        assert daemon.stats['lastLatencyMs'] is not None
+
+        # 常驻引擎：后续写入走增量刷新
+        TaskStore(tmp_path / 'tasks_source.json').update_task('T-1', lambda t: t.update({'state': 'Blocked'}))
+        refresh_watcher.notify(tmp_path)
+        assert _wait_for(lambda: daemon.stats['refreshes'] >= 2)
+        live = json.loads((tmp_path / 'live_status.json').read_text(encoding='utf-8'))
+        assert live['refresh']['mode'] == 'incremental'
+        assert live['metrics']['blocked'] == 1
+        assert 'daemon' in live['refresh']
+    finally:
+        daemon.stop()
+        worker.join(timeout=5)
+        daemon.close()
+    assert not refresh_watcher.socket_path(tmp_path).exists()
@@ -38,3 +38,170 @@ def test_healthz(tmp_path):
     assert body['status'] in ('ok', 'degraded')
 
     httpd.server_close()
+
+
+def test_pooled_server_slow_request_does_not_block(monkeypatch, tmp_path):
+    """A slow endpoint must not serialize other requests behind it."""
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    (data_dir / 'live_status.json').write_text('{"tasks": []}')
+
+    import server as srv
+    monkeypatch.setattr(srv, 'DATA', data_dir)
+    monkeypatch.setattr(srv, '_ACTIVE_TASK_DATA_DIR', data_dir)
+
+    release = threading.Event()
+
+    def slow_status():
+        release.wait(5)
+        return {'ok': True, 'agents': []}
+
+    monkeypatch.setattr(srv, 'get_agents_status', slow_status)
+
+    httpd = srv.PooledHTTPServer(('127.0.0.1', 0), srv.Handler, workers=4, max_queue=4, request_timeout=5)
+    port = httpd.server_address[1]
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        slow = HTTPConnection('127.0.0.1', port, timeout=10)
+        slow.request('GET', '/api/agents-status')
+        time.sleep(0.1)
+
+        started = time.monotonic()
+        conn = HTTPConnection('127.0.0.1', port, timeout=5)
+        conn.request('GET', '/api/live-status')
+        resp = conn.getresponse()
+        assert resp.status == 200
+        assert json.loads(resp.read()) == {'tasks': []}
+        assert time.monotonic() - started < 2
+
+        conn.request('GET', '/api/server-stats')
+        stats = json.loads(conn.getresponse().read())['server']
+        conn.close()
+        assert stats['workers'] == 4
+        assert stats['active'] >= 1  # the slow request is still running
+        assert 'queueDepth' in stats
+
+        release.set()
+        assert slow.getresponse().status == 200
+        slow.close()
+    finally:
+        release.set()
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_pooled_server_rejects_when_saturated(monkeypatch, tmp_path):
+    """Connections beyond workers + max_queue get an immediate 503."""
+    import server as srv
+
+    release = threading.Event()
+    monkeypatch.setattr(srv, 'get_agents_status', lambda: (release.wait(5), {'ok': True})[1])
+
+    httpd = srv.PooledHTTPServer(('127.0.0.1', 0), srv.Handler, workers=1, max_queue=0, request_timeout=5)
+    port = httpd.server_address[1]
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        busy = HTTPConnection('127.0.0.1', port, timeout=10)
+        busy.request('GET', '/api/agents-status')
+        time.sleep(0.1)
+
+        conn = HTTPConnection('127.0.0.1', port, timeout=5)
+        conn.request('GET', '/healthz')
+        resp = conn.getresponse()
+        assert resp.status == 503
+        resp.read()
+        conn.close()
+
+        release.set()
+        assert busy.getresponse().status == 200
+        busy.close()
+        assert httpd.stats()['rejected'] == 1
+    finally:
+        release.set()
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_pooled_server_counts_queue_timeouts_separately(monkeypatch, tmp_path):
+    """A request that waited in the queue past request_timeout gets 503 and is not counted as served."""
+    import server as srv
+
+    monkeypatch.setattr(srv, 'get_agents_status', lambda: (time.sleep(0.6), {'ok': True})[1])
+
+    httpd = srv.PooledHTTPServer(('127.0.0.1', 0), srv.Handler, workers=1, max_queue=1, request_timeout=0.3)
+    port = httpd.server_address[1]
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        busy = HTTPConnection('127.0.0.1', port, timeout=5)
+        busy.request('GET', '/api/agents-status')
+        time.sleep(0.1)
+
+        queued = HTTPConnection('127.0.0.1', port, timeout=5)
+        queued.request('GET', '/healthz')
+        assert busy.getresponse().status == 200
+        resp = queued.getresponse()
+        assert resp.status == 503
+        assert json.loads(resp.read())['error'] == 'queue timeout'
+        busy.close()
+        queued.close()
+
+        time.sleep(0.1)
+        stats = httpd.stats()
+        assert stats['served'] == 1
+        assert stats['queueTimeouts'] == 1
+        assert stats['rejected'] == 0
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_json_file_endpoints_support_etag_and_gzip(monkeypatch, tmp_path):
+    """File-backed JSON endpoints answer 304 for a matching ETag and gzip on request."""
+    import gzip
+    import server as srv
+
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    status = {'tasks': [{'id': f'T-{i}', 'title': '任务' * 20} for i in range(50)]}
+    (data_dir / 'live_status.json').write_text(json.dumps(status, ensure_ascii=False))
+    monkeypatch.setattr(srv, 'DATA', data_dir)
+    monkeypatch.setattr(srv, '_ACTIVE_TASK_DATA_DIR', data_dir)
+
+    httpd = srv.PooledHTTPServer(('127.0.0.1', 0), srv.Handler, workers=2, max_queue=4, request_timeout=5)
+    port = httpd.server_address[1]
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    def get(headers=None, path='/api/live-status'):
+        conn = HTTPConnection('127.0.0.1', port, timeout=5)
+        conn.request('GET', path, headers=headers or {})
+        resp = conn.getresponse()
+        body = resp.read()
+        conn.close()
+        return resp, body
+
+    try:
+        resp, body = get({'Accept-Encoding': 'gzip, deflate'})
+        assert resp.status == 200
+        assert resp.getheader('Content-Encoding') == 'gzip'
+        assert json.loads(gzip.decompress(body)) == status
+        etag = resp.getheader('ETag')
+
+        resp, body = get({'If-None-Match': etag})
+        assert resp.status == 304
+        assert body == b''
+
+        status['tasks'].pop()
+        (data_dir / 'live_status.json').write_text(json.dumps(status, ensure_ascii=False))
+        resp, body = get({'If-None-Match': etag})
+        assert resp.status == 200
+        assert resp.getheader('Content-Encoding') is None
+        assert json.loads(body) == status
+        assert resp.getheader('ETag') != etag
+
+        # 动态响应不计算 ETag
+        resp, body = get({'If-None-Match': '*'}, path='/api/server-stats')
+        assert resp.status == 200
+        assert resp.getheader('ETag') is None
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
@@ -0,0 +1,137 @@
+"""tests for dashboard/session_log.py and the agent activity readers built on it."""
+import json
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'dashboard'))
+sys.path.insert(0, str(ROOT / 'scripts'))
+
+import session_log
+from session_log import open_session_log
+
+
+def _user(text, ts):
+    return {'timestamp': ts, 'message': {'role': 'user', 'content': [{'type': 'text', 'text': text}]}}
+
+
+def _assistant(text, ts):
+    return {'timestamp': ts, 'message': {'role': 'assistant', 'content': [{'type': 'text', 'text': text}]}}
+
+
+def _write(path, items, mode='w'):
+    with open(path, mode, encoding='utf-8') as f:
+        for item in items:
+            f.write(json.dumps(item, ensure_ascii=False) + '\n')
+
+
+def test_reverse_reads_across_block_boundaries(monkeypatch, tmp_path):
+    monkeypatch.setattr(session_log, 'BLOCK_SIZE', 64)
+    p = tmp_path / 's.jsonl'
+    _write(p, [_assistant(f'第{i}步', f'T{i:03d}') for i in range(50)])
+    slog = open_session_log(p)
+    stamps = [item['timestamp'] for _, item in slog.iter_reverse()]
+    assert stamps == [f'T{i:03d}' for i in reversed(range(50))]
+
+
+def test_index_follows_appends_and_truncation(tmp_path):
+    from session_index import session_index
+
+    p = tmp_path / 's.jsonl'
+    _write(p, [_user('编写 README JJC-7', 'T1'), _assistant('好的', 'T2')])
+    idx = session_index(tmp_path)
+    assert [o for _, o in idx.task_postings('JJC-7')] == [0]
+    indexed = idx.stats()['indexedBytes']
+
+    _write(p, [_user('部署 服务', 'T3'), _assistant('JJC-7 完成', 'T4')], mode='a')
+    idx = session_index(tmp_path)
+    assert idx.stats()['indexedBytes'] > indexed
+    assert len(idx.task_postings('JJC-7')) == 2
+    slog, start, end = idx.best_keyword_segment(['部署', '服务'], 2)
+    assert slog.read_range(start, end)[0]['timestamp'] == 'T3'
+    assert slog.last_user_offset() == start
+
+    _write(p, [_assistant('新会话', 'T5')])
+    idx = session_index(tmp_path)
+    assert idx.task_postings('JJC-7') == []
+    assert idx.best_keyword_segment(['部署', '服务'], 2) is None
+
+
+def test_index_task_ids_ignore_json_escapes(tmp_path):
+    from session_index import session_index
+
+    p = tmp_path / 's.jsonl'
+    _write(p, [_assistant('第一行\nJJC-20260223-012 完成', 'T1'), _assistant('"XJJC-9" 与 \tJJC-9', 'T2')])
+    idx = session_index(tmp_path)
+    assert [o for _, o in idx.task_postings('JJC-20260223-012')] == [0]
+    assert idx.task_postings('nJJC-20260223-012') == []
+    assert len(idx.task_postings('JJC-9')) == 1
+    assert idx.task_postings('tJJC-9') == []
+
+
+def test_keyword_segment_matches_substrings_and_short_keywords(tmp_path):
+    from session_index import session_index
+
+    p = tmp_path / 's.jsonl'
+    _write(p, [
+        _user('deploy the docs', 'T1'), _assistant('ok', 'T2'),
+        _user('Deployment of 看板 v2', 'T3'), _assistant('ok', 'T4'),
+    ])
+    idx = session_index(tmp_path)
+    # "deploy" 作为词出现过，仍要找到只含 "Deployment" 的消息
+    slog, start, end = idx.best_keyword_segment(['deploy', '看板'], 2)
+    assert slog.read_range(start, end)[0]['timestamp'] == 'T3'
+    # 取不出 n-gram 的短关键词走顺序扫描
+    slog, start, end = idx.best_keyword_segment(['v2', '板'], 2)
+    assert slog.read_range(start, end)[0]['timestamp'] == 'T3'
+    assert idx.best_keyword_segment(['ployment', 'docs'], 2) is None
+
+
+def _agent_sessions(monkeypatch, tmp_path, items):
+    import server as srv
+
+    sessions = tmp_path / 'agents' / 'gongbu' / 'sessions'
+    sessions.mkdir(parents=True)
+    _write(sessions / 'a.jsonl', items)
+    monkeypatch.setattr(srv, 'OCLAW_HOME', tmp_path)
+    return srv
+
+
+def test_agent_activity_returns_latest_entries(monkeypatch, tmp_path):
+    items = [_user('开始 JJC-1', 'T00')] + [_assistant(f'JJC-{i % 2} 第{i}步', f'T{i:02d}') for i in range(1, 40)]
+    srv = _agent_sessions(monkeypatch, tmp_path, items)
+
+    latest = srv.get_agent_activity('gongbu', limit=5)
+    assert [e['at'] for e in latest] == ['T35', 'T36', 'T37', 'T38', 'T39']
+
+    only_task = srv.get_agent_activity('gongbu', limit=3, task_id='JJC-1')
+    assert [e['at'] for e in only_task] == ['T35', 'T37', 'T39']
+
+    segment = srv.get_agent_latest_segment('gongbu', limit=100)
+    assert segment[0]['kind'] == 'user' and len(segment) == 40
+
+
+def test_task_activity_reaches_older_sessions(monkeypatch, tmp_path):
+    import os
+
+    srv = _agent_sessions(monkeypatch, tmp_path, [_assistant('处理 JJC-OLD-1', 'T00')])
+    sessions = tmp_path / 'agents' / 'gongbu' / 'sessions'
+    os.utime(sessions / 'a.jsonl', (1, 1))
+    for name in 'bcde':
+        _write(sessions / f'{name}.jsonl', [_assistant('无关', 'T99')])
+
+    # 旧实现只扫描最新的 3 个文件
+    assert [e['at'] for e in srv.get_agent_activity('gongbu', task_id='JJC-OLD-1')] == ['T00']
+
+
+def test_agent_activity_by_keywords_picks_matching_segment(monkeypatch, tmp_path):
+    items = [
+        _user('撰写 周报 总结', 'T1'), _assistant('周报已完成', 'T2'),
+        _user('部署 看板 服务', 'T3'), _assistant('部署中', 'T4'), _assistant('部署完成', 'T5'),
+        _user('其他 事项', 'T6'), _assistant('收到', 'T7'),
+    ]
+    srv = _agent_sessions(monkeypatch, tmp_path, items)
+
+    entries = srv.get_agent_activity_by_keywords('gongbu', ['部署', '看板'], limit=10)
+    assert [e['at'] for e in entries] == ['T3', 'T4', 'T5']
+    assert srv.get_agent_activity_by_keywords('gongbu', ['不存在', '关键词']) == []
@@ -0,0 +1,92 @@
+"""tests for dashboard/stall_scheduler.py and the deadline-driven scheduler scan."""
+import datetime
+import json
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'dashboard'))
+sys.path.insert(0, str(ROOT / 'scripts'))
+
+
+def _ago(sec):
+    return (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=sec)).isoformat()
+
+
+def _task(task_id, progress_ago, state='Doing'):
+    return {'id': task_id, 'title': task_id, 'state': state, 'org': '工部', 'updatedAt': _ago(progress_ago),
+            '_scheduler': {'stallThresholdSec': 600, 'maxRetry': 1, 'lastProgressAt': _ago(progress_ago)}}
+
+
+def _setup(monkeypatch, tmp_path, tasks):
+    import server as srv
+
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    tasks_path = data_dir / 'tasks_source.json'
+    tasks_path.write_text(json.dumps(tasks, ensure_ascii=False), encoding='utf-8')
+    monkeypatch.setattr(srv, 'DATA', data_dir)
+    monkeypatch.setattr(srv, '_ACTIVE_TASK_DATA_DIR', data_dir)
+    monkeypatch.setattr(srv, '_trigger_refresh', lambda: None)
+    monkeypatch.setattr(srv, 'dispatch_for_state', lambda *a, **kw: None)
+    monkeypatch.setattr(srv, 'wake_agent', lambda *a, **kw: None)
+    from stall_scheduler import StallScheduler
+    sched = StallScheduler(srv._stall_deadline, recheck_sec=120)
+    monkeypatch.setattr(srv, 'STALL_SCHEDULER', sched)
+    return srv, sched, tasks_path
+
+
+def test_scan_writes_only_when_a_deadline_passed(monkeypatch, tmp_path):
+    srv, sched, tasks_path = _setup(monkeypatch, tmp_path, [
+        _task('T-FRESH', 10), _task('T-STALL', 700), _task('T-DONE', 9999, state='Done'),
+    ])
+    before = tasks_path.stat().st_mtime_ns
+
+    result = srv.handle_scheduler_scan(threshold_sec=600)
+    assert [a['taskId'] for a in result['actions']] == ['T-STALL']
+    assert sched.snapshot()['tracked'] == 2          # Done 不参与
+    assert 0 < sched.seconds_until_next(10_000) <= 120
+
+    # 到期任务已推迟 recheck_sec：再次巡检不加锁、不写文件
+    written = tasks_path.stat().st_mtime_ns
+    assert written != before
+    assert srv.handle_scheduler_scan(threshold_sec=600)['count'] == 0
+    assert tasks_path.stat().st_mtime_ns == written
+
+
+def test_sync_follows_store_writes_incrementally(monkeypatch, tmp_path):
+    srv, sched, _ = _setup(monkeypatch, tmp_path, [_task('T-1', 10), _task('T-2', 10)])
+    store = srv.get_task_store()
+    sched.sync(store, 600)
+    assert sched.stats['rebuilds'] == 1
+    assert not sched.pop_due()
+
+    srv.modify_task('T-2', lambda t: t['_scheduler'].update({'lastProgressAt': _ago(900)}))
+    sched.sync(store, 600)
+    assert sched.stats['rebuilds'] == 1 and sched.stats['updates'] == 1
+    assert sched.pop_due() == ['T-2']
+
+    srv.modify_task('T-1', lambda t: t.update({'state': 'Done'}))
+    sched.sync(store, 600)
+    assert sched.snapshot()['tracked'] == 1
+
+
+def test_due_task_that_is_not_stalled_keeps_its_real_deadline(monkeypatch, tmp_path):
+    srv, sched, _ = _setup(monkeypatch, tmp_path, [_task('T-1', 700)])
+    sched.sync(srv.get_task_store(), srv._scan_threshold())
+    # 进展在 sync 之后才写入：巡检看到的堆已过时，弹出后不应再推迟 recheck_sec
+    srv.modify_task('T-1', lambda t: t['_scheduler'].update({'lastProgressAt': _ago(0)}))
+    monkeypatch.setattr(sched, 'sync', lambda *a: None)
+
+    assert srv.handle_scheduler_scan()['count'] == 0
+    assert 500 < sched.seconds_until_next(10_000) <= 600
+
+
+def test_deadline_and_scan_share_the_threshold(monkeypatch, tmp_path):
+    import server as srv
+
+    assert srv._stall_threshold({}, 180) == srv.STALL_THRESHOLD_SEC
+    assert srv._stall_threshold({'stallThresholdSec': None}, 180) == 180
+    assert srv._stall_threshold({'stallThresholdSec': 'x'}, 180) == 180
+    assert srv._scan_threshold() == srv.STALL_SCAN_THRESHOLD_SEC
+    assert srv._scan_threshold(10) == 60
@@ -0,0 +1,120 @@
+"""tests for scripts/task_history.py (hot/cold task history split)"""
+import json
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'dashboard'))
+sys.path.insert(0, str(ROOT / 'scripts'))
+
+import task_history
+from task_history import has_cold, history_file, hydrate, load_history, spill
+
+
+def _task(n_progress, n_flow=0):
+    return {
+        'id': 'JJC-H-1',
+        'progress_log': [{'at': f'p{i}', 'text': str(i)} for i in range(n_progress)],
+        'flow_log': [{'at': f'f{i}', 'to': '中书省'} for i in range(n_flow)],
+    }
+
+
+def test_spill_keeps_hot_tail_and_full_history(tmp_path):
+    task = _task(25, 3)
+    assert spill(task, tmp_path) is True
+    assert len(task['progress_log']) == task_history.HOT_TAIL['progress_log']
+    assert task['flow_log'] == [{'at': f'f{i}', 'to': '中书省'} for i in range(3)]
+    assert has_cold(task, 'progress_log') and not has_cold(task, 'flow_log')
+
+    task['progress_log'].extend({'at': f'p{i}', 'text': str(i)} for i in range(25, 40))
+    spill(task, tmp_path)
+    full = load_history(task, 'progress_log', tmp_path)
+    assert [e['text'] for e in full] == [str(i) for i in range(40)]
+    assert [e['text'] for e in load_history(task, 'progress_log', tmp_path, limit=5)] == \
+        [str(i) for i in range(35, 40)]
+    assert len(hydrate(task, tmp_path)['progress_log']) == 40
+
+
+def test_failed_commit_does_not_duplicate_cold_entries(tmp_path):
+    task = _task(15)
+    spill(task, tmp_path)
+    committed = json.loads(json.dumps(task))
+
+    # 迁出成功但热记录写回失败：以已提交的热记录为准重新迁出
+    lost = json.loads(json.dumps(committed))
+    lost['progress_log'].extend({'at': 'x', 'text': 'lost'} for _ in range(20))
+    spill(lost, tmp_path)
+
+    committed['progress_log'].extend({'at': f'p{i}', 'text': str(i)} for i in range(15, 30))
+    spill(committed, tmp_path)
+    texts = [e['text'] for e in load_history(committed, 'progress_log', tmp_path)]
+    assert texts == [str(i) for i in range(30)]
+    assert history_file(tmp_path, 'JJC-H-1').stat().st_size == committed['_history']['bytes']
+
+
+def test_kanban_progress_spills_and_activity_reads_cold(monkeypatch, tmp_path):
+    import kanban_update as kb
+    import server as srv
+
+    monkeypatch.setenv('EDICT_TASK_HISTORY_SPLIT', '1')
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    tasks_file = data_dir / 'tasks_source.json'
+    tasks_file.write_text(json.dumps([{
+        'id': 'JJC-H-2', 'title': '冷热分离', 'state': 'Doing', 'org': '工部',
+        'flow_log': [{'at': '2026-01-01T00:00:00Z', 'from': '尚书省', 'to': '工部', 'remark': '派发'}],
+    }], ensure_ascii=False), encoding='utf-8')
+    monkeypatch.setattr(kb, 'TASKS_FILE', tasks_file)
+    monkeypatch.setattr(kb, '_trigger_refresh', lambda: None)
+    monkeypatch.setattr(kb, '_append_audit', lambda *a, **k: None)
+    for i in range(14):
+        kb.cmd_progress('JJC-H-2', f'进展{i}')
+
+    hot = json.loads(tasks_file.read_text(encoding='utf-8'))[0]
+    assert len(hot['progress_log']) == task_history.HOT_TAIL['progress_log']
+    assert hot['_history']['counts']['progress_log'] == 14 - task_history.HOT_TAIL['progress_log']
+
+    monkeypatch.setattr(srv, 'DATA', data_dir)
+    monkeypatch.setattr(srv, '_ACTIVE_TASK_DATA_DIR', data_dir)
+    result = srv.get_task_activity('JJC-H-2')
+    texts = [a.get('text') for a in result['activity'] if a.get('kind') == 'progress']
+    assert texts == [f'进展{i}' for i in range(14)]
+
+
+def test_cold_history_is_capped_and_compacted(monkeypatch, tmp_path):
+    monkeypatch.setattr(task_history, 'READ_BLOCK_SIZE', 64)
+    task = _task(0)
+    for i in range(300):
+        task['progress_log'].append({'at': f'p{i}', 'text': str(i)})
+        spill(task, tmp_path)
+    limit = task_history.HISTORY_LIMIT['progress_log']
+    cold_cap = limit - task_history.HOT_TAIL['progress_log']
+    assert task['_history']['gen'] >= 1
+    assert task['_history']['counts']['progress_log'] <= cold_cap * (1 + task_history.COMPACT_SLACK) + 1
+    # 只保留当前代与上一代冷文件
+    assert len(list(tmp_path.glob('JJC-H-1*.jsonl'))) <= 2
+
+    full = load_history(task, 'progress_log', tmp_path)
+    assert [e['text'] for e in full] == [str(i) for i in range(300 - limit, 300)]
+    assert [e['text'] for e in hydrate(task, tmp_path)['progress_log']] == [e['text'] for e in full]
+    # limit 超过热尾部时从冷文件末尾向前读（块小于文件，覆盖跨块拼接）
+    assert [e['text'] for e in load_history(task, 'progress_log', tmp_path, limit=25)] == \
+        [str(i) for i in range(275, 300)]
+
+
+def test_failed_commit_after_compaction_keeps_previous_generation(tmp_path):
+    task = _task(0)
+    for i in range(200):
+        task['progress_log'].append({'at': f'p{i}', 'text': str(i)})
+        spill(task, tmp_path)
+    committed = json.loads(json.dumps(task))
+    gen = committed['_history'].get('gen', 0)
+
+    # 迫使下一次迁出压缩，但热记录没有写回
+    lost = json.loads(json.dumps(committed))
+    lost['progress_log'].extend({'at': 'x', 'text': 'lost'} for _ in range(200))
+    spill(lost, tmp_path)
+    assert lost['_history']['gen'] == gen + 1
+
+    expected = [str(i) for i in range(100, 200)]
+    assert [e['text'] for e in load_history(committed, 'progress_log', tmp_path)] == expected
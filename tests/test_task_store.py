@@ -0,0 +1,143 @@
+"""tests for scripts/task_store.py and the dashboard's cached read paths."""
+import json
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'dashboard'))
+sys.path.insert(0, str(ROOT / 'scripts'))
+
+from file_lock import atomic_json_update, atomic_json_write
+from task_store import SqliteTaskStore, TaskStore, open_task_store
+
+
+def test_store_reuses_parse_until_file_changes(tmp_path):
+    p = tmp_path / 'tasks_source.json'
+    atomic_json_write(p, [{'id': 'T-1', 'state': 'Doing'}])
+    store = TaskStore(p)
+
+    first = store.tasks()
+    assert store.get('T-1')['state'] == 'Doing'
+    assert store.tasks() is first
+    assert store.stats()['reloads'] == 1
+
+    # 其他进程（kanban_update）通过 tempfile + replace 写入
+    atomic_json_write(p, [{'id': 'T-1', 'state': 'Review'}, {'id': 'T-2'}])
+    assert store.get('T-1')['state'] == 'Review'
+    assert store.get('T-2') is not None
+    assert store.stats()['reloads'] == 2
+
+
+def test_store_commit_skips_reparse(tmp_path):
+    p = tmp_path / 'tasks_source.json'
+    atomic_json_write(p, [{'id': 'T-1', 'state': 'Doing'}])
+    store = TaskStore(p)
+    store.tasks()
+
+    def _modify(tasks):
+        tasks[0]['state'] = 'Done'
+        return tasks
+
+    atomic_json_update(p, _modify, default=[], on_commit=store.commit)
+    assert store.get('T-1')['state'] == 'Done'
+    assert store.stats()['reloads'] == 1
+
+
+def test_store_missing_file(tmp_path):
+    store = TaskStore(tmp_path / 'nope.json')
+    assert store.tasks() == []
+    assert store.get('T-1') is None
+
+
+def _setup_server(monkeypatch, tmp_path, tasks):
+    import server as srv
+
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    tasks_path = data_dir / 'tasks_source.json'
+    tasks_path.write_text(json.dumps(tasks, ensure_ascii=False), encoding='utf-8')
+    monkeypatch.setattr(srv, 'DATA', data_dir)
+    monkeypatch.setattr(srv, '_ACTIVE_TASK_DATA_DIR', data_dir)
+    monkeypatch.setattr(srv, '_trigger_refresh', lambda: None)
+    return srv, tasks_path
+
+
+def test_server_reads_see_own_and_external_writes(monkeypatch, tmp_path):
+    srv, tasks_path = _setup_server(monkeypatch, tmp_path, [{'id': 'T-1', 'state': 'Doing'}])
+
+    assert srv.get_task('T-1')['state'] == 'Doing'
+    srv.modify_task('T-1', lambda t: t.update({'state': 'Review'}))
+    assert srv.get_task('T-1')['state'] == 'Review'
+
+    srv.save_tasks([{'id': 'T-1', 'state': 'Done'}])
+    assert srv.get_task('T-1')['state'] == 'Done'
+
+
+def test_scheduler_state_does_not_mutate_cache(monkeypatch, tmp_path):
+    srv, _ = _setup_server(monkeypatch, tmp_path, [{'id': 'T-1', 'state': 'Doing'}])
+
+    result = srv.get_scheduler_state('T-1')
+    assert result['ok'] is True
+    assert result['scheduler']['stallThresholdSec'] == 600
+    assert '_scheduler' not in srv.get_task('T-1')
+
+
+# ── SQLite 后端 ──
+
+def test_sqlite_imports_json_and_updates_rows(tmp_path):
+    p = tmp_path / 'tasks_source.json'
+    atomic_json_write(p, [{'id': 'T-1', 'state': 'Doing', 'org': '工部'},
+                          {'id': 'T-2', 'state': 'Review', 'org': '尚书省'}])
+    store = SqliteTaskStore(p)
+    assert [t['id'] for t in store.load()] == ['T-1', 'T-2']
+
+    assert store.update_task('T-2', lambda t: t.update({'state': 'Done'})) is True
+    assert store.update_task('T-404', lambda t: None) is False
+    assert store.get('T-2')['state'] == 'Done'
+
+    # 其他连接（另一个 Agent 进程）写入后，缓存快照自动失效
+    first = store.tasks()
+    other = SqliteTaskStore(p)
+    other.update_task('T-1', lambda t: t.update({'now': '进行中'}))
+    assert store.tasks() is not first
+    assert store.tasks()[0]['now'] == '进行中'
+
+
+def test_sqlite_update_keeps_list_semantics(tmp_path):
+    store = SqliteTaskStore(tmp_path / 'tasks_source.json')
+    store.save([{'id': 'T-1'}, {'id': 'T-2'}, {'id': 'T-3'}])
+
+    def create(tasks):
+        tasks = [t for t in tasks if t.get('id') != 'T-NEW']
+        tasks.insert(0, {'id': 'T-NEW', 'state': 'Taizi'})
+        return tasks
+
+    store.update(create, scope=['T-NEW'])
+    assert [t['id'] for t in store.load()] == ['T-NEW', 'T-1', 'T-2', 'T-3']
+
+    store.update(lambda ts: [t for t in ts if t['id'] != 'T-2'] + [{'id': 'T-4'}])
+    assert [t['id'] for t in store.load()] == ['T-NEW', 'T-1', 'T-3', 'T-4']
+
+    store.update(lambda ts: list(reversed(ts)))
+    assert [t['id'] for t in store.load()] == ['T-4', 'T-3', 'T-1', 'T-NEW']
+
+
+def test_kanban_runs_on_sqlite_backend(monkeypatch, tmp_path):
+    import kanban_update as kb
+
+    monkeypatch.setenv('EDICT_TASK_BACKEND', 'sqlite')
+    tasks_file = tmp_path / 'tasks_source.json'
+    tasks_file.write_text('[]', encoding='utf-8')
+    monkeypatch.setattr(kb, 'TASKS_FILE', tasks_file)
+    monkeypatch.setattr(kb, '_trigger_refresh', lambda: None)
+    monkeypatch.setattr(kb, '_append_audit', lambda *a, **k: None)
+
+    kb.cmd_create('T-SQL-1', '测试SQLite后端任务创建', 'Zhongshu', '中书省', '中书令')
+    kb.cmd_state('T-SQL-1', 'Menxia', '提交审议')
+    kb.cmd_progress('T-SQL-1', '正在审议', '1.审议🔄')
+
+    assert isinstance(open_task_store(tasks_file), SqliteTaskStore)
+    t = next(t for t in kb.load() if t['id'] == 'T-SQL-1')
+    assert t['state'] == 'Menxia'
+    assert t['now'] == '正在审议'
+    assert json.loads(tasks_file.read_text()) == []   # JSON 文件不再被写入
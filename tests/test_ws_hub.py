@@ -0,0 +1,109 @@
+"""tests for the WebSocket subscriber queue in edict/backend/app/services/ws_hub.py."""
+import asyncio
+import importlib.util
+import json
+import pathlib
+
+SERVICES_DIR = pathlib.Path(__file__).resolve().parent.parent / "edict" / "backend" / "app" / "services"
+
+_SPEC = importlib.util.spec_from_file_location("edict_ws_hub", SERVICES_DIR / "ws_hub.py")
+ws_hub = importlib.util.module_from_spec(_SPEC)
+assert _SPEC.loader is not None
+_SPEC.loader.exec_module(ws_hub)
+
+
+def _frame(topic, event):
+    return json.dumps({"type": "event", "topic": topic, "data": event}, ensure_ascii=False)
+
+
+def _heartbeat(agent, seq):
+    return {"event_type": "agent.heartbeat", "producer": f"agent.{agent}", "payload": {"seq": seq}}
+
+
+async def _drain(sub, wait=0.1):
+    runner = asyncio.create_task(sub.run())
+    await asyncio.sleep(wait)
+    sub.close("done")
+    await asyncio.wait_for(runner, 1)
+
+
+def test_heartbeats_are_coalesced_per_agent():
+    sent = []
+
+    async def send(text):
+        sent.append(json.loads(text))
+
+    async def main():
+        sub = ws_hub.Subscriber(send)
+        sub.set_filter(coalesce_ms=30)
+        for seq in range(3):
+            for agent in ("gongbu", "libu"):
+                event = _heartbeat(agent, seq)
+                sub.offer("agent.heartbeat", event, _frame("agent.heartbeat", event))
+        status = {"event_type": "task.status", "payload": {"task_id": "JJC-1"}}
+        sub.offer("task.status", status, _frame("task.status", status))
+        await _drain(sub)
+        return sub
+
+    sub = asyncio.run(main())
+    assert [f["topic"] for f in sent] == ["task.status", "agent.heartbeat", "agent.heartbeat"]
+    assert {(f["data"]["producer"], f["data"]["payload"]["seq"]) for f in sent[1:]} == {
+        ("agent.gongbu", 2), ("agent.libu", 2)}
+    assert sub.coalesced == 4
+
+
+def test_batching_sends_one_frame_per_window_and_control_frames_alone():
+    sent = []
+
+    async def send(text):
+        sent.append(json.loads(text))
+
+    async def main():
+        sub = ws_hub.Subscriber(send)
+        sub.set_filter(batch_ms=20)
+        for i in range(3):
+            event = {"event_type": "task.status", "payload": {"n": i}}
+            sub.offer("task.status", event, _frame("task.status", event))
+        sub.push(json.dumps({"type": "pong"}), force=True)
+        await _drain(sub)
+
+    asyncio.run(main())
+    assert sent[0] == {"type": "pong"}
+    assert sent[1]["type"] == "batch"
+    assert [e["data"]["payload"]["n"] for e in sent[1]["events"]] == [0, 1, 2]
+    assert len(sent) == 2
+
+
+def test_full_queue_drops_oldest_or_disconnects():
+    async def noop(text):
+        pass
+
+    async def main():
+        dropping = ws_hub.Subscriber(noop, max_queue=2)
+        for i in range(5):
+            dropping.push(str(i))
+        strict = ws_hub.Subscriber(noop, max_queue=2, policy=ws_hub.POLICY_DISCONNECT)
+        for i in range(3):
+            strict.push(str(i))
+        return dropping, strict
+
+    dropping, strict = asyncio.run(main())
+    assert list(dropping._queue) == ["3", "4"]
+    assert dropping.dropped == 3 and not dropping.closed
+    assert strict.closed and strict.close_reason == "slow consumer"
+
+
+def test_filters_match_task_agent_and_event_type_prefix():
+    async def noop(text):
+        pass
+
+    async def main():
+        return ws_hub.Subscriber(noop)
+
+    sub = asyncio.run(main())
+    sub.set_filter(task_ids=["JJC-1"], agents=["gongbu"], event_types=["agent.output*"])
+    event = {"event_type": "agent.output.line", "payload": {"task_id": "JJC-1", "agent": "gongbu"}}
+    assert sub.matches("agent.thoughts", "JJC-1", event)
+    assert not sub.matches("agent.thoughts", "JJC-2", event)
+    assert not sub.matches("agent.thoughts", "JJC-1", {**event, "event_type": "agent.heartbeat"})
+    assert not sub.matches("agent.thoughts", "JJC-1", {**event, "payload": {"agent": "libu"}})